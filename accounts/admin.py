@@ -1,9 +1,149 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.text import smart_split, unescape_string_literal
+
+from clopetracker.changelist import LargeTableAdminMixin, chunked_update, prefix_range
+from tracker import leaderboard
+
+from .backends import invalidate_users
+from .models import AvatarJob, Group, OutboxEmail, PendingFileDeletion, User
+
+# Utilisateurs mis à jour par transaction dans les actions de masse
+BULK_CHUNK_SIZE = 1000
+
+# Colonnes cherchées par préfixe, chacune couverte par un index sur Lower(colonne)
+SEARCH_ALIASES = {
+    "username_lower": Lower("username"),
+    "email_lower": Lower("email"),
+    "first_name_lower": Lower("first_name"),
+    "last_name_lower": Lower("last_name"),
+}
+
+
+class CigarettesFilter(admin.SimpleListFilter):
+    title = "cigarettes fumées"
+    parameter_name = "cigarettes"
+
+    RANGES = {"0": (0, 0), "1-99": (1, 99), "100-999": (100, 999), "1000+": (1000, None)}
+
+    def lookups(self, request, model_admin):
+        return [(key, "Aucune" if key == "0" else key) for key in self.RANGES]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        low, high = self.RANGES[self.value()]
+        queryset = queryset.filter(cigarettes_smoked__gte=low)
+        return queryset if high is None else queryset.filter(cigarettes_smoked__lte=high)
+
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
+    """
+    Admin des comptes, prévue pour une table de plusieurs millions de lignes :
+    comptage borné et pagination par curseur (LargeTableAdminMixin), recherche par préfixe
+    indexée, actions de masse en UPDATE par paquets (pas de save() par objet).
+    """
+
     fieldsets = UserAdmin.fieldsets + (
-        (None, {"fields": ("birth_date", "phone", "role", "group_id", "cigarettes_smoked")}),
+        (None, {"fields": ("birth_date", "phone", "role", "group", "cigarettes_smoked")}),
     )
+    list_display = ("username", "email", "first_name", "last_name", "role", "group", "cigarettes_smoked", "is_staff")
+    list_select_related = ("group",)
+    # Groupe : présence seulement (des milliers de groupes) ; un groupe précis via le lien « Membres »
+    list_filter = ("role", ("group", admin.EmptyFieldListFilter), CigarettesFilter, "is_staff", "is_active")
+    raw_id_fields = ("group",)
+    # Affiche la boîte de recherche ; la recherche elle-même est dans get_search_results()
+    search_fields = ("username", "email", "first_name", "last_name")
+    search_help_text = "Début du nom d’utilisateur, de l’email, du prénom ou du nom (casse ignorée)."
+    actions = ["activate_users", "deactivate_users", "make_members", "make_admins", "remove_from_group"]
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Chaque mot doit commencer l’une des colonnes (comme UserAdmin, mais par préfixe) :
+        intervalles sur Lower(colonne) → index au lieu de LIKE '%…%' sur toute la table.
+        """
+        terms = [
+            unescape_string_literal(term) if term[0] in "\"'" and term[-1] == term[0] else term
+            for term in smart_split(search_term)
+        ]
+        terms = [term for term in terms if term]
+        if not terms:
+            return queryset, False
+        queryset = queryset.alias(**SEARCH_ALIASES)
+        for term in terms:
+            prefix = Lower(Value(term))
+            queryset = queryset.filter(
+                prefix_range("username_lower", prefix)
+                # Index partiel (email <> '') : la condition doit figurer dans la requête
+                | (prefix_range("email_lower", prefix) & ~Q(email=""))
+                | prefix_range("first_name_lower", prefix)
+                | prefix_range("last_name_lower", prefix)
+            )
+        return queryset, False
+
+    # --- Actions de masse ---
+
+    def _bulk_update(self, request, queryset, done, on_chunk=None, **values):
+        def chunk_done(ids):
+            if on_chunk:
+                on_chunk(ids)
+            invalidate_users(ids)  # UPDATE direct : pas de signal post_save
+
+        updated = chunked_update(queryset, chunk_size=BULK_CHUNK_SIZE, on_chunk=chunk_done, **values)
+        self.message_user(request, f"{updated} utilisateur(s) {done}.", messages.SUCCESS)
+
+    @admin.action(description="Activer les utilisateurs sélectionnés")
+    def activate_users(self, request, queryset):
+        self._bulk_update(request, queryset, "activé(s)", is_active=True)
+
+    @admin.action(description="Désactiver les utilisateurs sélectionnés")
+    def deactivate_users(self, request, queryset):
+        self._bulk_update(request, queryset, "désactivé(s)", is_active=False)
+
+    @admin.action(description="Passer en rôle Membre")
+    def make_members(self, request, queryset):
+        self._bulk_update(request, queryset, "passé(s) Membre", role="member")
+
+    @admin.action(description="Passer en rôle Admin")
+    def make_admins(self, request, queryset):
+        self._bulk_update(request, queryset, "passé(s) Admin", role="admin")
+
+    @admin.action(description="Retirer de leur groupe")
+    def remove_from_group(self, request, queryset):
+        # Classements des anciens groupes invalidés (groupes lus avant l’UPDATE)
+        self._bulk_update(
+            request, queryset, "retiré(s) de leur groupe", on_chunk=leaderboard.invalidate_users, group=None,
+        )
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ("name", "created_at", "members_link")
+    search_fields = ("name",)
+
+    @admin.display(description="Membres")
+    def members_link(self, obj):
+        url = reverse("admin:accounts_user_changelist")
+        return format_html('<a href="{}?group__id__exact={}">Membres</a>', url, obj.pk)
+
+@admin.register(AvatarJob)
+class AvatarJobAdmin(admin.ModelAdmin):
+    list_display = ("user", "source", "status", "attempts", "updated_at")
+    list_filter = ("status",)
+    raw_id_fields = ("user",)
+    readonly_fields = ("error", "created_at", "updated_at")
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "created_at")
+    list_filter = ("status",)
+    readonly_fields = ("last_error", "created_at", "updated_at")
+
+@admin.register(PendingFileDeletion)
+class PendingFileDeletionAdmin(admin.ModelAdmin):
+    list_display = ("name", "created_at")
+    readonly_fields = ("name", "created_at")
@@ -6,5 +6,11 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
 
     def ready(self):
+        from django.contrib.auth.signals import user_logged_in
+
         # Import des signaux au démarrage de l’app
-        from . import signals  # noqa
+        from . import signals
+
+        # last_login : version allégée à la place de celle de django.contrib.auth
+        user_logged_in.disconnect(dispatch_uid="update_last_login")
+        user_logged_in.connect(signals.update_last_login, dispatch_uid="accounts.update_last_login")
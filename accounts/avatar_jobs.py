@@ -0,0 +1,156 @@
+# accounts/avatar_jobs.py
+"""
+Traitement des avatars hors requête.
+
+- Le signal pre_save stocke l’upload brut et le save crée une AvatarJob
+- `python manage.py process_avatars` réclame un lot de jobs, normalise les images
+  (éventuellement dans un pool de processus) puis remplace le fichier brut
+- Tant que ce n’est pas fait, User.profile_image_url sert l’image par défaut
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from tempfile import NamedTemporaryFile
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .backends import invalidate_user
+from .media_gc import schedule_deletion
+from .models import AvatarJob, User
+from .utils.images import process_avatar_variants, store_avatar_variants
+
+# Nombre d’essais avant de marquer une job en échec
+MAX_ATTEMPTS = 3
+
+# Une job "running" plus vieille que ça vient d’un worker mort → on la reprend
+STALE_AFTER = timedelta(minutes=10)
+
+
+def render_avatar(path: str):
+    """
+    Normalise une image brute lue depuis un fichier local → [(nom, bytes), …]
+    (variante principale en premier ; les sorties font quelques dizaines de Kio).
+    Fonction de module (picklable) pour pouvoir tourner dans un process enfant.
+    """
+    with open(path, "rb") as source:
+        files = process_avatar_variants(source)
+    rendered = []
+    for f in files:
+        with f:
+            rendered.append((f.name, f.read()))
+    return rendered
+
+
+@contextmanager
+def _local_source(storage, name):
+    """
+    Chemin local du fichier brut, sans le charger en mémoire :
+    - storage local → chemin direct
+    - sinon → copie par blocs dans un fichier temporaire
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path:
+        yield path
+        return
+    with storage.open(name, "rb") as src, NamedTemporaryFile(suffix=os.path.splitext(name)[1]) as tmp:
+        for chunk in src.chunks():
+            tmp.write(chunk)
+        tmp.flush()
+        yield tmp.name
+
+
+def _claimable():
+    stale = timezone.now() - STALE_AFTER
+    return Q(status=AvatarJob.PENDING) | Q(status=AvatarJob.RUNNING, updated_at__lt=stale)
+
+
+def claim_jobs(limit):
+    """
+    Réclame jusqu’à `limit` jobs.
+    Chaque job passe en "running" via un UPDATE conditionnel : deux workers
+    concurrents ne peuvent pas prendre la même.
+    """
+    candidates = list(
+        AvatarJob.objects.filter(_claimable()).order_by("id").values_list("pk", flat=True)[:limit]
+    )
+    claimed = [
+        pk for pk in candidates
+        if AvatarJob.objects.filter(_claimable(), pk=pk).update(
+            status=AvatarJob.RUNNING, attempts=F("attempts") + 1, updated_at=timezone.now()
+        )
+    ]
+    return list(AvatarJob.objects.filter(pk__in=claimed).order_by("id"))
+
+
+def _finish(job, variants):
+    """Enregistre les variantes et les substitue au brut si l’avatar n’a pas changé entre-temps."""
+    field = User._meta.get_field("profile_image")
+    new_name = store_avatar_variants(field, [ContentFile(data, name=name) for name, data in variants])
+    with transaction.atomic():
+        swapped = User.objects.filter(pk=job.user_id, profile_image=job.source).update(
+            profile_image=new_name, avatar_ready=True
+        )
+        job.delete()
+        if swapped:
+            invalidate_user(job.user_id)
+        # Swap réussi → le brut ne sert plus ; sinon c’est le résultat qui est obsolète
+        schedule_deletion(job.source if swapped else new_name)
+    return bool(swapped)
+
+
+def _fail(job, exc):
+    job.error = f"{exc.__class__.__name__}: {exc}"
+    job.status = AvatarJob.FAILED if job.attempts >= MAX_ATTEMPTS else AvatarJob.PENDING
+    job.save(update_fields=["error", "status", "updated_at"])
+
+
+def process_jobs(batch_size=20, workers=1):
+    """
+    Traite un lot de jobs.
+    workers > 1 → l’encodage (CPU) part dans un ProcessPoolExecutor ;
+    les accès base et storage restent dans le process courant.
+    Retourne (réussies, échouées).
+    """
+    jobs = claim_jobs(batch_size)
+    storage = User._meta.get_field("profile_image").storage
+
+    done = failed = 0
+
+    def _collect(job, result):
+        nonlocal done, failed
+        try:
+            _finish(job, result())
+            done += 1
+        except Exception as exc:
+            _fail(job, exc)
+            failed += 1
+
+    with ExitStack() as stack:
+        sources = []
+        for job in jobs:
+            # L’utilisateur a déjà changé / retiré son avatar → job obsolète
+            if not User.objects.filter(pk=job.user_id, profile_image=job.source).exists():
+                job.delete()
+                continue
+            try:
+                sources.append((job, stack.enter_context(_local_source(storage, job.source))))
+            except Exception as exc:
+                _fail(job, exc)
+                failed += 1
+
+        if workers > 1 and sources:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [(job, pool.submit(render_avatar, path)) for job, path in sources]
+                for job, future in futures:
+                    _collect(job, future.result)
+        else:
+            for job, path in sources:
+                _collect(job, lambda: render_avatar(path))
+    return done, failed
@@ -0,0 +1,70 @@
+# accounts/backends.py
+"""
+Backend d’authentification avec cache de l’utilisateur connecté.
+
+- get_user() / aget_user() (appelés à chaque requête authentifiée) lisent d’abord le cache
+  → plus de SELECT sur accounts_user pour le tableau de bord, la navbar…
+- Entrée supprimée à chaque save() / delete() du User (voir accounts.signals) ;
+  les UPDATE directs qui touchent ce qu’affichent les pages appellent invalidate_user(s)()
+- Les compteurs dérivés (cigarettes_smoked) ne sont pas lus depuis request.user
+  mais via tracker.counters : leur retard dans l’instance en cache est sans effet
+- USER_CACHE_TIMEOUT = 0 → comportement identique à ModelBackend
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _user_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+def invalidate_user(user_id):
+    """
+    Oublie l’utilisateur en cache : tout de suite, puis à nouveau au commit
+    (une requête concurrente a pu remettre l’ancienne ligne en cache entre-temps).
+    """
+    key = _user_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_users(user_ids):
+    """invalidate_user() pour un lot (UPDATE de masse), en deux delete_many."""
+    keys = [_user_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend dont la relecture de l’utilisateur de session passe par le cache."""
+
+    def get_user(self, user_id):
+        timeout = settings.USER_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(user_id)
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = get_user_model()._default_manager.get(pk=user_id)
+            except get_user_model().DoesNotExist:
+                return None
+            cache.set(key, user, timeout)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        timeout = settings.USER_CACHE_TIMEOUT
+        if not timeout:
+            return await super().aget_user(user_id)
+        key = _user_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            try:
+                user = await get_user_model()._default_manager.aget(pk=user_id)
+            except get_user_model().DoesNotExist:
+                return None
+            await cache.aset(key, user, timeout)
+        return user if self.user_can_authenticate(user) else None
@@ -1,7 +1,34 @@
 # accounts/forms.py
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.conf import settings
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm, _unicode_ci_compare
 from .models import User
+from .utils.images import AvatarError, check_dimensions
+
+class AvatarField(forms.ImageField):
+    """
+    ImageField qui refuse les fichiers trop lourds AVANT que Pillow ne les ouvre,
+    puis les images démesurées (dimensions lues dans l’en-tête, sans décoder).
+    """
+
+    default_error_messages = {
+        "too_large": "Image trop volumineuse (maximum %(max)s Mo).",
+    }
+
+    def to_python(self, data):
+        if data and getattr(data, "size", 0) > settings.AVATAR_MAX_UPLOAD_SIZE:
+            raise forms.ValidationError(
+                self.error_messages["too_large"],
+                code="too_large",
+                params={"max": settings.AVATAR_MAX_UPLOAD_SIZE // (1024 * 1024)},
+            )
+        f = super().to_python(data)
+        if f is not None and getattr(f, "image", None) is not None:
+            try:
+                check_dimensions(*f.image.size)
+            except AvatarError as exc:
+                raise forms.ValidationError(str(exc), code="too_many_pixels")
+        return f
 
 class UserRegistrationForm(UserCreationForm):
     # on force l’email (utile pour reset mot de passe plus tard)
@@ -23,10 +50,24 @@ class UserRegistrationForm(UserCreationForm):
         widgets = {
             "birth_date": forms.DateInput(attrs={"type": "date"}),
         }
+        field_classes = {
+            "profile_image": AvatarField,
+        }
 
     # (optionnel) si tu veux imposer l’unicité de l’email
     def clean_email(self):
         email = self.cleaned_data["email"].lower()
-        if User.objects.filter(email__iexact=email).exists():
+        if User.objects.by_email(email).exists():
             raise forms.ValidationError("Un compte utilise déjà cet email.")
         return email
+
+
+class EmailPasswordResetForm(PasswordResetForm):
+    """Reset de mot de passe : comptes retrouvés via l’index Lower(email) au lieu de email__iexact."""
+
+    def get_users(self, email):
+        return (
+            user for user in User.objects.by_email(email).filter(is_active=True)
+            # Même garde-fou Unicode que la version de Django
+            if user.has_usable_password() and _unicode_ci_compare(email, user.email)
+        )
@@ -0,0 +1,153 @@
+# accounts/mail.py
+"""
+Boîte d’envoi des emails.
+
+- OutboxBackend : EMAIL_BACKEND qui se contente d’enregistrer les messages (OutboxEmail)
+  → le reset de mot de passe ne bloque plus sur le serveur SMTP distant
+- deliver_outbox() : envoie un lot sur UNE connexion réutilisée (OUTBOX_DELIVERY_BACKEND),
+  avec nouvel essai différé (backoff exponentiel) en cas d’échec
+Activation : EMAIL_BACKEND=accounts.mail.OutboxBackend puis `manage.py send_outbox` en cron.
+"""
+import base64
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# Essais avant abandon, et délai de base du backoff (doublé à chaque échec)
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = timedelta(minutes=1)
+
+# Un email "sending" plus vieux que ça vient d’un worker mort → on le reprend
+STALE_AFTER = timedelta(minutes=10)
+
+
+def _encode_attachment(attachment):
+    filename, content, mimetype = attachment
+    if isinstance(content, str):
+        content = content.encode(settings.DEFAULT_CHARSET)
+    return [filename, base64.b64encode(content).decode("ascii"), mimetype]
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Backend email qui met les messages en file au lieu de les envoyer."""
+
+    def send_messages(self, email_messages):
+        rows = [
+            OutboxEmail(
+                subject=str(message.subject),
+                body=message.body,
+                content_subtype=message.content_subtype,
+                from_email=message.from_email,
+                to=list(message.to),
+                cc=list(message.cc),
+                bcc=list(message.bcc),
+                reply_to=list(message.reply_to),
+                headers=dict(message.extra_headers),
+                alternatives=[list(alt) for alt in getattr(message, "alternatives", [])],
+                # Pièces jointes MIME pré-construites non supportées : uniquement (nom, contenu, type)
+                attachments=[_encode_attachment(a) for a in message.attachments if isinstance(a, tuple)],
+            )
+            for message in email_messages
+        ]
+        OutboxEmail.objects.bulk_create(rows)
+        return len(rows)
+
+
+def to_message(row):
+    """Reconstruit l’EmailMessage Django d’une ligne OutboxEmail."""
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        to=row.to,
+        cc=row.cc,
+        bcc=row.bcc,
+        reply_to=row.reply_to,
+        headers=row.headers,
+        alternatives=[tuple(alt) for alt in row.alternatives],
+    )
+    message.content_subtype = row.content_subtype
+    for filename, content, mimetype in row.attachments:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    return message
+
+
+def _due():
+    now = timezone.now()
+    return Q(status=OutboxEmail.PENDING, next_attempt_at__lte=now) | Q(
+        status=OutboxEmail.SENDING, updated_at__lt=now - STALE_AFTER
+    )
+
+
+def claim_due(limit):
+    """Réclame jusqu’à `limit` emails dus (UPDATE conditionnel → pas de double envoi entre workers)."""
+    candidates = list(
+        OutboxEmail.objects.filter(_due()).order_by("next_attempt_at", "id").values_list("pk", flat=True)[:limit]
+    )
+    claimed = [
+        pk for pk in candidates
+        if OutboxEmail.objects.filter(_due(), pk=pk).update(
+            status=OutboxEmail.SENDING, attempts=F("attempts") + 1, updated_at=timezone.now()
+        )
+    ]
+    return list(OutboxEmail.objects.filter(pk__in=claimed).order_by("id"))
+
+
+def _fail(row, exc):
+    row.last_error = f"{exc.__class__.__name__}: {exc}"
+    if row.attempts >= MAX_ATTEMPTS:
+        row.status = OutboxEmail.FAILED
+    else:
+        row.status = OutboxEmail.PENDING
+        row.next_attempt_at = timezone.now() + RETRY_BASE_DELAY * (2 ** (row.attempts - 1))
+    row.save(update_fields=["last_error", "status", "next_attempt_at", "updated_at"])
+
+
+def deliver_outbox(batch_size=100, connection=None):
+    """
+    Envoie un lot d’emails dus sur une seule connexion.
+    - Serveur injoignable → tout le lot est reporté (backoff), sans insister message par message
+    - Erreur sur un message → connexion rouverte pour les suivants
+    Retourne (envoyés, en échec).
+    """
+    rows = claim_due(batch_size)
+    if not rows:
+        return 0, 0
+    connection = connection or get_connection(settings.OUTBOX_DELIVERY_BACKEND, fail_silently=False)
+
+    sent = failed = 0
+    opened = False
+    try:
+        for i, row in enumerate(rows):
+            if not opened:
+                try:
+                    connection.open()
+                    opened = True
+                except Exception as exc:
+                    for pending in rows[i:]:
+                        _fail(pending, exc)
+                    return sent, failed + len(rows) - i
+            try:
+                connection.send_messages([to_message(row)])
+            except Exception as exc:
+                _fail(row, exc)
+                failed += 1
+                # Connexion peut-être cassée : on repartira d’une connexion neuve
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+                opened = False
+                continue
+            row.delete()
+            sent += 1
+    finally:
+        if opened:
+            connection.close()
+    return sent, failed
@@ -0,0 +1,102 @@
+# accounts/management/commands/bench_avatars.py
+import json
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PIL import Image
+
+from accounts.utils.images import process_avatar_variants
+from clopetracker.bench import format_table, peak_rss_kib, summarize
+
+# Extension / format Pillow des sources synthétiques
+FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+def make_source(megapixels, fmt):
+    """Photo synthétique 4:3 avec du détail (fractale + dégradé), encodée dans `fmt`."""
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = width * 3 // 4
+    detail = Image.effect_mandelbrot((width, height), (-2.2, -1.2, 0.8, 1.2), 64)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    img = Image.merge("RGB", (detail, gradient, detail.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = BytesIO()
+    img.save(buffer, format=FORMATS[fmt], quality=90)
+    return buffer.getvalue(), (width, height)
+
+
+def run_case(data, name, repeat, webp_method):
+    """
+    Exécuté dans un processus neuf : le pic RSS mesuré est celui du traitement seul
+    (pic final - RSS au démarrage du processus).
+    """
+    settings_ctx = override_settings(AVATAR_WEBP_METHOD=webp_method) if webp_method is not None else nullcontext()
+    baseline = peak_rss_kib()
+    durations = []
+    with settings_ctx:
+        for _ in range(repeat):
+            source = BytesIO(data)
+            source.name = name
+            start = time.perf_counter()
+            process_avatar_variants(source)
+            durations.append(time.perf_counter() - start)
+    return durations, peak_rss_kib() - baseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark du traitement d’avatar : latence et pic mémoire par taille "
+        "et format d’entrée (chaque cas tourne dans un processus séparé)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="2,12,24",
+            help="Tailles d’entrée en mégapixels, séparées par des virgules.",
+        )
+        parser.add_argument(
+            "--formats", default="jpeg,png,webp",
+            help=f"Formats d’entrée parmi : {', '.join(FORMATS)}.",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Répétitions par cas.")
+        parser.add_argument(
+            "--webp-method", type=int, default=None,
+            help="Force AVATAR_WEBP_METHOD (0-6) pour comparer les niveaux d’effort.",
+        )
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour comparer deux runs).")
+
+    def handle(self, *args, sizes, formats, repeat, webp_method, **options):
+        context = multiprocessing.get_context("fork")
+        results = []
+        for fmt in [f.strip() for f in formats.split(",") if f.strip()]:
+            for mp in [float(s) for s in sizes.split(",") if s.strip()]:
+                data, (width, height) = make_source(mp, fmt)
+                # Un processus neuf par cas → pic RSS non pollué par le cas précédent
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    durations, peak_kib = pool.submit(run_case, data, f"bench.{fmt}", repeat, webp_method).result()
+                stats = summarize(durations)
+                results.append({
+                    "format": fmt,
+                    "megapixels": mp,
+                    "dimensions": f"{width}x{height}",
+                    "input_kib": len(data) // 1024,
+                    "p50_ms": stats["p50_ms"],
+                    "max_ms": stats["max_ms"],
+                    "peak_rss_mib": peak_kib / 1024,
+                })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(format_table(
+            ["format", "dimensions", "entrée Kio", "p50 ms", "max ms", "pic RSS Mio"],
+            [
+                [r["format"], r["dimensions"], r["input_kib"], r["p50_ms"], r["max_ms"], r["peak_rss_mib"]]
+                for r in results
+            ],
+        ))
@@ -0,0 +1,96 @@
+# accounts/management/commands/bench_sessions.py
+import json
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from clopetracker.bench import format_table, summarize
+
+_ENGINE = "django.contrib.sessions.backends."
+
+# Configurations comparées : db sans cache utilisateur = comportement d’origine
+MODES = {
+    "db": {"SESSION_ENGINE": _ENGINE + "db", "USER_CACHE_TIMEOUT": 0},
+    "cached_db": {"SESSION_ENGINE": _ENGINE + "cached_db", "USER_CACHE_TIMEOUT": 300},
+    "cache": {"SESSION_ENGINE": _ENGINE + "cache", "USER_CACHE_TIMEOUT": 300},
+    "signed_cookies": {"SESSION_ENGINE": _ENGINE + "signed_cookies", "USER_CACHE_TIMEOUT": 300},
+}
+
+# Pages authentifiées : tableau de bord (async) et page simple avec navbar (sync)
+PAGES = {
+    "home": "/",
+    "password_change": "/accounts/password-change/",
+}
+
+
+def run_mode(user, mode, path, requests):
+    """Vues authentifiées en boucle ; client créé sous override → middleware de session du mode."""
+    with override_settings(**MODES[mode]):
+        client = Client()
+        client.force_login(user)
+        client.get(path)  # chauffe : cache de session / utilisateur rempli
+        durations, queries = [], []
+        start = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                response = client.get(path)
+                durations.append(time.perf_counter() - t0)
+            if response.status_code != 200:
+                raise CommandError(f"{mode} {path} : statut {response.status_code}")
+            queries.append(len(ctx.captured_queries))
+        elapsed = time.perf_counter() - start
+        client.logout()
+    return durations, queries, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark des pages authentifiées selon le moteur de session et le cache utilisateur "
+        "(req/s, p50/p95, requêtes SQL par page). Crée un utilisateur temporaire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default=",".join(MODES), help=f"Modes parmi : {', '.join(MODES)}.")
+        parser.add_argument("--pages", default=",".join(PAGES), help=f"Pages parmi : {', '.join(PAGES)}.")
+        parser.add_argument("--requests", type=int, default=300, help="Requêtes par page et par mode.")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour comparer deux runs).")
+
+    def handle(self, *args, modes, pages, requests, **options):
+        mode_names = [m.strip() for m in modes.split(",") if m.strip()]
+        page_names = [p.strip() for p in pages.split(",") if p.strip()]
+        unknown = (set(mode_names) - set(MODES)) | (set(page_names) - set(PAGES))
+        if unknown:
+            raise CommandError(f"Mode(s) / page(s) inconnu(s) : {', '.join(sorted(unknown))}")
+
+        User = get_user_model()
+        user = User.objects.create_user(f"bench-{uuid.uuid4().hex[:8]}")
+        results = []
+        try:
+            for page in page_names:
+                for mode in mode_names:
+                    durations, queries, elapsed = run_mode(user, mode, PAGES[page], requests)
+                    stats = summarize(durations)
+                    results.append({
+                        "page": page,
+                        "mode": mode,
+                        "req_per_s": len(durations) / elapsed if elapsed else 0.0,
+                        "p50_ms": stats["p50_ms"],
+                        "p95_ms": stats["p95_ms"],
+                        "queries": sum(queries) / len(queries),
+                    })
+        finally:
+            user.delete()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(format_table(
+            ["page", "mode", "req/s", "p50 ms", "p95 ms", "SQL/page"],
+            [[r["page"], r["mode"], r["req_per_s"], r["p50_ms"], r["p95_ms"], r["queries"]] for r in results],
+        ))
@@ -0,0 +1,48 @@
+# accounts/management/commands/gc_media.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.media_gc import DEFAULT_BATCH_SIZE, collect_pending, scan_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime par lots les avatars en attente de suppression (PendingFileDeletion) "
+        "et rapproche le dossier des avatars des fichiers référencés en base. "
+        "À lancer périodiquement (cron, timer systemd…)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+            help="Nombre de fichiers vérifiés / supprimés par lot.",
+        )
+        parser.add_argument(
+            "--no-scan", action="store_true",
+            help="Ne traite que la file d’attente, sans parcourir le dossier des avatars.",
+        )
+        parser.add_argument(
+            "--min-age", type=int, default=None,
+            help=f"Âge minimal (secondes) d’un fichier orphelin (défaut : MEDIA_GC_MIN_AGE = {settings.MEDIA_GC_MIN_AGE}).",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Compte les orphelins sans rien mettre en attente ni supprimer.",
+        )
+
+    def handle(self, *args, batch_size, no_scan, min_age, dry_run, **options):
+        if not no_scan:
+            orphans = scan_orphans(min_age=min_age, batch_size=batch_size, dry_run=dry_run)
+            self.stdout.write(f"{orphans} fichier(s) orphelin(s) trouvé(s).")
+        if dry_run:
+            return
+        total_deleted = total_kept = 0
+        while True:
+            deleted, kept = collect_pending(batch_size=batch_size)
+            total_deleted += deleted
+            total_kept += kept
+            if deleted + kept < batch_size:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f"{total_deleted} fichier(s) supprimé(s), {total_kept} gardé(s) (de nouveau référencés)."
+        ))
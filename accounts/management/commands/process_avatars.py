@@ -0,0 +1,25 @@
+# accounts/management/commands/process_avatars.py
+from django.core.management.base import BaseCommand
+
+from accounts.avatar_jobs import process_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Normalise les avatars en attente (file AvatarJob). "
+        "À lancer périodiquement (cron, timer systemd…)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=20,
+            help="Nombre maximum de jobs traitées par passage.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Taille du pool de processus pour l’encodage (1 = dans ce processus).",
+        )
+
+    def handle(self, *args, batch_size=20, workers=1, **options):
+        done, failed = process_jobs(batch_size=batch_size, workers=workers)
+        self.stdout.write(self.style.SUCCESS(f"{done} avatar(s) traité(s), {failed} échec(s)."))
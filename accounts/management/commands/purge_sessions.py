@@ -0,0 +1,21 @@
+# accounts/management/commands/purge_sessions.py
+from django.core.management.base import BaseCommand
+
+from accounts.sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les sessions expirées par lots (remplace clearsessions et son DELETE unique). "
+        "À lancer périodiquement (cron, timer systemd…)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Nombre de sessions supprimées par transaction.",
+        )
+
+    def handle(self, *args, batch_size=1000, **options):
+        deleted = purge_expired_sessions(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"{deleted} session(s) expirée(s) supprimée(s)."))
@@ -0,0 +1,31 @@
+# accounts/management/commands/send_outbox.py
+from django.core.management.base import BaseCommand
+
+from accounts.mail import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie les emails en attente (OutboxEmail) par lots, une connexion SMTP par lot. "
+        "À lancer périodiquement (cron, timer systemd…)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=100,
+            help="Nombre maximum d’emails envoyés par lot.",
+        )
+        parser.add_argument(
+            "--batches", type=int, default=1,
+            help="Nombre maximum de lots par passage (s’arrête plus tôt si la file est vide).",
+        )
+
+    def handle(self, *args, batch_size=100, batches=1, **options):
+        total_sent = total_failed = 0
+        for _ in range(batches):
+            sent, failed = deliver_outbox(batch_size=batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < batch_size:
+                break
+        self.stdout.write(self.style.SUCCESS(f"{total_sent} email(s) envoyé(s), {total_failed} échec(s)."))
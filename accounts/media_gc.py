@@ -0,0 +1,123 @@
+# accounts/media_gc.py
+"""
+Suppression différée des fichiers médias (avatars).
+
+- schedule_deletion() : enregistre les noms à supprimer (PendingFileDeletion) dans la
+  transaction en cours → aucun appel au storage dans la requête, rien de perdu sur rollback
+- collect_pending() : supprime par lots les fichiers en attente qui ne sont plus référencés
+  (User.profile_image, AvatarJob.source), variantes comprises
+- scan_orphans() : parcours en flux du dossier des avatars (os.scandir, rien n’est listé
+  en entier) ; les fichiers que plus rien ne référence, plus vieux que MEDIA_GC_MIN_AGE,
+  sont mis en attente de suppression (l’âge minimal protège les uploads pas encore commités)
+→ `python manage.py gc_media` (cron, timer systemd…)
+"""
+import os
+import time
+
+from django.conf import settings
+
+from .models import AvatarJob, PendingFileDeletion, User
+from .utils.images import delete_avatar_variants, main_name
+
+# Noms vérifiés / supprimés par lot
+DEFAULT_BATCH_SIZE = 500
+
+
+def _field():
+    return User._meta.get_field("profile_image")
+
+
+def schedule_deletion(*names):
+    """Met des fichiers en attente de suppression (une requête, dans la transaction en cours)."""
+    rows = [PendingFileDeletion(name=name) for name in dict.fromkeys(names) if name]
+    if rows:
+        PendingFileDeletion.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def _referenced(names):
+    """Noms encore utilisés parmi `names` (avatar d’un compte ou brut en attente de traitement)."""
+    names = list(names)
+    return (
+        set(User.objects.filter(profile_image__in=names).values_list("profile_image", flat=True))
+        | set(AvatarJob.objects.filter(source__in=names).values_list("source", flat=True))
+    )
+
+
+def collect_pending(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Traite un lot de suppressions en attente.
+    Un nom de nouveau référencé entre-temps (même contenu ré-uploadé) est gardé.
+    Retourne (supprimés, gardés).
+    """
+    rows = list(PendingFileDeletion.objects.order_by("pk").values_list("pk", "name")[:batch_size])
+    if not rows:
+        return 0, 0
+    referenced = _referenced(name for _, name in rows)
+    storage = _field().storage
+    deleted = 0
+    for _, name in rows:
+        if name not in referenced:
+            delete_avatar_variants(storage, name)
+            deleted += 1
+    PendingFileDeletion.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+    return deleted, len(rows) - deleted
+
+
+def iter_files(storage, directory):
+    """(nom dans le storage, mtime) des fichiers de `directory`, sous-dossiers compris, en flux."""
+    try:
+        root = storage.path(directory)
+    except NotImplementedError:
+        root = None
+    if root is None:
+        # Storage distant : pas de scandir, listdir par dossier
+        dirs, files = storage.listdir(directory)
+        for name in files:
+            path = f"{directory}/{name}"
+            yield path, storage.get_modified_time(path).timestamp()
+        for sub in dirs:
+            yield from iter_files(storage, f"{directory}/{sub}")
+        return
+    if not os.path.isdir(root):
+        return
+    pending = [(root, directory)]
+    while pending:
+        path, prefix = pending.pop()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append((entry.path, f"{prefix}/{entry.name}"))
+                elif entry.is_file(follow_symlinks=False):
+                    yield f"{prefix}/{entry.name}", entry.stat().st_mtime
+
+
+def scan_orphans(min_age=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Rapproche le dossier des avatars des noms référencés en base, par lots de fichiers.
+    Les orphelins (nom principal, variantes comprises) sont mis en attente de suppression,
+    sauf en dry_run. Retourne le nombre de noms orphelins trouvés.
+    """
+    field = _field()
+    min_age = settings.MEDIA_GC_MIN_AGE if min_age is None else min_age
+    cutoff = time.time() - min_age
+    directory = str(field.upload_to).strip("/")
+    # Orphelins déjà vus : une variante peut tomber dans un autre lot que sa principale
+    found = set()
+
+    def flush(mains):
+        orphans = mains - found - _referenced(mains)
+        found.update(orphans)
+        if orphans and not dry_run:
+            schedule_deletion(*sorted(orphans))
+
+    batch = set()
+    for name, mtime in iter_files(field.storage, directory):
+        if mtime > cutoff:
+            continue
+        batch.add(main_name(name))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = set()
+    if batch:
+        flush(batch)
+    return len(found)
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_existing_avatars_ready(apps, schema_editor):
+    # Les avatars déjà en base ont été traités de façon synchrone
+    User = apps.get_model("accounts", "User")
+    User.objects.exclude(profile_image="").exclude(profile_image__isnull=True).update(avatar_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_ready',
+            field=models.BooleanField(default=False, verbose_name='Avatar traité'),
+        ),
+        migrations.RunPython(mark_existing_avatars_ready, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='AvatarJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Fichier brut')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('failed', 'Échec')], default='pending', max_length=10, verbose_name='Statut')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créée le')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Mise à jour le')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='avatar_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'traitement d’avatar',
+                'verbose_name_plural': 'traitements d’avatar',
+                'indexes': [models.Index(fields=['status', 'id'], name='accounts_avatarjob_queue')],
+            },
+        ),
+    ]
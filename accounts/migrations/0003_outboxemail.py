@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_avatar_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(blank=True, max_length=998, verbose_name='Sujet')),
+                ('body', models.TextField(blank=True, verbose_name='Corps')),
+                ('content_subtype', models.CharField(default='plain', max_length=20, verbose_name='Sous-type du corps')),
+                ('from_email', models.CharField(max_length=254, verbose_name='Expéditeur')),
+                ('to', models.JSONField(default=list, verbose_name='Destinataires')),
+                ('cc', models.JSONField(blank=True, default=list, verbose_name='Copie')),
+                ('bcc', models.JSONField(blank=True, default=list, verbose_name='Copie cachée')),
+                ('reply_to', models.JSONField(blank=True, default=list, verbose_name='Répondre à')),
+                ('headers', models.JSONField(blank=True, default=dict, verbose_name='En-têtes')),
+                ('alternatives', models.JSONField(blank=True, default=list, verbose_name='Versions alternatives')),
+                ('attachments', models.JSONField(blank=True, default=list, verbose_name='Pièces jointes')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('sending', 'En cours d’envoi'), ('failed', 'Échec')], default='pending', max_length=10, verbose_name='Statut')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochain essai')),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Mis à jour le')),
+            ],
+            options={
+                'verbose_name': 'email en attente',
+                'verbose_name_plural': 'emails en attente',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='accounts_outbox_due')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Remplace le placeholder User.group_id (IntegerField) par une vraie FK vers Group.
+
+import django.db.models.deletion
+from django.core.management.color import no_style
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_groups(apps, schema_editor):
+    """Crée un Group par identifiant déjà utilisé (même pk) puis rattache les membres."""
+    Group = apps.get_model("accounts", "Group")
+    User = apps.get_model("accounts", "User")
+    legacy_ids = (
+        User.objects.exclude(legacy_group_id__isnull=True)
+        .order_by()
+        .values_list("legacy_group_id", flat=True)
+        .distinct()
+    )
+    Group.objects.bulk_create(
+        [Group(id=gid, name=f"Groupe {gid}") for gid in legacy_ids], batch_size=500
+    )
+    User.objects.exclude(legacy_group_id__isnull=True).update(group_id=F("legacy_group_id"))
+
+    # Postgres & co : les pk ont été fixés à la main → on recale la séquence
+    connection = schema_editor.connection
+    sequence_sql = connection.ops.sequence_reset_sql(no_style(), [Group])
+    with connection.cursor() as cursor:
+        for sql in sequence_sql:
+            cursor.execute(sql)
+
+
+def restore_legacy_ids(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    User.objects.exclude(group_id__isnull=True).update(legacy_group_id=F("group_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Group',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nom')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+            ],
+            options={
+                'verbose_name': 'groupe',
+                'verbose_name_plural': 'groupes',
+            },
+        ),
+        # L’ancienne colonne "group_id" doit libérer le nom pour la FK
+        migrations.RenameField(
+            model_name='user',
+            old_name='group_id',
+            new_name='legacy_group_id',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='accounts.group', verbose_name='Groupe'),
+        ),
+        migrations.RunPython(backfill_groups, restore_legacy_ids),
+        migrations.RemoveField(
+            model_name='user',
+            name='legacy_group_id',
+        ),
+    ]
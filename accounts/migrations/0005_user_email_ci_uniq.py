@@ -0,0 +1,58 @@
+# Index unique sur Lower(email) : un compte par email, recherche sans casse indexée.
+# Refuse de s’appliquer (avec la liste) tant que des emails ne diffèrent que par la casse.
+
+import accounts.models
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# Nombre maximum de doublons listés dans le message d’erreur
+REPORT_LIMIT = 20
+
+
+def check_email_duplicates(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    duplicates = (
+        User.objects.exclude(email="")
+        .annotate(email_lower=Lower("email"))
+        .values("email_lower")
+        .annotate(n=Count("pk"))
+        .filter(n__gt=1)
+        .order_by("email_lower")
+    )
+    total = duplicates.count()
+    if not total:
+        return
+    lines = []
+    for row in duplicates[:REPORT_LIMIT]:
+        accounts = User.objects.annotate(email_lower=Lower("email")).filter(email_lower=row["email_lower"])
+        usernames = ", ".join(accounts.order_by("pk").values_list("username", flat=True))
+        lines.append(f"  {row['email_lower']} : {usernames}")
+    if total > REPORT_LIMIT:
+        lines.append(f"  … et {total - REPORT_LIMIT} autre(s)")
+    raise RuntimeError(
+        f"{total} email(s) utilisé(s) par plusieurs comptes (casse ignorée). "
+        "Fusionner ou corriger ces comptes avant de migrer :\n" + "\n".join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_group'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_email_duplicates, migrations.RunPython.noop),
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', accounts.models.UserManager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='accounts_user_email_ci_uniq'),
+        ),
+    ]
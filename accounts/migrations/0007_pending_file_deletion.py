@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_search_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingFileDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Fichier')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Demandée le')),
+            ],
+            options={
+                'verbose_name': 'suppression de fichier en attente',
+                'verbose_name_plural': 'suppressions de fichier en attente',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['profile_image'], name='accounts_user_profile_image'),
+        ),
+    ]
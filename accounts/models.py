@@ -1,14 +1,57 @@
 # accounts/models.py
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Lower
 from django.templatetags.static import static  # fallback image par défaut
+from django.utils import timezone
 
-class User(AbstractUser):
+from .utils.dirty_fields import DirtyFieldsMixin
+from .utils.images import TARGET_SIZE, VARIANT_SIZES, is_hashed_name, variant_name
+
+class Group(models.Model):
+    """
+    Groupe de fumeurs (amis, collègues…) qui partagent un classement.
+    Rien à voir avec auth.Group (permissions), accessible via User.groups.
+    """
+
+    name = models.CharField(max_length=100, verbose_name="Nom")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+
+    class Meta:
+        verbose_name = "groupe"
+        verbose_name_plural = "groupes"
+
+    def __str__(self):
+        return self.name
+
+class UserManager(BaseUserManager):
+    def by_email(self, email):
+        """
+        Comptes dont l’email vaut `email` sans tenir compte de la casse.
+        Écrit pour l’index unique sur Lower(email) (email__iexact → UPPER / LIKE, scan complet) ;
+        le filtre email <> '' reprend la condition de l’index partiel, sinon SQLite l’ignore.
+        La valeur passe aussi par LOWER() en SQL : str.lower() minusculerait « É » alors que
+        le LOWER() de SQLite ne touche qu’à l’ASCII, et l’email ne serait jamais retrouvé.
+        """
+        return (
+            self.alias(email_lower=Lower("email"))
+            .filter(email_lower=Lower(Value(email)))
+            .exclude(email="")
+        )
+
+
+class User(DirtyFieldsMixin, AbstractUser):
     """
     Modèle utilisateur personnalisé basé sur AbstractUser.
     Champs métier additionnels + champ d’avatar.
     """
 
+    # Champs suivis sans requête par les signaux (voir DirtyFieldsMixin)
+    TRACKED_FIELDS = ("profile_image", "group")
+
+    objects = UserManager()
+
     # Date de naissance (optionnelle)
     birth_date = models.DateField(
         null=True, blank=True, verbose_name="Date de naissance"
@@ -25,9 +68,10 @@ class User(AbstractUser):
         max_length=10, choices=ROLE_CHOICES, default="member", verbose_name="Rôle"
     )
 
-    # Groupe (placeholder – sera remplacé par une FK plus tard)
-    group_id = models.IntegerField(
-        null=True, blank=True, verbose_name="Identifiant du groupe"
+    # Groupe (FK indexée → jointures et classements par groupe)
+    group = models.ForeignKey(
+        Group, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name="members", verbose_name="Groupe",
     )
 
     # Compteur total de cigarettes
@@ -35,22 +79,163 @@ class User(AbstractUser):
         default=0, verbose_name="Cigarettes fumées depuis l’inscription"
     )
 
-    # Avatar uploadé par l’utilisateur → va dans MEDIA_ROOT/profiles/
+    # Avatar uploadé par l’utilisateur → va dans MEDIA_ROOT/profiles/ (brut en attente : profiles/raw/)
     # (L’image par défaut est gérée via STATIC en fallback dans profile_image_url)
     profile_image = models.ImageField(
         upload_to="profiles/", blank=True, null=True, verbose_name="Photo de profil"
     )
 
+    # False tant que l’avatar uploadé n’a pas été traité par le worker (process_avatars)
+    avatar_ready = models.BooleanField(default=False, verbose_name="Avatar traité")
+
     @property
     def profile_image_url(self):
         """
         URL de la photo :
-        - si l’utilisateur a uploadé une image → URL MEDIA
-        - sinon → fallback vers l’image par défaut en STATIC
+        - si l’utilisateur a uploadé une image déjà traitée → URL MEDIA
+        - sinon (pas d’image, ou traitement en attente) → image par défaut en STATIC
         """
-        if self.profile_image:
+        if self.profile_image and self.avatar_ready:
             return self.profile_image.url
         return static("image/profiles/imageProfilDefaut.png")
 
+    def profile_image_variant_url(self, size):
+        """
+        URL de la plus petite variante d’au moins `size` px.
+        Les avatars traités avant l’arrivée des variantes n’ont que l’image principale.
+        """
+        if not (self.profile_image and self.avatar_ready):
+            return self.profile_image_url
+        name = self.profile_image.name
+        if not is_hashed_name(name):
+            return self.profile_image.url
+        best = min((s for s in VARIANT_SIZES if s >= size), default=TARGET_SIZE)
+        return self.profile_image.storage.url(variant_name(name, best))
+
+    def profile_image_srcset(self, size):
+        """Valeur d’attribut srcset (1x / 2x) pour un affichage à `size` px CSS."""
+        return f"{self.profile_image_variant_url(size)} 1x, {self.profile_image_variant_url(size * 2)} 2x"
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Un email par compte, casse ignorée ; sert aussi d’index à User.objects.by_email()
+            models.UniqueConstraint(
+                Lower("email"),
+                condition=~models.Q(email=""),
+                name="accounts_user_email_ci_uniq",
+            ),
+        ]
+        # Recherche par préfixe de l’admin (accounts.admin.CustomUserAdmin.get_search_results)
+        indexes = [
+            models.Index(Lower("username"), name="accounts_user_username_lower"),
+            models.Index(Lower("first_name"), name="accounts_user_first_lower"),
+            models.Index(Lower("last_name"), name="accounts_user_last_lower"),
+            # « Ce fichier est-il encore utilisé ? » (accounts.media_gc) sans parcourir la table
+            models.Index(fields=["profile_image"], name="accounts_user_profile_image"),
+        ]
+
     def __str__(self):
         return self.username
+
+
+class AvatarJob(models.Model):
+    """
+    File d’attente (en base) des avatars à normaliser hors requête.
+    - Créée au save d’un User qui vient d’uploader une image brute
+    - Vidée par `python manage.py process_avatars`
+    Une job réussie est supprimée ; une job en échec reste visible dans l’admin.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "En attente"), (RUNNING, "En cours"), (FAILED, "Échec")]
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="avatar_jobs", verbose_name="Utilisateur"
+    )
+    # Nom (dans le storage) de l’upload brut à traiter
+    source = models.CharField(max_length=255, verbose_name="Fichier brut")
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Statut"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créée le")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Mise à jour le")
+
+    class Meta:
+        verbose_name = "traitement d’avatar"
+        verbose_name_plural = "traitements d’avatar"
+        indexes = [models.Index(fields=["status", "id"], name="accounts_avatarjob_queue")]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.source} ({self.status})"
+
+
+class OutboxEmail(models.Model):
+    """
+    Email en attente d’envoi (boîte d’envoi en base).
+    - Créé instantanément par accounts.mail.OutboxBackend (aucun appel réseau dans la requête)
+    - Envoyé par `python manage.py send_outbox` sur une seule connexion SMTP par lot
+    - En cas d’échec : nouvel essai plus tard (backoff exponentiel), puis statut "failed"
+    Un email envoyé est supprimé.
+    """
+
+    PENDING = "pending"
+    SENDING = "sending"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "En attente"), (SENDING, "En cours d’envoi"), (FAILED, "Échec")]
+
+    subject = models.CharField(max_length=998, blank=True, verbose_name="Sujet")
+    body = models.TextField(blank=True, verbose_name="Corps")
+    content_subtype = models.CharField(max_length=20, default="plain", verbose_name="Sous-type du corps")
+    from_email = models.CharField(max_length=254, verbose_name="Expéditeur")
+    to = models.JSONField(default=list, verbose_name="Destinataires")
+    cc = models.JSONField(default=list, blank=True, verbose_name="Copie")
+    bcc = models.JSONField(default=list, blank=True, verbose_name="Copie cachée")
+    reply_to = models.JSONField(default=list, blank=True, verbose_name="Répondre à")
+    headers = models.JSONField(default=dict, blank=True, verbose_name="En-têtes")
+    # [[contenu, mimetype], …] (ex : version HTML)
+    alternatives = models.JSONField(default=list, blank=True, verbose_name="Versions alternatives")
+    # [[nom, contenu base64, mimetype], …]
+    attachments = models.JSONField(default=list, blank=True, verbose_name="Pièces jointes")
+
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Statut"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochain essai")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Mis à jour le")
+
+    class Meta:
+        verbose_name = "email en attente"
+        verbose_name_plural = "emails en attente"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="accounts_outbox_due"),
+        ]
+
+    def __str__(self):
+        return f"{', '.join(self.to)}: {self.subject} ({self.status})"
+
+
+class PendingFileDeletion(models.Model):
+    """
+    Fichier média à supprimer (avatar remplacé, brut traité, compte supprimé…).
+    - Enregistré dans la transaction qui libère le fichier : un rollback l’annule,
+      et la requête ne fait aucun appel au storage
+    - Vidé par `python manage.py gc_media` (lots, hors requête), qui revérifie qu’aucun
+      compte ne référence le fichier (noms adressés par contenu, donc partageables)
+    """
+
+    name = models.CharField(max_length=255, unique=True, verbose_name="Fichier")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Demandée le")
+
+    class Meta:
+        verbose_name = "suppression de fichier en attente"
+        verbose_name_plural = "suppressions de fichier en attente"
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,32 @@
+# accounts/sessions.py
+"""
+Purge des sessions expirées (manage.py purge_sessions, en cron).
+
+- Sessions en base (db, cached_db) : suppression par lots de clés
+  → pas de DELETE géant qui verrouille la table (SQLite : toute la base)
+- Autres moteurs : clear_expired() du moteur (le cache et les cookies expirent seuls)
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.db import transaction
+from django.utils import timezone
+
+
+def purge_expired_sessions(batch_size=1000):
+    """Supprime les sessions expirées ; retourne le nombre de lignes supprimées (0 hors base)."""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not issubclass(store, DBStore):
+        store.clear_expired()
+        return 0
+
+    model = store.get_model_class()
+    now = timezone.now()
+    deleted = 0
+    while True:
+        keys = list(model.objects.filter(expire_date__lt=now).values_list("pk", flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        with transaction.atomic():
+            deleted += model.objects.filter(pk__in=keys).delete()[0]
@@ -2,74 +2,109 @@
 from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 
-from .models import User
-from .utils.images import process_avatar
+from .backends import invalidate_user
+from .media_gc import schedule_deletion
+from .models import AvatarJob, User
+from .utils.images import process_avatar_variants, raw_upload_name, store_avatar_variants
 
-# --- Helpers suppression de fichier ---
-def _delete_file_safely(field_file):
-    """
-    Supprime physiquement le fichier si présent.
-    Ne lève pas d’exception (fail-safe).
-    """
-    try:
-        if field_file and field_file.name and field_file.storage.exists(field_file.name):
-            field_file.storage.delete(field_file.name)
-    except Exception:
-        pass
+def _queue_raw_upload(instance):
+    """FileField.pre_save stockera le brut sous raw/ ; la job est créée en post_save."""
+    instance.profile_image.name = raw_upload_name(instance.profile_image.name)
+    instance.avatar_ready = False
+    instance._avatar_needs_processing = True
 
 @receiver(pre_save, sender=User)
-def user_avatar_pre_save(sender, instance: User, **kwargs):
+def user_avatar_pre_save(sender, instance: User, update_fields=None, **kwargs):
     """
     Avant de sauver :
-    - Si un nouvel avatar est fourni → on le normalise
-    - On mémorise l’ancienne image pour la supprimer après save
+    - Si l’avatar n’est pas concerné (update_fields) ou n’a pas changé → rien à faire,
+      et surtout aucune requête (ex : mise à jour de last_login au login)
+    - Si un nouvel avatar est fourni :
+        * AVATAR_ASYNC → le brut est stocké tel quel sous profiles/raw/ (nom aléatoire, jamais
+          servi), traitement différé (AvatarJob)
+        * sinon → on le normalise tout de suite ; en cas d’échec, le brut part aussi au worker
+          plutôt que d’être servi avec ses métadonnées
+    - On mémorise l’ancienne image pour programmer sa suppression après save
     """
-    # On cherche l’ancien user (si existe) pour comparer les fichiers
-    if instance.pk:
-        try:
-            old = User.objects.get(pk=instance.pk)
-        except User.DoesNotExist:
-            old = None
+    if update_fields is not None and "profile_image" not in update_fields:
+        return
+    if not instance.has_changed("profile_image"):
+        return
+
+    # Nom de l’ancien fichier : connu via le suivi des champs, sinon (instance
+    # construite à la main avec un pk) on le relit en base
+    if instance.has_original("profile_image"):
+        old_name = instance.get_original("profile_image")
+    elif instance.pk:
+        old_name = User.objects.filter(pk=instance.pk).values_list("profile_image", flat=True).first()
     else:
-        old = None
+        old_name = None
 
-    # Si un nouveau fichier est uploadé, on le traite
-    if instance.profile_image and hasattr(instance.profile_image, "file"):
+    # Nouveau fichier uploadé = pas encore écrit dans le storage (_committed False)
+    new_upload = bool(instance.profile_image) and not instance.profile_image._committed
+    if new_upload and settings.AVATAR_ASYNC:
+        _queue_raw_upload(instance)
+    elif new_upload:
         try:
-            processed = process_avatar(instance.profile_image.file)
-            # Remplace le contenu du champ sans save immédiat
-            instance.profile_image.save(processed.name, processed, save=False)
+            variants = process_avatar_variants(instance.profile_image.file)
+            # Écrit les variantes et pointe le champ sur la principale (sans save immédiat)
+            instance.profile_image = store_avatar_variants(sender._meta.get_field("profile_image"), variants)
+            instance.avatar_ready = True
         except Exception:
-            # En cas d’échec, on garde l’original
-            pass
+            # Échec : nouvel essai par le worker (process_avatars), image par défaut d’ici là
+            _queue_raw_upload(instance)
+    elif not instance.profile_image:
+        instance.avatar_ready = False
 
-    # Si l’ancien fichier existe et que le nom a changé → à supprimer après save
-    if old and old.profile_image and instance.profile_image and old.profile_image.name != instance.profile_image.name:
-        instance._old_profile_image_to_delete = old.profile_image
-    # Cas où on remplace une image par “rien” (clear)
-    elif old and old.profile_image and not instance.profile_image:
-        instance._old_profile_image_to_delete = old.profile_image
+    # Si l’ancien fichier existe et que le nom a changé (ou image retirée) → à supprimer après save
+    if old_name and old_name != instance.profile_image.name:
+        instance._old_profile_image_to_delete = old_name
 
 @receiver(post_save, sender=User)
 def user_avatar_post_save(sender, instance: User, created, **kwargs):
     """
     Après save :
-    - Si on a marqué une ancienne image → on la supprime maintenant
+    - Si un avatar brut attend son traitement → on crée la job (même transaction)
+    - Si on a marqué une ancienne image → suppression programmée (même transaction,
+      fichier effacé plus tard par gc_media : aucun appel au storage ici)
     """
-    old_file = getattr(instance, "_old_profile_image_to_delete", None)
-    if old_file:
-        _delete_file_safely(old_file)
-        try:
-            delattr(instance, "_old_profile_image_to_delete")
-        except Exception:
-            pass
+    if getattr(instance, "_avatar_needs_processing", False):
+        del instance._avatar_needs_processing
+        AvatarJob.objects.create(user=instance, source=instance.profile_image.name)
+
+    old_name = getattr(instance, "_old_profile_image_to_delete", None)
+    if old_name:
+        schedule_deletion(old_name)
+        del instance._old_profile_image_to_delete
 
 @receiver(post_delete, sender=User)
 def user_avatar_post_delete(sender, instance: User, **kwargs):
     """
     À la suppression du user :
-    - Supprime l'image associée du storage
+    - Programme la suppression de l’image associée (voir accounts.media_gc)
     """
     if instance.profile_image:
-        _delete_file_safely(instance.profile_image)
+        schedule_deletion(instance.profile_image.name)
+
+# --- Cache de l’utilisateur connecté (accounts.backends) ---
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_cache_invalidate(sender, instance: User, **kwargs):
+    invalidate_user(instance.pk)
+
+
+def update_last_login(sender, user, **kwargs):
+    """
+    Remplace le receiver user_logged_in de django.contrib.auth :
+    - UPDATE direct au lieu de user.save() → ni signaux pre/post_save ni sauvegarde complète
+    - au plus une écriture par LAST_LOGIN_UPDATE_INTERVAL (secondes) et par utilisateur
+    """
+    now = timezone.now()
+    interval = settings.LAST_LOGIN_UPDATE_INTERVAL
+    if user.last_login and (now - user.last_login).total_seconds() < interval:
+        return
+    user.last_login = now
+    User.objects.filter(pk=user.pk).update(last_login=now)
+    invalidate_user(user.pk)
@@ -0,0 +1,23 @@
+# accounts/templatetags/avatars.py
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+@register.simple_tag
+def avatar(user, size=48, css_class="avatar"):
+    """
+    <img> d’avatar responsive :
+    - src = plus petite variante couvrant `size` px
+    - srcset 1x / 2x → les écrans haute densité prennent la variante du dessus
+    Usage : {% load avatars %}{% avatar user 32 %}
+    """
+    return format_html(
+        '<img src="{}" srcset="{}" width="{}" height="{}" alt="{}" class="{}" loading="lazy">',
+        user.profile_image_variant_url(size),
+        user.profile_image_srcset(size),
+        size,
+        size,
+        f"Photo de {user.username}",
+        css_class,
+    )
@@ -1,3 +1,585 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings, skipUnlessDBFeature
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from clopetracker.bench import peak_rss_kib
+
+from .admin import CustomUserAdmin
+from .avatar_jobs import process_jobs
+from .forms import AvatarField
+from .mail import deliver_outbox
+from .media_gc import collect_pending
+from .models import AvatarJob, OutboxEmail, PendingFileDeletion, User
+from .sessions import purge_expired_sessions
+from .utils.images import (
+    VARIANT_SIZES, AvatarError, is_hashed_name, main_name, process_avatar, process_avatar_variants, variant_name,
+)
+from .views import serve_media
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="clopetracker-tests-")
+
+# Pas de manifest collectstatic en test → stockage statique simple
+TEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def make_image(size=(800, 600), fmt="JPEG", name="photo.jpg", color=(200, 80, 40)):
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STORAGES=TEST_STORAGES, AVATAR_ASYNC=True)
+class AsyncAvatarTests(TestCase):
+    def signup(self, username="alice"):
+        return self.client.post("/accounts/signup/", {
+            "username": username,
+            "email": f"{username}@example.com",
+            "first_name": "A",
+            "last_name": "B",
+            "password1": "Un-mot-de-passe-solide-42",
+            "password2": "Un-mot-de-passe-solide-42",
+            "profile_image": make_image(),
+        })
+
+    def test_signup_queues_job_and_serves_default(self):
+        response = self.signup()
+        self.assertEqual(response.status_code, 302)
+        user = User.objects.get(username="alice")
+        self.assertFalse(user.avatar_ready)
+        self.assertTrue(user.profile_image.name.endswith(".jpg"))
+        self.assertIn("imageProfilDefaut", user.profile_image_url)
+        self.assertEqual(AvatarJob.objects.filter(user=user, source=user.profile_image.name).count(), 1)
+
+    def test_raw_upload_is_renamed_and_never_served(self):
+        user = User(username="hex", profile_image=make_image(name="0123456789abcdef.JPG"))
+        user.save()
+        raw = user.profile_image.name
+        self.assertTrue(raw.startswith("profiles/raw/"))
+        self.assertTrue(raw.endswith(".jpg"))
+        self.assertNotIn("0123456789abcdef", raw)
+        self.assertTrue(user.profile_image.storage.exists(raw))
+        with self.assertRaises(Http404):
+            serve_media(RequestFactory().get("/media/x"), raw, document_root=MEDIA_ROOT)
+        # Le ramasse-miettes ne le confond pas avec une variante
+        self.assertEqual(main_name("profiles/raw/0123456789abcdef_48.jpg"), "profiles/raw/0123456789abcdef_48.jpg")
+
+    def test_worker_swaps_in_processed_file(self):
+        self.signup()
+        user = User.objects.get(username="alice")
+        raw = user.profile_image.name
+        self.assertEqual(process_jobs(), (1, 0))
+        user.refresh_from_db()
+        self.assertTrue(user.avatar_ready)
+        self.assertTrue(is_hashed_name(user.profile_image.name))
+        self.assertEqual(user.profile_image_url, user.profile_image.url)
+        # Brut mis en attente de suppression, effacé par gc_media
+        self.assertTrue(user.profile_image.storage.exists(raw))
+        self.assertEqual(collect_pending(), (1, 0))
+        self.assertFalse(user.profile_image.storage.exists(raw))
+        self.assertFalse(AvatarJob.objects.exists())
+        for size in VARIANT_SIZES:
+            variant = variant_name(user.profile_image.name, size)
+            self.assertTrue(user.profile_image.storage.exists(variant))
+            with user.profile_image.storage.open(variant) as fh:
+                self.assertEqual(Image.open(fh).size, (size, size))
+
+    def test_stale_job_is_dropped_when_avatar_changed(self):
+        self.signup()
+        user = User.objects.get(username="alice")
+        user.profile_image = None
+        user.save()
+        self.assertEqual(process_jobs(), (0, 0))
+        self.assertFalse(AvatarJob.objects.exists())
+
+    def test_command_with_process_pool(self):
+        self.signup("alice")
+        self.signup("bob")
+        call_command("process_avatars", workers=2, stdout=StringIO())
+        self.assertEqual(User.objects.filter(avatar_ready=True).count(), 2)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STORAGES=TEST_STORAGES)
+class DirtyFieldTrackingTests(TestCase):
+    password = "Un-mot-de-passe-solide-42"
+
+    def setUp(self):
+        self.user = User.objects.create_user("carol", email="carol@example.com", password=self.password)
+
+    def user_selects_by_pk(self, queries):
+        return [q["sql"] for q in queries if 'FROM "accounts_user" WHERE "accounts_user"."id" =' in q["sql"]]
+
+    def test_login_skips_avatar_lookup(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/accounts/login/", {"username": "carol", "password": self.password})
+        self.assertEqual(response.status_code, 302)
+        statements = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        # SELECT par username, session (SELECT + INSERT + UPDATE), UPDATE last_login
+        self.assertEqual(len(statements), 5)
+        self.assertEqual(self.user_selects_by_pk(ctx.captured_queries), [])
+
+    def test_profile_save_is_a_single_update(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = "Caroline"
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_tracking_follows_saves(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.has_changed("profile_image"))
+        user.profile_image = make_image()
+        self.assertEqual(user.changed_fields(), {"profile_image"})
+        self.assertEqual(user.changed_fields(update_fields=["first_name"]), set())
+        user.save()
+        self.assertFalse(user.has_changed("profile_image"))
+        self.assertEqual(user.get_original("profile_image"), user.profile_image.name)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STORAGES=TEST_STORAGES, AVATAR_ASYNC=False)
+class AvatarVariantTests(TestCase):
+    def make_user(self, username):
+        user = User(username=username, profile_image=make_image(name=f"{username}.jpg"))
+        user.save()
+        return user
+
+    def test_navbar_uses_small_variant_with_srcset(self):
+        user = self.make_user("dave")
+        self.assertTrue(user.profile_image_variant_url(32).endswith("_48.webp"))
+        self.assertIn("_96.webp 2x", user.profile_image_srcset(32))
+        self.assertEqual(user.profile_image_variant_url(512), user.profile_image.url)
+
+    def test_same_content_is_shared_and_kept_while_referenced(self):
+        first = self.make_user("erin")
+        second = self.make_user("frank")
+        self.assertEqual(first.profile_image.name, second.profile_image.name)
+        storage = first.profile_image.storage
+        name = first.profile_image.name
+        first.delete()
+        self.assertEqual(collect_pending(), (0, 1))
+        self.assertTrue(storage.exists(variant_name(name, 48)))
+        second.delete()
+        self.assertEqual(collect_pending(), (1, 0))
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(variant_name(name, 48)))
+
+    def test_failed_processing_queues_the_raw_upload(self):
+        with mock.patch("accounts.signals.process_avatar_variants", side_effect=AvatarError("boom")):
+            user = self.make_user("hank")
+        self.assertFalse(user.avatar_ready)
+        self.assertTrue(user.profile_image.name.startswith("profiles/raw/"))
+        self.assertNotIn("hank", user.profile_image.name)
+        self.assertIn("imageProfilDefaut", user.profile_image_url)
+        self.assertEqual(AvatarJob.objects.filter(user=user, source=user.profile_image.name).count(), 1)
+
+    def test_hashed_media_is_served_immutable(self):
+        user = self.make_user("gina")
+        request = RequestFactory().get("/media/x")
+        response = serve_media(request, user.profile_image.name, document_root=MEDIA_ROOT)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+
+
+class AvatarProcessingTests(TestCase):
+    def test_exif_orientation_is_applied_after_crop(self):
+        # Moitié gauche rouge, moitié droite bleue ; orientation 6 = rotation de 90° horaire
+        img = Image.new("RGB", (1200, 800), (255, 0, 0))
+        img.paste((0, 0, 255), (600, 0, 1200, 800))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", exif=exif)
+        buffer.name = "portrait.jpg"
+        out = Image.open(process_avatar(buffer))
+        self.assertEqual(out.size, (512, 512))
+        top, bottom = out.getpixel((256, 20)), out.getpixel((256, 490))
+        self.assertGreater(top[0], top[2])      # rouge en haut
+        self.assertGreater(bottom[2], bottom[0])  # bleu en bas
+
+    @override_settings(AVATAR_MAX_PIXELS=1_000_000)
+    def test_oversized_image_is_rejected_before_decoding(self):
+        with self.assertRaises(AvatarError):
+            process_avatar_variants(make_image(size=(1500, 1000)))
+
+    @override_settings(AVATAR_WEBP_METHOD=0, AVATAR_QUALITY=50)
+    def test_encoder_settings_are_honoured(self):
+        files = process_avatar_variants(make_image())
+        self.assertEqual([Image.open(f).size[0] for f in files], list(VARIANT_SIZES))
+
+
+def _upload_peak_rss_mib(body):
+    """
+    (processus enfant) Parse un POST multipart, valide l’avatar puis le traite.
+    Retourne le pic RSS ajouté par l’opération (Mio) et le type de fichier d’upload.
+    """
+    baseline = peak_rss_kib()
+    request = RequestFactory().generic("POST", "/accounts/signup/", body, content_type=MULTIPART_CONTENT)
+    upload = request.FILES["profile_image"]
+    for variant in process_avatar_variants(AvatarField().clean(upload)):
+        variant.close()
+    return (peak_rss_kib() - baseline) / 1024, type(upload).__name__
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STORAGES=TEST_STORAGES)
+class BoundedUploadTests(TestCase):
+    def test_processed_files_report_real_size(self):
+        for f in process_avatar_variants(make_image()):
+            self.assertEqual(f.size, len(f.read()))
+
+    @override_settings(AVATAR_MAX_UPLOAD_SIZE=50_000)
+    def test_oversize_upload_is_rejected_without_decoding(self):
+        data = make_image().read() + bytes(60_000)  # > 50 ko quoi qu’il arrive
+        response = self.client.post("/accounts/signup/", {
+            "username": "henry",
+            "email": "henry@example.com",
+            "password1": "Un-mot-de-passe-solide-42",
+            "password2": "Un-mot-de-passe-solide-42",
+            "profile_image": SimpleUploadedFile("big.jpg", data, "image/jpeg"),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("profile_image", response.context["form"].errors)
+        self.assertFalse(User.objects.filter(username="henry").exists())
+
+    def test_large_upload_peak_rss_stays_bounded(self):
+        # ~17 Mpx : un décodage pleine résolution coûterait ~52 Mio de pixels RGB
+        img = Image.effect_mandelbrot((4800, 3600), (-2.2, -1.2, 0.8, 1.2), 32).convert("RGB")
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=95)
+        del img
+        body = encode_multipart(BOUNDARY, {
+            "profile_image": SimpleUploadedFile("big.jpg", buffer.getvalue(), "image/jpeg"),
+        })
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            peak_mib, upload_type = pool.submit(_upload_peak_rss_mib, body).result()
+        self.assertEqual(upload_type, "TemporaryUploadedFile")  # > seuil → spoolé sur disque
+        self.assertLess(peak_mib, 32)
+
+
+class _StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Serveur SMTP minimal (sans TLS ni auth) : compte les connexions et garde les messages."""
+
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b"220 localhost stand-in ESMTP\r\n")
+        data, lines = False, []
+        for line in self.rfile:
+            if data:
+                if line == b".\r\n":
+                    self.server.messages.append(b"".join(lines))
+                    data, lines = False, []
+                    self.wfile.write(b"250 OK\r\n")
+                else:
+                    lines.append(line)
+                continue
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                self.wfile.write(b"250-localhost\r\n250 8BITMIME\r\n")
+            elif verb == b"DATA":
+                data = True
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif verb == b"QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                self.wfile.write(b"250 OK\r\n")
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StandInSMTPHandler)
+        self.connections = 0
+        self.messages = []
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+@override_settings(
+    EMAIL_BACKEND="accounts.mail.OutboxBackend",
+    OUTBOX_DELIVERY_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+    EMAIL_HOST="127.0.0.1", EMAIL_USE_TLS=False, EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="",
+    STORAGES=TEST_STORAGES,
+)
+class OutboxTests(TestCase):
+    def test_password_reset_is_only_queued(self):
+        User.objects.create_user("ivy", email="ivy@example.com", password="pw-ivy-123")
+        response = self.client.post("/accounts/password-reset/", {"email": "ivy@example.com"})
+        self.assertEqual(response.status_code, 302)
+        row = OutboxEmail.objects.get()
+        self.assertEqual(row.to, ["ivy@example.com"])
+        self.assertIn("/accounts/reset/", row.body)
+
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(3):
+            mail.send_mail(f"Sujet {i}", "Corps", "noreply@example.com", [f"u{i}@example.com"])
+        self.assertEqual(OutboxEmail.objects.count(), 3)
+        with StandInSMTPServer() as server, self.settings(EMAIL_PORT=server.server_address[1]):
+            self.assertEqual(deliver_outbox(), (3, 0))
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 3)
+        self.assertIn(b"Subject: Sujet 0", server.messages[0])
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_unreachable_server_backs_off_then_fails(self):
+        mail.send_mail("Sujet", "Corps", "noreply@example.com", ["x@example.com"])
+        with StandInSMTPServer() as server:
+            port = server.server_address[1]  # port libéré à la sortie → connexion refusée
+        with self.settings(EMAIL_PORT=port):
+            self.assertEqual(deliver_outbox(), (0, 1))
+            row = OutboxEmail.objects.get()
+            self.assertEqual((row.status, row.attempts), (OutboxEmail.PENDING, 1))
+            self.assertGreater(row.next_attempt_at, row.updated_at)
+            # Pas encore dû → rien à envoyer
+            self.assertEqual(deliver_outbox(), (0, 0))
+            OutboxEmail.objects.update(attempts=4, next_attempt_at=row.created_at)
+            deliver_outbox()
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.FAILED)
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES,
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    USER_CACHE_TIMEOUT=300,
+)
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("jade", password="pw-jade-123")
+
+    def _user_queries(self, path="/accounts/password-change/"):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries if "accounts_user" in q["sql"]], response
+
+    def test_user_and_session_are_read_from_cache(self):
+        self.client.force_login(self.user)
+        self._user_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/accounts/password-change/")
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_save_invalidates_cached_user(self):
+        self.client.force_login(self.user)
+        self._user_queries()
+        self.user.username = "jade2"
+        self.user.save()
+        queries, response = self._user_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, "jade2")
+
+    def test_password_change_still_ends_other_sessions(self):
+        self.client.force_login(self.user)
+        self._user_queries()
+        self.user.set_password("pw-jade-456")
+        self.user.save()
+        response = self.client.get("/accounts/password-change/")
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(LAST_LOGIN_UPDATE_INTERVAL=3600)
+    def test_last_login_is_written_at_most_once_per_interval(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.login(username="jade", password="pw-jade-123")
+        writes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE \"accounts_user\"")]
+        self.assertEqual(len(writes), 1)
+        self.assertNotIn("password", writes[0])  # UPDATE direct, pas de save() complet
+        first = User.objects.get(pk=self.user.pk).last_login
+        self.assertIsNotNone(first)
+
+        self.client.logout()
+        self.client.login(username="jade", password="pw-jade-123")
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_login, first)
+
+        User.objects.filter(pk=self.user.pk).update(last_login=first - timedelta(hours=2))
+        self.client.login(username="jade", password="pw-jade-123")
+        self.assertGreater(User.objects.get(pk=self.user.pk).last_login, first)
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+    def test_purge_deletes_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f"old{i}", session_data="", expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key="live", session_data="", expire_date=now + timedelta(days=1))
+        self.assertEqual(purge_expired_sessions(batch_size=2), 5)
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class EmailLookupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("kim", email="Kim@Example.com", password="pw-kim-123")
+
+    @skipUnlessDBFeature("supports_expression_indexes")
+    def test_lookup_uses_the_lower_email_index(self):
+        plan = User.objects.by_email("KIM@example.COM").explain()
+        if connection.vendor == "sqlite":
+            self.assertIn("USING INDEX accounts_user_email_ci_uniq", plan)
+        self.assertEqual(list(User.objects.by_email("KIM@example.COM")), [self.user])
+
+    def test_non_ascii_email_is_found_in_any_case(self):
+        emile = User.objects.create_user("emile", email="ÉMILE@Example.com")
+        # Même chaîne, autre casse ASCII : LOWER() doit s’appliquer pareil des deux côtés
+        self.assertEqual(list(User.objects.by_email("ÉMILE@EXAMPLE.COM")), [emile])
+        self.assertEqual(list(User.objects.by_email("ÉMILE@example.com")), [emile])
+
+    def test_case_duplicates_are_rejected(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user("kim2", email="kim@example.com")
+        # Les comptes sans email ne se gênent pas
+        User.objects.create_user("nomail1")
+        User.objects.create_user("nomail2")
+
+        response = self.client.post("/accounts/signup/", {
+            "username": "kim3", "email": "KIM@EXAMPLE.COM",
+            "password1": "pw-kim3-45678", "password2": "pw-kim3-45678",
+        })
+        self.assertFormError(response.context["form"], "email", "Un compte utilise déjà cet email.")
+
+    def test_password_reset_finds_account_regardless_of_case(self):
+        self.client.post("/accounts/password-reset/", {"email": "kim@EXAMPLE.com"})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+
+
+
+@override_settings(STORAGES=TEST_STORAGES, ADMIN_COUNT_ESTIMATE_THRESHOLD=3, USER_CACHE_TIMEOUT=300)
+class UserAdminTests(TestCase):
+    url = "/admin/accounts/user/"
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("root", "root@example.com", "pw-root-123")
+        for name in ("Alice", "alban", "bruno", "chloe", "zoe"):
+            User.objects.create_user(name, email=f"{name.lower()}@example.com", password="pw")
+        self.client.force_login(self.admin)
+
+    def _usernames(self, response):
+        return [user.username for user in response.context["cl"].result_list]
+
+    def test_estimated_count_and_cursor_walk(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertContains(response, "environ 6 utilisateurs")
+        self.assertFalse([q for q in ctx.captured_queries if "COUNT(" in q["sql"]])
+
+        # Pages de 2 lignes : on suit le lien « Suivant » (curseur) jusqu’au bout
+        seen = []
+        query = ""
+        with mock.patch.object(CustomUserAdmin, "list_per_page", 2):
+            for _ in range(5):
+                cl = self.client.get(self.url + query).context["cl"]
+                seen += [user.username for user in cl.result_list]
+                query = cl.next_cursor_url
+                if query is None:
+                    break
+            self.assertEqual(self.client.get(self.url, {"p": 20}).status_code, 302)  # OFFSET profond refusé
+        self.assertEqual(seen, list(User.objects.order_by("username").values_list("username", flat=True)))
+
+    def test_prefix_search_is_case_insensitive_and_indexed(self):
+        self.assertEqual(sorted(self._usernames(self.client.get(self.url, {"q": "AL"}))), ["Alice", "alban"])
+        # Préfixe seulement : plus de LIKE '%…%' sur toute la table
+        self.assertEqual(self._usernames(self.client.get(self.url, {"q": "lice"})), [])
+
+        queryset, _ = CustomUserAdmin(User, admin.site).get_search_results(None, User.objects.all(), "al")
+        self.assertIn("accounts_user_username_lower", queryset.explain())
+
+    def test_bulk_action_updates_in_chunks_and_refreshes_cached_users(self):
+        user = User.objects.get(username="bruno")
+        client = self.client_class()
+        client.force_login(user)
+        client.get("/")  # utilisateur mis en cache par le backend
+        with mock.patch("accounts.admin.BULK_CHUNK_SIZE", 1), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url + "?q=b", {
+                "action": "deactivate_users", "select_across": "1", "index": "0", "_selected_action": [user.pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.get(pk=user.pk).is_active)
+        self.assertTrue(User.objects.get(username="Alice").is_active)
+        # Utilisateur désactivé : l’entrée en cache est tombée, sa session ne le connecte plus
+        self.assertFalse(client.get("/").context["user"].is_authenticated)
+
+
+@override_settings(STORAGES=TEST_STORAGES, AVATAR_ASYNC=False, MEDIA_GC_MIN_AGE=3600)
+class MediaGcTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp(prefix="clopetracker-gc-")
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=location)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User(username="ines", profile_image=make_image(name="ines.jpg"))
+        self.user.save()
+        self.storage = self.user.profile_image.storage
+
+    def _age(self, name, seconds=7200):
+        past = time.time() - seconds
+        os.utime(self.storage.path(name), (past, past))
+
+    def test_replacement_is_deferred_and_rollback_keeps_file(self):
+        old = self.user.profile_image.name
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.user.profile_image = make_image(name="autre.jpg", color=(20, 160, 90))
+            self.user.save()
+            raise RuntimeError
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+        user = User.objects.get(pk=self.user.pk)
+        user.profile_image = make_image(name="nouvelle.jpg", color=(40, 40, 200))
+        user.save()
+        self.assertTrue(self.storage.exists(old))  # rien d’effacé pendant la requête
+        call_command("gc_media", no_scan=True, stdout=StringIO())
+        self.assertFalse(self.storage.exists(old))
+        self.assertFalse(self.storage.exists(variant_name(old, 48)))
+        self.assertTrue(self.storage.exists(user.profile_image.name))
+
+    def test_scan_removes_old_orphans_only(self):
+        current = self.user.profile_image.name
+        orphan, fresh = "profiles/0123456789abcdef.webp", "profiles/fedcba9876543210.webp"
+        for name in (orphan, variant_name(orphan, 48), fresh):
+            self.storage.save(name, BytesIO(b"x"))
+        for name in (current, variant_name(current, 48), orphan, variant_name(orphan, 48)):
+            self._age(name)
+
+        out = StringIO()
+        call_command("gc_media", batch_size=2, stdout=out)
+        self.assertIn("1 fichier(s) orphelin(s)", out.getvalue())
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertFalse(self.storage.exists(variant_name(orphan, 48)))
+        self.assertTrue(self.storage.exists(fresh))
+        self.assertTrue(self.storage.exists(current))
+        self.assertTrue(self.storage.exists(variant_name(current, 48)))
@@ -0,0 +1,50 @@
+# accounts/uploadhandlers.py
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class OversizeUploadedFile(UploadedFile):
+    """
+    Upload tronqué car plus gros que AVATAR_MAX_UPLOAD_SIZE.
+    Ne contient aucune donnée ; `size` = octets reçus avant abandon.
+    Le champ de formulaire le refuse sans jamais l’ouvrir.
+    """
+
+    oversize = True
+
+    def __init__(self, name, size, content_type, field_name=None):
+        super().__init__(BytesIO(), name=name, content_type=content_type, size=size)
+        self.field_name = field_name
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    """
+    Premier handler de la chaîne (FILE_UPLOAD_HANDLERS) :
+    dès qu’un fichier dépasse AVATAR_MAX_UPLOAD_SIZE, on arrête de transmettre
+    ses octets aux handlers suivants (mémoire / fichier temporaire) → ni RAM ni disque
+    consommés pour un upload qui sera refusé de toute façon.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.limit = settings.AVATAR_MAX_UPLOAD_SIZE
+        self.received = 0
+        # Content-Length de la partie : indicatif seulement (fourni par le client)
+        self.oversize = bool(self.content_length and self.content_length > self.limit)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.oversize or self.received > self.limit:
+            self.oversize = True
+            return None  # les handlers suivants ne reçoivent plus rien
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.oversize:
+            return None  # → le handler suivant fournit le fichier
+        return OversizeUploadedFile(
+            self.file_name, self.received, self.content_type, field_name=self.field_name
+        )
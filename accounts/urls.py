@@ -1,15 +1,17 @@
 from django.urls import path, reverse_lazy
 from django.contrib.auth import views as auth_views
+from clopetracker.pagecache import cache_anonymous_page
 from . import views
+from .forms import EmailPasswordResetForm
 
 app_name = "accounts"
 
 urlpatterns = [
     # --- Auth de base ---
     path("signup/", views.signup, name="signup"),
-    path("login/",  auth_views.LoginView.as_view(
+    path("login/",  cache_anonymous_page(auth_views.LoginView.as_view(
         template_name="accounts/login.html"
-    ), name="login"),
+    )), name="login"),
     path("logout/", auth_views.LogoutView.as_view(
         next_page=reverse_lazy("home")
     ), name="logout"),
@@ -35,6 +37,7 @@ urlpatterns = [
     path(
         "password-reset/",
         auth_views.PasswordResetView.as_view(
+            form_class=EmailPasswordResetForm,
             template_name="accounts/password_reset.html",
             email_template_name="accounts/password_reset_email.txt",
             subject_template_name="accounts/password_reset_subject.txt",
@@ -0,0 +1,70 @@
+# accounts/utils/dirty_fields.py
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+
+# Valeur absente (champ différé, instance jamais chargée depuis la base)
+_MISSING = object()
+
+
+class DirtyFieldsMixin:
+    """
+    Suivi des champs modifiés sans requête supplémentaire.
+    - Les valeurs d’origine des TRACKED_FIELDS sont mémorisées au chargement (from_db)
+    - Après chaque save(), elles sont rafraîchies (en respectant update_fields)
+    - Les fichiers sont comparés par nom ; un upload non encore stocké compte comme modifié
+    Usage :
+        class MonModele(DirtyFieldsMixin, models.Model):
+            TRACKED_FIELDS = ("champ",)
+    """
+
+    TRACKED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields(kwargs.get("update_fields"))
+
+    def _tracked_value(self, name):
+        value = self.__dict__.get(self._meta.get_field(name).attname, _MISSING)
+        if isinstance(value, FieldFile):
+            # Upload pas encore écrit dans le storage → forcément différent
+            return value.name if value._committed else _MISSING
+        if isinstance(value, File):
+            return _MISSING
+        return value
+
+    def _snapshot_tracked_fields(self, fields=None):
+        originals = getattr(self, "_original_values", {})
+        names = self.TRACKED_FIELDS if fields is None else set(self.TRACKED_FIELDS) & set(fields)
+        for name in names:
+            value = self._tracked_value(name)
+            if value is _MISSING:
+                originals.pop(name, None)
+            else:
+                originals[name] = value
+        self._original_values = originals
+
+    def has_original(self, name):
+        """True si la valeur d’origine du champ est connue (chargée depuis la base)."""
+        return name in getattr(self, "_original_values", {})
+
+    def get_original(self, name, default=None):
+        """Valeur d’origine du champ (nom du fichier pour un FileField)."""
+        return getattr(self, "_original_values", {}).get(name, default)
+
+    def has_changed(self, name):
+        """True si le champ a (peut-être) changé ; une origine inconnue compte comme un changement."""
+        if not self.has_original(name):
+            return True
+        value = self._tracked_value(name)
+        return value is _MISSING or value != self._original_values[name]
+
+    def changed_fields(self, update_fields=None):
+        """Champs suivis modifiés, limités à update_fields si fourni."""
+        names = self.TRACKED_FIELDS if update_fields is None else set(self.TRACKED_FIELDS) & set(update_fields)
+        return {name for name in names if self.has_changed(name)}
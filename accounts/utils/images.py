@@ -1,67 +1,237 @@
 # accounts/utils/images.py
-from io import BytesIO
+import hashlib
 import os
-import sys
-from PIL import Image, ImageOps
-from django.core.files.uploadedfile import InMemoryUploadedFile
+import re
+import uuid
+from tempfile import SpooledTemporaryFile
+from PIL import ExifTags, Image
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
 # Paramètres de normalisation
-TARGET_SIZE = 512     # avatar carré
-QUALITY = 85          # qualité d’encodage
+TARGET_SIZE = 512     # avatar carré (variante principale, stockée dans le champ)
 
-def process_avatar(uploaded_file) -> InMemoryUploadedFile:
+# Valeurs par défaut si absentes des settings (AVATAR_QUALITY, AVATAR_WEBP_METHOD, AVATAR_MAX_PIXELS)
+QUALITY = 85                 # qualité d’encodage
+WEBP_METHOD = 4              # effort WebP 0 (rapide) → 6 (plus lent, un peu plus compact)
+MAX_PIXELS = 50_000_000      # au-delà : refus avant décodage (bombe de décompression)
+SPOOL_MAX_MEMORY = 1024 * 1024  # au-delà : le fichier produit bascule de la RAM vers le disque
+
+# Variantes générées (px) : la plus grande est TARGET_SIZE
+VARIANT_SIZES = (512, 192, 96, 48)
+
+# Sous-dossier (de upload_to) des uploads bruts en attente : nom aléatoire, jamais servis
+# (EXIF / GPS encore présents avant normalisation)
+RAW_DIR = "raw"
+
+# Noms adressés par contenu : "<hash>.webp" (512) et "<hash>_<taille>.webp".
+# Jamais sous RAW_DIR/ : un brut nommé "0123456789abcdef.jpg" n’est pas immuable.
+HASHED_NAME_RE = re.compile(r"(^|/)(?<!\braw/)[0-9a-f]{16}(_\d+)?\.(webp|jpg)$")
+VARIANT_NAME_RE = re.compile(r"(^|/)(?<!\braw/)[0-9a-f]{16}_(?P<size>\d+)(?P<ext>\.(webp|jpg))$")
+
+# Orientation EXIF → transposition à appliquer
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+class AvatarError(ValueError):
+    """Image refusée avant décodage (trop de pixels, format illisible…)."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def check_dimensions(width, height):
+    """Lève AvatarError si l’image dépasse AVATAR_MAX_PIXELS (lu dans l’en-tête, sans décoder)."""
+    max_pixels = _setting("AVATAR_MAX_PIXELS", MAX_PIXELS)
+    if width * height > max_pixels:
+        raise AvatarError(
+            f"Image trop grande ({width}x{height} px, maximum {max_pixels // 1_000_000} Mpx)."
+        )
+
+
+def _load_square(uploaded_file, size=TARGET_SIZE):
     """
-    Normalise une photo de profil :
-    - Corrige l’orientation EXIF
-    - Crop centre → carré
-    - Resize en 512x512 (LANCZOS)
-    - Encode en WebP (fallback JPEG)
-    - Supprime les métadonnées
-    Retourne un InMemoryUploadedFile prêt pour un ImageField.
+    Ouvre l’image et produit directement un carré RGB de `size` px :
+    - Garde-fou sur le nombre de pixels (lu dans l’en-tête, avant décodage)
+    - JPEG : décodage réduit (draft, DCT 1/2 → 1/8) juste au-dessus de `size`
+    - Crop centre + resize en une passe (box), avec réduction rapide préalable (reducing_gap)
+    - Orientation EXIF appliquée sur le petit carré (le crop centré commute avec les rotations)
     """
     uploaded_file.seek(0)
     img = Image.open(uploaded_file)
+    check_dimensions(*img.size)
+    orientation = img.getexif().get(ExifTags.Base.Orientation, 1)
 
-    # Orientation EXIF (selfies en portrait, etc.)
-    img = ImageOps.exif_transpose(img)
+    # Décodage JPEG à résolution réduite : jamais moins de `size` sur le petit côté
+    if img.format == "JPEG":
+        img.draft("RGB", (size, size))
 
-    # Mode couleur compatible (pas d’alpha pour WebP/JPEG lossy)
-    if img.mode in ("P", "RGBA"):
+    # Mode couleur compatible (pas d’alpha ni de palette pour WebP/JPEG lossy)
+    if img.mode not in ("RGB", "L"):
         img = img.convert("RGB")
 
-    # Crop centre → carré
+    # Crop centre → carré, redimensionné dans la foulée
     w, h = img.size
     side = min(w, h)
     left = (w - side) // 2
     top = (h - side) // 2
-    img = img.crop((left, top, left + side, top + side))
+    img = img.resize(
+        (size, size), Image.Resampling.LANCZOS,
+        box=(left, top, left + side, top + side), reducing_gap=3.0,
+    )
+
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    return img.transpose(transpose) if transpose is not None else img
+
 
-    # Resize haute qualité
-    img = img.resize((TARGET_SIZE, TARGET_SIZE), Image.Resampling.LANCZOS)
+def _spooled():
+    return SpooledTemporaryFile(max_size=_setting("AVATAR_SPOOL_MAX_MEMORY", SPOOL_MAX_MEMORY))
 
-    # Tentative WebP (méthode=6). Fallback JPEG si besoin.
-    buffer = BytesIO()
-    out_ext = "webp"
-    out_format = "WEBP"
+
+def _encode(img):
+    """
+    Encode en WebP (effort AVATAR_WEBP_METHOD), fallback JPEG.
+    Écrit dans un fichier temporaire "spoolé" (RAM jusqu’à AVATAR_SPOOL_MAX_MEMORY).
+    Retourne (fichier rembobiné, taille réelle en octets, extension).
+    """
+    quality = _setting("AVATAR_QUALITY", QUALITY)
+    out = _spooled()
     try:
-        img.save(buffer, format=out_format, quality=QUALITY, method=6)
+        img.save(out, format="WEBP", quality=quality, method=_setting("AVATAR_WEBP_METHOD", WEBP_METHOD))
+        ext = "webp"
     except Exception:
-        buffer = BytesIO()
-        out_ext = "jpg"
-        out_format = "JPEG"
-        img.save(buffer, format=out_format, quality=QUALITY, optimize=True)
-
-    buffer.seek(0)
-
-    base_name, _ = os.path.splitext(getattr(uploaded_file, "name", "avatar"))
-    new_name = f"{base_name}.{out_ext}"
-    content_type = f"image/{'jpeg' if out_ext == 'jpg' else out_ext}"
-
-    return InMemoryUploadedFile(
-        buffer,
-        field_name=getattr(uploaded_file, "field_name", "profile_image"),
-        name=new_name,
-        content_type=content_type,
-        size=sys.getsizeof(buffer),
-        charset=None,
-    )
+        out.close()
+        out = _spooled()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+        ext = "jpg"
+    size = out.tell()
+    out.seek(0)
+    return out, size, ext
+
+
+def _digest(fh, chunk_size=64 * 1024):
+    """Hash SHA-256 (16 hex) d’un fichier lu par blocs, puis rembobiné."""
+    h = hashlib.sha256()
+    for chunk in iter(lambda: fh.read(chunk_size), b""):
+        h.update(chunk)
+    fh.seek(0)
+    return h.hexdigest()[:16]
+
+
+def variant_name(name, size):
+    """Nom de la variante `size` d’un avatar principal : <hash>.webp → <hash>_<size>.webp"""
+    if size == TARGET_SIZE:
+        return name
+    root, ext = os.path.splitext(name)
+    return f"{root}_{size}{ext}"
+
+
+def main_name(name):
+    """Inverse de variant_name : <hash>_<size>.webp → <hash>.webp (autres noms inchangés)."""
+    match = VARIANT_NAME_RE.search(name or "")
+    if not match or int(match["size"]) not in VARIANT_SIZES:
+        return name
+    return f"{name[:match.start('size') - 1]}{match['ext']}"
+
+
+def raw_upload_name(name):
+    """Nom (relatif à upload_to) d’un upload brut : raw/<aléatoire>.<ext>, pas le nom d’origine."""
+    return f"{RAW_DIR}/{uuid.uuid4().hex}{os.path.splitext(name)[1].lower()}"
+
+
+def is_raw_name(name):
+    """True pour un upload brut en attente de traitement (à ne jamais servir)."""
+    return f"/{RAW_DIR}/" in f"/{name or ''}"
+
+
+def is_hashed_name(name):
+    """True si le nom est adressé par contenu (donc immuable, cacheable longtemps)."""
+    return bool(HASHED_NAME_RE.search(name or ""))
+
+
+def process_avatar_variants(uploaded_file) -> list[UploadedFile]:
+    """
+    Normalise une photo de profil en plusieurs tailles :
+    - Refuse les images démesurées avant décodage (AvatarError)
+    - Décode à résolution réduite quand le format le permet (JPEG)
+    - Crop centre → carré, corrige l’orientation EXIF
+    - Resize en VARIANT_SIZES (LANCZOS, chaque taille depuis la précédente)
+    - Encode en WebP (fallback JPEG) dans des fichiers temporaires "spoolés"
+    - Supprime les métadonnées
+    - Nomme les fichiers d’après le hash du contenu de la variante principale
+    Retourne les fichiers (taille exacte dans .size), variante principale (TARGET_SIZE) en premier.
+    """
+    img = _load_square(uploaded_file, VARIANT_SIZES[0])
+
+    encoded = []
+    for size in VARIANT_SIZES:
+        if img.size != (size, size):
+            img = img.resize((size, size), Image.Resampling.LANCZOS)
+        encoded.append((size, *_encode(img)))
+
+    # Même hash pour toutes les variantes → noms dérivables depuis le principal
+    digest = _digest(encoded[0][1])
+    field_name = getattr(uploaded_file, "field_name", "profile_image")
+
+    files = []
+    for size, out, nbytes, out_ext in encoded:
+        content_type = f"image/{'jpeg' if out_ext == 'jpg' else out_ext}"
+        f = UploadedFile(
+            out,
+            name=variant_name(f"{digest}.{out_ext}", size),
+            content_type=content_type,
+            size=nbytes,
+            charset=None,
+        )
+        f.field_name = field_name
+        files.append(f)
+    return files
+
+
+def process_avatar(uploaded_file) -> UploadedFile:
+    """
+    Normalise une photo de profil (variante principale 512x512 uniquement).
+    Retourne un UploadedFile prêt pour un ImageField.
+    """
+    files = process_avatar_variants(uploaded_file)
+    for extra in files[1:]:
+        extra.close()
+    return files[0]
+
+
+def store_avatar_variants(field, files):
+    """
+    Écrit les variantes dans le storage du champ et retourne le nom de la principale.
+    Les noms sont adressés par contenu : un fichier déjà présent est identique,
+    on le réutilise au lieu d’en créer une copie renommée.
+    """
+    names = []
+    for f in files:
+        name = field.generate_filename(None, f.name)
+        if not field.storage.exists(name):
+            name = field.storage.save(name, f)
+        f.close()
+        names.append(name)
+    return names[0]
+
+
+def delete_avatar_variants(storage, name):
+    """Supprime un avatar et ses variantes du storage. Ne lève pas d’exception (fail-safe)."""
+    # Un upload brut (nom non haché) n’a pas de variantes
+    sizes = VARIANT_SIZES if is_hashed_name(name) else (TARGET_SIZE,)
+    for size in sizes:
+        try:
+            variant = variant_name(name, size)
+            if storage.exists(variant):
+                storage.delete(variant)
+        except Exception:
+            pass
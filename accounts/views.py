@@ -1,7 +1,16 @@
+from django.http import Http404
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.contrib.auth import login
+from django.utils.cache import patch_cache_control
+from django.views import static
 from .forms import UserRegistrationForm
+from .utils.images import is_hashed_name, is_raw_name
+
+# Fichiers adressés par contenu : ne changent jamais → cache navigateur / CDN d’un an
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# Autres fichiers media (anciens avatars non hachés) : cache court
+MEDIA_MAX_AGE = 60 * 5
 
 def signup(request):
     """
@@ -20,3 +29,19 @@ def signup(request):
     else:
         form = UserRegistrationForm()
     return render(request, "accounts/signup.html", {"form": form})
+
+def serve_media(request, path, document_root=None):
+    """
+    Sert MEDIA_ROOT (comme django.views.static.serve) avec des en-têtes de cache :
+    - avatar nommé par hash de contenu → public, max-age=1 an, immutable
+    - upload brut en attente (profiles/raw/) → 404 : métadonnées EXIF / GPS intactes
+    - sinon → cache court
+    """
+    if is_raw_name(path):
+        raise Http404("Fichier introuvable.")
+    response = static.serve(request, path, document_root=document_root)
+    if is_hashed_name(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE)
+    return response
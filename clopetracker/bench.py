@@ -0,0 +1,52 @@
+# clopetracker/bench.py
+"""
+Petits outils communs aux commandes de benchmark (manage.py bench_*).
+- percentile() / summarize() : statistiques de latence
+- peak_rss_kib() : pic de mémoire résidente du processus (Linux / macOS)
+- format_table() : tableau texte aligné pour la sortie console
+"""
+import math
+import resource
+import sys
+
+
+def percentile(values, p):
+    """Percentile `p` (0-100) par la méthode du rang le plus proche."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(durations):
+    """Résumé d’une série de durées (secondes) → millisecondes."""
+    return {
+        "n": len(durations),
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+        "max_ms": max(durations, default=0.0) * 1000,
+    }
+
+
+def peak_rss_kib():
+    """Pic RSS du processus courant en Kio (ru_maxrss est en octets sous macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def format_table(headers, rows):
+    """Tableau texte aligné (première colonne à gauche, les autres à droite)."""
+    cells = [[str(h) for h in headers]] + [
+        [f"{c:.1f}" if isinstance(c, float) else str(c) for c in row] for row in rows
+    ]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(headers))]
+    lines = []
+    for n, row in enumerate(cells):
+        lines.append("  ".join(
+            c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(row, widths))
+        ))
+        if n == 0:
+            lines.append("  ".join("-" * w for w in widths))
+    return "\n".join(lines)
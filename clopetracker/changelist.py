@@ -0,0 +1,191 @@
+# clopetracker/changelist.py
+"""
+Listes de l’admin pour les grandes tables (voir accounts.admin.CustomUserAdmin).
+
+- EstimatedCountPaginator : plus de COUNT(*) exact au-delà de ADMIN_COUNT_ESTIMATE_THRESHOLD
+  * table entière → estimation du SGBD (pg_class.reltuples, bornes de l’id sous SQLite)
+  * liste filtrée / recherche → comptage borné (COUNT sur une sous-requête avec LIMIT)
+- KeysetChangeList : au-delà des MAX_OFFSET_PAGES premières pages, navigation par curseur
+  (?after=<id> : WHERE (colonnes de tri) > valeurs de la dernière ligne) au lieu d’un OFFSET
+  qui relit toutes les lignes précédentes
+- LargeTableAdminMixin : branche les deux (et coupe le second COUNT, show_full_result_count)
+- chunked_update : actions de masse en UPDATE par paquets d’ids (une transaction par paquet)
+- prefix_range : recherche par préfixe écrite pour un index (>= / <), pas de LIKE '%…%'
+"""
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections, transaction
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Concat
+from django.utils.functional import cached_property
+
+# Paramètre d’URL du curseur (id de la dernière ligne affichée)
+CURSOR_VAR = "after"
+
+# Pages numérotées (OFFSET) proposées ; au-delà, uniquement le curseur
+MAX_OFFSET_PAGES = 10
+
+# Plus grand point de code : borne haute d’un préfixe
+_MAX_CHAR = "\U0010ffff"
+
+
+def estimated_count(model, using="default"):
+    """Nombre de lignes estimé de la table du modèle (None si le SGBD n’en fournit pas)."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None  # -1 : jamais analysée
+        if connection.vendor == "sqlite":
+            # Deux lectures d’index (min / max isolés) ; majorant : ids supprimés compris
+            table = connection.ops.quote_name(table)
+            cursor.execute(f"SELECT (SELECT MAX(rowid) FROM {table}) - (SELECT MIN(rowid) FROM {table}) + 1")
+            row = cursor.fetchone()
+            return row[0] if row and row[0] is not None else 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator de l’admin dont count reste borné (voir le docstring du module)."""
+
+    # Affiché devant count quand il n’est pas exact : "environ" (estimation), "au moins" (seuil)
+    count_note = ""
+
+    @cached_property
+    def count(self):
+        threshold = settings.ADMIN_COUNT_ESTIMATE_THRESHOLD
+        queryset = self.object_list
+        if not threshold:
+            return super().count
+        if not queryset.query.has_filters():
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= threshold:
+                self.count_note = "environ"
+                return estimate
+            return super().count
+        count = queryset.order_by()[:threshold].count()
+        if count >= threshold:
+            self.count_note = "au moins"
+        return count
+
+    def validate_number(self, number):
+        number = super().validate_number(number)
+        if number > MAX_OFFSET_PAGES:
+            raise EmptyPage(f"Au-delà de la page {MAX_OFFSET_PAGES}, suivre le lien « Suivant »")
+        return number
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList avec navigation par curseur (?after=<id>) en plus des premières pages."""
+
+    cursor = None
+    next_cursor_url = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def _keyset_fields(self):
+        """[(champ, décroissant)] du tri si on peut en faire un curseur (champs non nuls), sinon None."""
+        fields = []
+        for item in self.queryset.query.order_by:
+            if not isinstance(item, str):
+                return None
+            name = item.lstrip("-")
+            try:
+                field = self.opts.pk if name == "pk" else self.opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null:
+                return None
+            fields.append((name, item.startswith("-")))
+        return fields or None
+
+    def _after(self, fields, cursor):
+        """Lignes situées après la ligne `cursor` dans l’ordre du tri (comparaison de tuples)."""
+        try:
+            pk = self.opts.pk.to_python(cursor)
+        except ValidationError:
+            raise IncorrectLookupParameters
+        values = self.root_queryset.filter(pk=pk).values(*(name for name, _ in fields)).first()
+        if values is None:
+            raise IncorrectLookupParameters
+        condition = Q(pk__in=[])
+        for i, (name, desc) in enumerate(fields):
+            equal = {prev: values[prev] for prev, _ in fields[:i]}
+            condition |= Q(**equal, **{f"{name}__{'lt' if desc else 'gt'}": values[name]})
+        return self.queryset.filter(condition)
+
+    def get_results(self, request):
+        # Retiré des paramètres : les liens de pages et de tri repartent du début
+        cursor = self.params.pop(CURSOR_VAR, None)
+        super().get_results(request)
+        fields = self._keyset_fields()
+        # list_editable : le formset attend un QuerySet non découpé par curseur
+        if fields is None or self.list_editable:
+            return
+        if cursor is not None:
+            self.cursor = cursor
+            self.result_list = self._after(fields, cursor)[:self.list_per_page]
+            self.multi_page = True
+        if not self.multi_page:
+            return
+        rows = self.result_list
+        if len(rows) == self.list_per_page:  # évalue la page une fois (réutilisée par le template)
+            self.next_cursor_url = self.get_query_string({CURSOR_VAR: rows[len(rows) - 1].pk}, [PAGE_VAR])
+
+    @property
+    def offset_page_range(self):
+        return range(1, min(self.paginator.num_pages, MAX_OFFSET_PAGES) + 1)
+
+
+class LargeTableAdminMixin:
+    """À placer avant ModelAdmin (ou UserAdmin) : comptage borné + pagination par curseur."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = "admin/large_change_list.html"
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+def chunked_update(queryset, chunk_size=1000, on_chunk=None, **values):
+    """
+    queryset.update(**values) par paquets d’ids (parcours par clé, une transaction par paquet)
+    → verrous courts même sur toute la table ; on_chunk(ids) appelé dans chaque transaction.
+    Retourne le nombre de lignes mises à jour.
+    """
+    model = queryset.model
+    ids = queryset.order_by("pk").values_list("pk", flat=True)
+    updated = 0
+    last = None
+    while True:
+        page = ids if last is None else ids.filter(pk__gt=last)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return updated
+        with transaction.atomic():
+            if on_chunk:
+                on_chunk(chunk)
+            updated += model._default_manager.filter(pk__in=chunk).update(**values)
+        last = chunk[-1]
+
+
+def prefix_range(lookup, prefix):
+    """
+    Q « lookup commence par prefix » en intervalle [prefix, prefix + max[ (utilisable par un index).
+    prefix : chaîne ou expression (ex : Lower(Value(terme)), minuscules calculées par le SGBD
+    comme celles de l’index)
+    """
+    if isinstance(prefix, str):
+        upper = prefix + _MAX_CHAR
+    else:
+        upper = Concat(prefix, Value(_MAX_CHAR), output_field=CharField())
+    return Q(**{f"{lookup}__gte": prefix, f"{lookup}__lt": upper})
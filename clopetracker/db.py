@@ -0,0 +1,93 @@
+# clopetracker/db.py
+"""
+Réglages base de données.
+
+- apply_sqlite_pragmas : mode "production" SQLite (SQLITE_TUNING=True), appliqué à chaque
+  nouvelle connexion (signal connection_created) :
+  WAL (lecteurs et écrivain ne se bloquent plus), synchronous=NORMAL, busy_timeout,
+  mmap et cache de pages
+- TrackerReadRouter : lectures du tracker vers l’alias TRACKER_READ_DATABASE (réplica),
+  écritures et migrations sur "default"
+  * dans une transaction ouverte sur "default", tout reste sur "default"
+  * EventArchive toujours lu sur "default" (voir primary_models)
+  * using_primary() force "default" (lecture de ses propres écritures, résultats mis en cache)
+- copy_sqlite_database : instantané cohérent d’un fichier SQLite (réplica "second fichier")
+"""
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_pinned_to_primary = ContextVar("pinned_to_primary", default=False)
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Receiver de connection_created : PRAGMAs de SQLITE_PRAGMAS si SQLITE_TUNING."""
+    if connection.vendor != "sqlite" or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@contextmanager
+def using_primary():
+    """Dans ce bloc, le routeur envoie aussi les lectures sur "default"."""
+    token = _pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+class TrackerReadRouter:
+    """Envoie les lectures des modèles `tracker` sur le réplica (TRACKER_READ_DATABASE)."""
+
+    app_labels = {"tracker"}
+    # Lus sur le primaire : chaque ligne désigne un fichier d’archive que le compactage
+    # supprime après commit ; un réplica en retard pointerait un fichier déjà effacé
+    primary_models = {"tracker.eventarchive"}
+
+    def _replica(self):
+        alias = getattr(settings, "TRACKER_READ_DATABASE", None)
+        return alias if alias and alias in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.app_labels or _pinned_to_primary.get():
+            return None
+        if model._meta.label_lower in self.primary_models:
+            return DEFAULT_DB_ALIAS
+        # Transaction en cours sur le primaire : lire ailleurs verrait un autre état
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self._replica()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS if model._meta.app_label in self.app_labels else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Le réplica est une copie du primaire : relations permises entre les deux
+        aliases = {DEFAULT_DB_ALIAS, self._replica()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Le réplica reçoit son schéma par réplication / copie, jamais par migrate
+        if db == self._replica():
+            return False
+        return None
+
+
+def copy_sqlite_database(source, target):
+    """Copie cohérente (API backup de SQLite) de `source` vers `target`, même pendant des écritures."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        with dst:
+            src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
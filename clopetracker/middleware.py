@@ -0,0 +1,84 @@
+# clopetracker/middleware.py
+"""
+Middlewares du projet.
+- WhiteNoiseAsyncMiddleware : WhiteNoise utilisable nativement sous ASGI
+- PerformanceMiddleware : temps total / SQL / templates par requête (clopetracker.perf)
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import perf
+
+
+class WhiteNoiseAsyncMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware est sync-only : sous ASGI, Django l’adapte et fait passer
+    TOUTES les requêtes (même non statiques) par un thread en plus.
+    Ici la pile reste async : la recherche du fichier est un simple accès dict
+    (ou un stat() en dev avec autorefresh), rien qui bloque la boucle.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    def _static_file(self, request):
+        if self.autorefresh:
+            return self.find_file(request.path_info)
+        return self.files.get(request.path_info)
+
+    async def __acall__(self, request):
+        static_file = self._static_file(request)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class PerformanceMiddleware:
+    """
+    Mesure chaque requête (sync ou async) : en-tête Server-Timing (PERF_SERVER_TIMING)
+    et une ligne JSON dans le logger "clopetracker.perf" (lente / N+1 → WARNING).
+    À placer en tête de MIDDLEWARE pour inclure le coût des autres middlewares.
+    Désactivé par PERF_INSTRUMENTATION=False.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token = perf.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            perf.stop_request(token)
+        return perf.finish_request(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = perf.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            perf.stop_request(token)
+        return perf.finish_request(request, response, metrics)
@@ -0,0 +1,128 @@
+# clopetracker/pagecache.py
+"""
+Cache de pages entières pour les visiteurs anonymes (accueil, login…).
+
+- cache_anonymous_page : décorateur de vue (sync ou async) ; seules les requêtes GET / HEAD
+  sans cookie de session ni de messages passent par le cache → aucun risque de servir
+  la page d’un utilisateur connecté ou d’avaler un message flash
+- La page est rendue avec un jeton CSRF factice (context processor csrf_placeholder),
+  stockée telle quelle, puis le jeton du visiteur est injecté à chaque réponse
+  → un formulaire en cache reste valide pour chacun, cookie CSRF posé comme d’habitude
+- Vary: Cookie + Cache-Control private : les caches partagés (CDN, proxy) ne doivent
+  jamais resservir une page qui contient un jeton CSRF
+- PAGE_CACHE_TIMEOUT = 0 → désactivé
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+# Jeton factice rendu dans les pages mises en cache (jamais envoyé tel quel)
+CSRF_PLACEHOLDER = "__clopetracker_csrf_token__"
+
+# En-têtes de la réponse d’origine rejoués depuis le cache
+_REPLAYED_HEADERS = ("Content-Type", "Cache-Control", "Content-Language", "X-Frame-Options")
+
+
+def csrf_placeholder(request):
+    """Context processor : jeton factice pendant le rendu d’une page destinée au cache."""
+    if getattr(request, "_csrf_placeholder", False):
+        return {"csrf_token": CSRF_PLACEHOLDER}
+    return {}
+
+
+def _cacheable(request):
+    return (
+        settings.PAGE_CACHE_TIMEOUT
+        and request.method in ("GET", "HEAD")
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+def _page_key(request):
+    url = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+    return f"pagecache:{url}"
+
+
+def _entry(response):
+    """Réponse → entrée de cache (None si elle ne doit pas être mise en cache)."""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    headers = {h: response[h] for h in _REPLAYED_HEADERS if response.has_header(h)}
+    return response.content, headers
+
+
+def _inject_token(request, content):
+    if CSRF_PLACEHOLDER.encode() not in content:
+        return content
+    return content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+def _respond(request, entry):
+    """Entrée de cache → réponse pour ce visiteur (jeton CSRF injecté)."""
+    content, headers = entry
+    response = HttpResponse(_inject_token(request, content))
+    for header, value in headers.items():
+        response[header] = value
+    patch_vary_headers(response, ("Cookie",))
+    patch_cache_control(response, private=True)
+    return response
+
+
+def _render(response):
+    # TemplateResponse (vues génériques) : rendu différé, forcé avant lecture du contenu
+    if hasattr(response, "render") and not response.is_rendered:
+        response.render()
+    return response
+
+
+def _uncached(request, response):
+    """Réponse rendue pour le cache mais non cacheable : on y met quand même le vrai jeton."""
+    if not response.streaming:
+        response.content = _inject_token(request, response.content)
+    return response
+
+
+def cache_anonymous_page(view):
+    """Met en cache la page rendue pour les visiteurs anonymes (voir le docstring du module)."""
+    if iscoroutinefunction(view):
+        async def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                return await view(request, *args, **kwargs)
+            key = _page_key(request)
+            entry = await cache.aget(key)
+            if entry is None:
+                request._csrf_placeholder = True
+                response = _render(await view(request, *args, **kwargs))
+                request._csrf_placeholder = False
+                entry = _entry(response)
+                if entry is None:
+                    return _uncached(request, response)
+                await cache.aset(key, entry, settings.PAGE_CACHE_TIMEOUT)
+            return _respond(request, entry)
+
+        markcoroutinefunction(wrapper)
+    else:
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                return view(request, *args, **kwargs)
+            key = _page_key(request)
+            entry = cache.get(key)
+            if entry is None:
+                request._csrf_placeholder = True
+                response = _render(view(request, *args, **kwargs))
+                request._csrf_placeholder = False
+                entry = _entry(response)
+                if entry is None:
+                    return _uncached(request, response)
+                cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT)
+            return _respond(request, entry)
+
+    return wraps(view)(wrapper)
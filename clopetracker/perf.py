@@ -0,0 +1,145 @@
+# clopetracker/perf.py
+"""
+Instrumentation des requêtes (PerformanceMiddleware).
+
+- RequestMetrics : temps total, requêtes SQL (nombre, durée), rendu des templates
+- record_query : execute wrapper installé sur chaque connexion (connection_created) ;
+  ne fait rien hors requête instrumentée (contextvar vide)
+- InstrumentedDjangoTemplates : backend de templates qui chronomètre le rendu
+- N+1 : même requête SQL (paramètres exclus) répétée PERF_N_PLUS_ONE_THRESHOLD fois
+- Journal structuré (logger "clopetracker.perf", une ligne JSON par requête)
+  → `python manage.py perf_report` en tire des percentiles par vue
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger("clopetracker.perf")
+
+_current = ContextVar("request_metrics", default=None)
+
+# "IN (%s, %s, %s)" → "IN (%s…)" : même forme quelle que soit la taille de la liste
+_PARAM_LIST_RE = re.compile(r"\((?:%s, )+%s\)")
+
+
+class RequestMetrics:
+    __slots__ = ("start", "queries", "db_time", "template_time", "_template_depth", "statements")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+        self.statements = Counter()
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[_PARAM_LIST_RE.sub("(%s…)", sql)] += 1
+
+    def repeated_statements(self, threshold):
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+def start_request():
+    """Ouvre la mesure d’une requête → (métriques, jeton pour stop_request)."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop_request(token):
+    _current.reset(token)
+
+
+# --- Base de données ---
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Receiver de connection_created : ajoute record_query à la connexion (une seule fois)."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# --- Templates ---
+
+class _TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Templates rendus depuis un template (render_to_string dans un tag…) : comptés une fois
+        metrics._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics._template_depth -= 1
+            if metrics._template_depth == 0:
+                metrics.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates dont les templates mesurent leur temps de rendu."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# --- Restitution ---
+
+def server_timing(metrics, total):
+    """Valeur de l’en-tête Server-Timing (durées en ms ; db et tpl peuvent se chevaucher)."""
+    return ", ".join((
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} requête(s) SQL"',
+        f"tpl;dur={metrics.template_time * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ))
+
+
+def finish_request(request, response, metrics):
+    """Journalise la requête et ajoute Server-Timing si activé. Retourne la réponse."""
+    total = time.perf_counter() - metrics.start
+    match = getattr(request, "resolver_match", None)
+    repeated = metrics.repeated_statements(settings.PERF_N_PLUS_ONE_THRESHOLD)
+    slow = total * 1000 >= settings.PERF_SLOW_REQUEST_MS
+    record = {
+        "ts": time.time(),
+        "view": match.view_name if match else None,
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+        "total_ms": round(total * 1000, 2),
+        "db_ms": round(metrics.db_time * 1000, 2),
+        "queries": metrics.queries,
+        "template_ms": round(metrics.template_time * 1000, 2),
+        "slow": slow,
+        "n_plus_one": [{"sql": sql, "count": n} for sql, n in repeated],
+    }
+    logger.log(logging.WARNING if slow or repeated else logging.INFO, json.dumps(record, ensure_ascii=False))
+    if settings.PERF_SERVER_TIMING:
+        response["Server-Timing"] = server_timing(metrics, total)
+    return response
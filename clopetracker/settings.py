@@ -10,6 +10,7 @@ Django settings for clopetracker project.
 # pip install python-decouple dj-database-url whitenoise
 # (et plus tard, si tu passes à Postgres : pip install psycopg2-binary)
 
+import sys
 from pathlib import Path
 from decouple import config
 import dj_database_url
@@ -47,10 +48,14 @@ INSTALLED_APPS = [
 
 # ========= Middleware =========
 MIDDLEWARE = [
+    # Mesures par requête (Server-Timing, journal des requêtes lentes / N+1) : en premier
+    'clopetracker.middleware.PerformanceMiddleware',
+
     'django.middleware.security.SecurityMiddleware',
 
     # Whitenoise : sert les fichiers statiques en prod sans config Nginx complexe
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # (variante async-capable : pas de thread supplémentaire par requête sous ASGI)
+    'clopetracker.middleware.WhiteNoiseAsyncMiddleware',
 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,7 +71,8 @@ ROOT_URLCONF = 'clopetracker.urls'
 # ========= Templates =========
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates + mesure du temps de rendu (clopetracker.perf)
+        'BACKEND': 'clopetracker.perf.InstrumentedDjangoTemplates',
         # On pointe sur le dossier "templates" à la racine du projet
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,  # cherche aussi dans <app>/templates/
@@ -75,6 +81,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # Jeton CSRF factice pour les pages mises en cache (clopetracker.pagecache)
+                'clopetracker.pagecache.csrf_placeholder',
             ],
         },
     },
@@ -83,6 +91,43 @@ TEMPLATES = [
 # ========= WSGI =========
 WSGI_APPLICATION = 'clopetracker.wsgi.application'
 
+# ========= Instrumentation des requêtes =========
+# PerformanceMiddleware : temps total, SQL (nombre / durée) et rendu des templates.
+# - Server-Timing exposé au navigateur (DevTools) : par défaut seulement en DEBUG
+# - Requête lente (ms) ou même requête SQL répétée N fois (N+1) → log WARNING
+# - PERF_LOG_FILE : journal JSON de TOUTES les requêtes, résumé par `manage.py perf_report`
+PERF_INSTRUMENTATION = config("PERF_INSTRUMENTATION", cast=bool, default=True)
+PERF_SERVER_TIMING = config("PERF_SERVER_TIMING", cast=bool, default=DEBUG)
+PERF_SLOW_REQUEST_MS = config("PERF_SLOW_REQUEST_MS", cast=int, default=500)
+PERF_N_PLUS_ONE_THRESHOLD = config("PERF_N_PLUS_ONE_THRESHOLD", cast=int, default=5)
+PERF_LOG_FILE = config("PERF_LOG_FILE", default="")
+
+# `manage.py test` : journal perf muet (les tests le lisent avec assertLogs)
+_TESTING = sys.argv[1:2] == ["test"]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"raw": {"format": "%(message)s"}},
+    "handlers": {
+        "perf": (
+            {"class": "logging.NullHandler"}
+            if _TESTING
+            else {"class": "logging.handlers.WatchedFileHandler", "filename": PERF_LOG_FILE, "formatter": "raw"}
+            if PERF_LOG_FILE
+            else {"class": "logging.StreamHandler", "formatter": "raw"}
+        ),
+    },
+    "loggers": {
+        # Sans fichier : seulement les requêtes lentes / N+1 sur la console
+        "clopetracker.perf": {
+            "handlers": ["perf"],
+            "level": "INFO" if PERF_LOG_FILE else "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
 # ========= Base de données =========
 # Par défaut : SQLite (fichier db.sqlite3).
 # Si .env contient DATABASE_URL (ex: Postgres), on bascule automatiquement.
@@ -94,6 +139,36 @@ DATABASES = {
     )
 }
 
+# Mode production SQLite (opt-in) : PRAGMAs appliqués à chaque connexion (clopetracker.db)
+# - WAL : les lecteurs ne bloquent plus l’écrivain (et inversement)
+# - synchronous=NORMAL : fsync au checkpoint seulement (sûr en WAL, bien plus rapide)
+# - busy_timeout : attente (ms) du verrou d’écriture au lieu d’échouer
+# - mmap_size / cache_size : lectures servies depuis la mémoire
+SQLITE_TUNING = config("SQLITE_TUNING", cast=bool, default=False)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": config("SQLITE_BUSY_TIMEOUT_MS", cast=int, default=5000),
+    "mmap_size": config("SQLITE_MMAP_SIZE", cast=int, default=256 * 1024 * 1024),
+    "cache_size": -config("SQLITE_CACHE_KIB", cast=int, default=64 * 1024),  # négatif = en Kio
+    "temp_store": "MEMORY",
+}
+if SQLITE_TUNING and DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # BEGIN IMMEDIATE : verrou d’écriture pris dès le début de la transaction
+    # → plus d’erreur "database is locked" sans attente lors du passage lecture → écriture
+    DATABASES["default"].setdefault("OPTIONS", {})["transaction_mode"] = "IMMEDIATE"
+
+# Réplica de lecture (optionnel) : second fichier SQLite (rafraîchi par
+# `python manage.py refresh_sqlite_replica`) ou Postgres en réplication.
+# Les lectures du tracker y sont envoyées ; écritures et migrations restent sur "default".
+DATABASE_REPLICA_URL = config("DATABASE_REPLICA_URL", default="")
+TRACKER_READ_DATABASE = "replica" if DATABASE_REPLICA_URL else None
+if DATABASE_REPLICA_URL:
+    DATABASES["replica"] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600)
+    # En test : pas de seconde base à créer, le réplica lit la base de test de "default"
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+DATABASE_ROUTERS = ["clopetracker.db.TrackerReadRouter"]
+
 # ========= Validation des mots de passe =========
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -115,7 +190,11 @@ STATICFILES_DIRS = [BASE_DIR / "static"]  # dossiers sources (dev)
 STATIC_ROOT = BASE_DIR / config("STATIC_ROOT", default="staticfiles")  # cible collectstatic (prod)
 
 # Option Whitenoise (compression & cache-busting)
+# "default" doit être déclaré explicitement : c’est lui qui stocke les avatars (MEDIA)
 STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
@@ -124,6 +203,43 @@ STORAGES = {
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / config("MEDIA_ROOT", default="media")
 
+# Django sert lui-même MEDIA_URL (par défaut seulement en DEBUG).
+# Les avatars nommés par hash de contenu partent avec Cache-Control: immutable ; les uploads
+# bruts en attente (profiles/raw/) ne sont jamais servis (serveur web devant /media/ :
+# refuser aussi /media/profiles/raw/).
+SERVE_MEDIA = config("SERVE_MEDIA", cast=bool, default=DEBUG)
+
+# ========= Avatars =========
+# True → l’upload brut est stocké tel quel et traité hors requête
+#        (python manage.py process_avatars, via cron ou timer systemd)
+# False → traitement synchrone dans la requête (comportement historique)
+AVATAR_ASYNC = config("AVATAR_ASYNC", cast=bool, default=True)
+
+# Encodage WebP : qualité (0-100) et effort (0 = rapide … 6 = le plus lent)
+AVATAR_QUALITY = config("AVATAR_QUALITY", cast=int, default=85)
+AVATAR_WEBP_METHOD = config("AVATAR_WEBP_METHOD", cast=int, default=4)
+
+# Garde-fou anti bombe de décompression : nombre max de pixels de l’image source
+AVATAR_MAX_PIXELS = config("AVATAR_MAX_PIXELS", cast=int, default=50_000_000)
+
+# Taille max d’un upload d’avatar (octets) : au-delà, refus avant tout décodage
+AVATAR_MAX_UPLOAD_SIZE = config("AVATAR_MAX_UPLOAD_SIZE", cast=int, default=10 * 1024 * 1024)
+
+# Seuil (octets) au-delà duquel uploads et fichiers produits passent de la RAM à un
+# fichier temporaire → mémoire bornée même avec plusieurs inscriptions simultanées
+AVATAR_SPOOL_MAX_MEMORY = config("AVATAR_SPOOL_MAX_MEMORY", cast=int, default=1024 * 1024)
+FILE_UPLOAD_MAX_MEMORY_SIZE = AVATAR_SPOOL_MAX_MEMORY
+FILE_UPLOAD_HANDLERS = [
+    "accounts.uploadhandlers.UploadSizeLimitHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# Avatars remplacés / supprimés : mis en attente (PendingFileDeletion) puis effacés par
+# `python manage.py gc_media` (cron). Le rapprochement du dossier ignore les fichiers
+# plus récents que MEDIA_GC_MIN_AGE secondes (upload pas encore commité).
+MEDIA_GC_MIN_AGE = config("MEDIA_GC_MIN_AGE", cast=int, default=3600)
+
 # ========= Email (via Gmail SMTP) =========
 # ⚠️ Nécessite un mot de passe d’application généré dans Google.
 # Toutes les valeurs sont dans ton fichier .env.
@@ -152,6 +268,100 @@ EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default="")
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default=EMAIL_HOST_USER)
 # Adresse utilisée par défaut comme expéditeur dans les emails
 
+# Boîte d’envoi : avec EMAIL_BACKEND=accounts.mail.OutboxBackend, les emails sont
+# seulement mis en file ; `python manage.py send_outbox` (cron) les envoie ensuite
+# par lots via le backend ci-dessous, sur une connexion réutilisée.
+OUTBOX_DELIVERY_BACKEND = config(
+    "OUTBOX_DELIVERY_BACKEND",
+    default="django.core.mail.backends.smtp.EmailBackend"
+)
+
+# ========= Cache =========
+# Backend choisi par CACHE_BACKEND :
+# - locmem : mémoire du process (défaut, rien à installer ; un cache par worker)
+# - file   : fichiers dans CACHE_DIR (partagé entre workers d’une même machine) ;
+#            incr() y est un get + set non atomique → les versions du cache de stats
+#            sont réécrites (stats_cache.bump_version), jamais incrémentées
+# - redis  : serveur Redis ou compatible (Valkey, KeyDB…) à REDIS_URL ;
+#            nécessite le paquet optionnel `redis` (pip install -r requirements-redis.txt)
+CACHE_BACKEND = config("CACHE_BACKEND", default="locmem")
+_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "clopetracker",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / config("CACHE_DIR", default=".cache"),
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("REDIS_URL", default="redis://127.0.0.1:6379/1"),
+    },
+}
+CACHES = {"default": _CACHE_BACKENDS[CACHE_BACKEND]}
+
+# Durée de vie (secondes) des statistiques par utilisateur en cache ;
+# chaque cigarette enregistrée change de toute façon la version des clés.
+STATS_CACHE_TIMEOUT = config("STATS_CACHE_TIMEOUT", cast=int, default=3600)
+
+# ========= Classements de groupe =========
+# Durée de vie (secondes) d’un classement en cache ; il est de toute façon
+# invalidé dès qu’un membre enregistre une cigarette ou change de groupe.
+LEADERBOARD_CACHE_TIMEOUT = config("LEADERBOARD_CACHE_TIMEOUT", cast=int, default=300)
+
+# ========= Statistiques avancées (tracker.analytics) =========
+# Timeline compacte (8 octets / cigarette) gardée en cache et complétée à chaque lecture ;
+# au-delà de ANALYTICS_CACHE_MAX_EVENTS, relue à chaque fois (valeurs trop grosses pour le cache).
+ANALYTICS_CACHE_TIMEOUT = config("ANALYTICS_CACHE_TIMEOUT", cast=int, default=24 * 3600)
+ANALYTICS_CACHE_MAX_EVENTS = config("ANALYTICS_CACHE_MAX_EVENTS", cast=int, default=200_000)
+# Prix d’un paquet et nombre de cigarettes par paquet (argent économisé)
+CIGARETTE_PACK_PRICE = config("CIGARETTE_PACK_PRICE", cast=float, default=10.0)
+CIGARETTE_PACK_SIZE = config("CIGARETTE_PACK_SIZE", cast=int, default=20)
+
+# ========= Admin =========
+# Au-delà de ce nombre de lignes, les listes de l’admin (clopetracker.changelist) affichent
+# une estimation au lieu d’un COUNT(*) exact ; 0 → toujours exact.
+ADMIN_COUNT_ESTIMATE_THRESHOLD = config("ADMIN_COUNT_ESTIMATE_THRESHOLD", cast=int, default=10_000)
+
+# ========= Archives d’historique (tracker.archive) =========
+# Cigarettes plus anciennes que ARCHIVE_HORIZON_DAYS jours locaux : sorties du journal
+# par `python manage.py compact_history` (cron) vers des fichiers sous ARCHIVE_ROOT.
+ARCHIVE_HORIZON_DAYS = config("ARCHIVE_HORIZON_DAYS", cast=int, default=365)
+# Dossier local (mmap) des archives : historique privé → jamais sous MEDIA_ROOT ni servi par le web
+ARCHIVE_ROOT = BASE_DIR / config("ARCHIVE_ROOT", default="archives")
+
+# ========= Cache de pages =========
+# Pages entières des visiteurs anonymes (accueil, login) : durée de vie en secondes, 0 → désactivé.
+# Les fragments navbar / footer de base.html sont mis en cache dans les templates ({% cache %}).
+PAGE_CACHE_TIMEOUT = config("PAGE_CACHE_TIMEOUT", cast=int, default=60)
+
+# ========= Sessions & authentification =========
+# SESSION_MODE :
+# - db             : table django_session, un SELECT par requête authentifiée
+# - cached_db      : lue dans le cache, écrite dans le cache ET en base (survit à un flush du cache)
+# - cache          : cache seul (rapide, mais sessions perdues si le cache est vidé)
+# - signed_cookies : session dans un cookie signé (aucune lecture serveur, pas de révocation côté serveur)
+# Avec le cache locmem (un par worker), une déconnexion ou un changement de mot de passe ne serait
+# pas vu des autres workers → par défaut, sessions et utilisateur en cache seulement avec file / redis.
+_SHARED_CACHE = CACHE_BACKEND != "locmem"
+_SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+SESSION_MODE = config("SESSION_MODE", default="cached_db" if _SHARED_CACHE else "db")
+SESSION_ENGINE = _SESSION_ENGINES[SESSION_MODE]
+
+# Utilisateur de session relu depuis le cache (accounts.backends) ; 0 → SELECT à chaque requête.
+# Changer la liste déconnecte les sessions ouvertes avec un autre backend.
+AUTHENTICATION_BACKENDS = ["accounts.backends.CachedModelBackend"]
+USER_CACHE_TIMEOUT = config("USER_CACHE_TIMEOUT", cast=int, default=300 if _SHARED_CACHE else 0)
+
+# last_login n’est réécrit qu’une fois par intervalle (secondes) et par utilisateur
+LAST_LOGIN_UPDATE_INTERVAL = config("LAST_LOGIN_UPDATE_INTERVAL", cast=int, default=3600)
+
 # ========= Utilisateur =========
 # IMPORTANT : tu utilises ton modèle custom accounts.User
 AUTH_USER_MODEL = "accounts.User"
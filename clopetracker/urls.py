@@ -1,7 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from accounts.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,5 +13,13 @@ urlpatterns = [
     path('', include('tracker.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media servis par Django (dev, ou petit déploiement sans serveur de fichiers dédié),
+# avec cache long pour les avatars adressés par contenu
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(
+            rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$",
+            serve_media,
+            {"document_root": settings.MEDIA_ROOT},
+        ),
+    ]
@@ -1,3 +1,39 @@
 from django.contrib import admin
+from .ingest import journal_changed
+from .models import EventArchive, EventRollup, SmokeEvent
 
-# Register your models here.
+@admin.register(SmokeEvent)
+class SmokeEventAdmin(admin.ModelAdmin):
+    list_display = ("user", "timestamp")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    date_hierarchy = "timestamp"
+
+    # Ajout / modification / suppression hors ingestion : compteurs, agrégats
+    # et version du journal (ETag de l’API) recalculés
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        journal_changed({obj.user_id})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        journal_changed({obj.user_id})
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.order_by().values_list("user_id", flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        journal_changed(user_ids)
+
+@admin.register(EventRollup)
+class EventRollupAdmin(admin.ModelAdmin):
+    list_display = ("user", "period", "bucket_start", "count")
+    list_filter = ("period",)
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+
+@admin.register(EventArchive)
+class EventArchiveAdmin(admin.ModelAdmin):
+    list_display = ("user", "count", "first_at", "last_at", "updated_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    readonly_fields = ("file", "generation", "count", "first_at", "last_at", "updated_at")
@@ -0,0 +1,280 @@
+# tracker/analytics.py
+"""
+Statistiques avancées d’un fumeur : séries sans cigarette, écarts entre cigarettes,
+moyennes mobiles, tendance et argent économisé.
+
+- Historique chargé en tableau compact : array('d') d’epochs UTC triés (8 octets par
+  cigarette) au lieu d’objets ORM, lu par values_list
+- Mise à jour incrémentale : la timeline est gardée en cache avec le plus grand id lu ;
+  un nouvel événement ne coûte qu’une petite requête (id > dernier id connu)
+- Ids visibles hors ordre (Postgres : un id plus petit commité après un plus grand déjà
+  lu) : après chaque lot, batch_committed() oublie les timelines qui ont lu au-delà,
+  et une lecture concurrente d’un commit ne garde pas son résultat en cache
+  (avec un cache par process, seul le process écrivain est prévenu : cache partagé requis)
+- Historique archivé (tracker.archive) lu par mmap au premier chargement ; journal et
+  archive lus sur la base primaire (using_primary) : un réplica en retard donnerait des
+  cigarettes en double ou manquantes autour d’un compactage, gardées ensuite en cache
+- Calculs par passes vectorisées sur le tableau : NumPy s’il est installé (dépendance
+  optionnelle), sinon routines C de la stdlib (bisect, map / operator) sur le même tableau
+- Découpage par jour local via les minuits (UTC) de la période et une recherche
+  dichotomique → changements d’heure corrects, O(jours × log n) au lieu de O(n) conversions
+"""
+import statistics
+from array import array
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from operator import sub
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from clopetracker.db import using_primary
+
+from . import stats_cache
+from .archive import read_epochs
+from .models import SmokeEvent
+from .rollups import _local_midnight
+
+try:
+    import numpy as np
+except ImportError:  # pip install numpy (optionnel) → passes NumPy
+    np = None
+
+# Fenêtre de la moyenne mobile (jours)
+MOVING_AVERAGE_DAYS = 7
+
+# Jours du début de l’historique servant de référence pour l’argent économisé
+BASELINE_DAYS = 7
+
+
+def _user_id(user):
+    return getattr(user, "pk", user)
+
+
+def _epoch(ts):
+    return ts.timestamp() if isinstance(ts, datetime) else float(ts)
+
+
+class Timeline:
+    """Horodatages (epochs UTC) triés d’un utilisateur + plus grand id SmokeEvent lu."""
+
+    __slots__ = ("timestamps", "last_pk")
+
+    def __init__(self, timestamps=None, last_pk=0):
+        self.timestamps = timestamps if timestamps is not None else array("d")
+        self.last_pk = last_pk
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def add(self, ts, pk=0):
+        """Ajoute une cigarette (en fin de tableau dans le cas courant, sinon à sa place)."""
+        value = _epoch(ts)
+        if not self.timestamps or value >= self.timestamps[-1]:
+            self.timestamps.append(value)
+        else:
+            insort(self.timestamps, value)
+        self.last_pk = max(self.last_pk, pk)
+
+    def extend(self, values, last_pk=0):
+        """Ajoute un lot d’epochs (un seul tri si le lot remonte dans le passé)."""
+        values = array("d", sorted(values))
+        if values and self.timestamps and values[0] < self.timestamps[-1]:
+            merged = array("d", sorted(self.timestamps + values))
+        else:
+            merged = self.timestamps + values
+        self.timestamps = merged
+        self.last_pk = max(self.last_pk, last_pk)
+
+    def state(self):
+        return self.timestamps.tobytes(), self.last_pk
+
+    @classmethod
+    def from_state(cls, state):
+        data, last_pk = state
+        timestamps = array("d")
+        timestamps.frombytes(data)
+        return cls(timestamps, last_pk)
+
+
+# --- Chargement ---
+
+def _timeline_key(user_id):
+    return f"analytics:timeline:{user_id}"
+
+
+def load_timeline(user, batch_size=10_000):
+    """
+    Timeline de l’utilisateur : depuis le cache, complétée par les événements d’id
+    supérieur au dernier lu (archive + tout le journal au premier appel).
+    Le journal étant append-only, ces événements sont exactement ceux qui manquent
+    (les commits hors ordre des ids sont traités par batch_committed()).
+    """
+    user_id = _user_id(user)
+    key = _timeline_key(user_id)
+    version = stats_cache.user_version(user_id)
+    state = cache.get(key)
+    with using_primary():
+        timeline = Timeline.from_state(state) if state else Timeline(read_epochs(user_id))
+        rows = (
+            SmokeEvent.objects.filter(user_id=user_id, pk__gt=timeline.last_pk)
+            .order_by("timestamp")  # index (user, timestamp) : déjà trié, pas de tri SQL
+            .values_list("pk", "timestamp")
+            .iterator(chunk_size=batch_size)
+        )
+        values = array("d")
+        last_pk = 0
+        for pk, ts in rows:
+            values.append(ts.timestamp())
+            last_pk = max(last_pk, pk)
+    if values or state is None:
+        timeline.extend(values, last_pk)
+        if len(timeline) <= settings.ANALYTICS_CACHE_MAX_EVENTS:
+            cache.set(key, timeline.state(), settings.ANALYTICS_CACHE_TIMEOUT)
+            # Lot commité pendant la lecture : son batch_committed() a pu passer avant ce set
+            if stats_cache.user_version(user_id) != version:
+                cache.delete(key)
+    return timeline
+
+
+def batch_committed(first_pks):
+    """
+    Après commit d’un lot ({user_id: plus petit id inséré}) : une timeline en cache
+    qui a déjà lu un id supérieur a sauté ce lot (ids commités hors ordre) → oubliée,
+    relue en entier au prochain appel. Cas courant (ids croissants) : gardée.
+    """
+    keys = {_timeline_key(user_id): pk for user_id, pk in first_pks.items()}
+    stale = [key for key, (_, last_pk) in cache.get_many(keys).items() if last_pk >= keys[key]]
+    if stale:
+        cache.delete_many(stale)
+
+
+def forget_timelines(user_ids):
+    """Oublie les timelines en cache (événements supprimés ou archivés)."""
+    cache.delete_many([_timeline_key(uid) for uid in user_ids])
+
+
+# --- Passes vectorisées ---
+
+def _gaps(ts):
+    """Écarts (secondes) entre cigarettes consécutives : (moyen, médian, plus long)."""
+    if len(ts) < 2:
+        return None, None, None
+    mean = (ts[-1] - ts[0]) / (len(ts) - 1)
+    if np is not None:
+        diffs = np.diff(np.frombuffer(ts, dtype=np.float64))
+        return mean, float(np.median(diffs)), float(diffs.max())
+    diffs = array("d", map(sub, ts[1:], ts[:-1]))
+    return mean, statistics.median(diffs), max(diffs)
+
+
+def _day_edges(first_day, days, tz):
+    """Minuits locaux (epochs) de first_day à first_day + days, bornes incluses."""
+    return [_local_midnight(first_day + timedelta(days=i), tz).timestamp() for i in range(days + 1)]
+
+
+def daily_counts(ts, first_day, days, tz=None):
+    """Cigarettes par jour local sur `days` jours à partir de first_day."""
+    edges = _day_edges(first_day, days, tz or timezone.get_default_timezone())
+    if np is not None:
+        positions = np.searchsorted(np.frombuffer(ts, dtype=np.float64), edges, side="left")
+        return np.diff(positions).tolist()
+    positions = [bisect_left(ts, edge) for edge in edges]
+    return list(map(sub, positions[1:], positions[:-1]))
+
+
+def _longest_zero_run(counts):
+    best = run = 0
+    for n in counts:
+        run = run + 1 if n == 0 else 0
+        best = max(best, run)
+    return best
+
+
+def _moving_average(counts, window):
+    """Moyenne glissante (fenêtre `window`, tronquée au début) via sommes cumulées."""
+    totals = [0]
+    for n in counts:
+        totals.append(totals[-1] + n)
+    return [
+        (totals[i + 1] - totals[max(0, i + 1 - window)]) / min(i + 1, window)
+        for i in range(len(counts))
+    ]
+
+
+def _slope(values):
+    """Pente des moindres carrés (par pas) d’une série régulière."""
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    num = sum((i - mean_x) * (y - mean_y) for i, y in enumerate(values))
+    den = sum((i - mean_x) ** 2 for i in range(n))
+    return num / den
+
+
+def summarize(timeline, now=None, days=30):
+    """
+    Indicateurs d’une timeline (dict JSON-compatible) :
+    - écarts moyen / médian / plus long entre deux cigarettes (minutes, heures)
+    - série en cours et plus longue série de jours locaux sans cigarette
+    - cigarettes par jour des `days` derniers jours, moyenne mobile sur 7 jours
+      et tendance (variation de la consommation quotidienne par semaine)
+    - argent économisé par rapport au rythme des BASELINE_DAYS premiers jours
+    """
+    tz = timezone.get_default_timezone()
+    now = now or timezone.now()
+    today = timezone.localtime(now, tz).date()
+    ts = timeline.timestamps
+    result = {
+        "count": len(ts),
+        "first_at": None, "last_at": None,
+        "mean_gap_minutes": None, "median_gap_minutes": None, "longest_gap_hours": None,
+        "current_streak_days": 0, "longest_streak_days": 0,
+        "daily": [], "trend_per_week": 0.0,
+        "baseline_per_day": None, "money_saved": 0.0,
+    }
+    if not ts:
+        return result
+
+    first_at, last_at = datetime.fromtimestamp(ts[0], tz), datetime.fromtimestamp(ts[-1], tz)
+    first_day, last_day = first_at.date(), last_at.date()
+    # Cigarette datée après aujourd’hui (horloge du client en avance) : période étendue
+    # jusqu’à elle, sinon zéro jour suivi (division par zéro) ou un nombre négatif
+    today = max(today, last_day)
+    tracked_days = (today - first_day).days + 1
+
+    # Une passe sur les jours de tout l’historique (séries, référence)
+    per_day = daily_counts(ts, first_day, tracked_days, tz)
+    window = per_day[-days:]
+    mean, median, longest = _gaps(ts)
+
+    baseline = sum(per_day[:BASELINE_DAYS]) / max(1, min(BASELINE_DAYS, tracked_days))
+    price = settings.CIGARETTE_PACK_PRICE / settings.CIGARETTE_PACK_SIZE
+    avoided = baseline * tracked_days - len(ts)
+
+    moving = _moving_average(per_day, MOVING_AVERAGE_DAYS)[-days:]
+    result.update({
+        "first_at": first_at.isoformat(),
+        "last_at": last_at.isoformat(),
+        "mean_gap_minutes": mean / 60 if mean is not None else None,
+        "median_gap_minutes": median / 60 if median is not None else None,
+        "longest_gap_hours": longest / 3600 if longest is not None else None,
+        "current_streak_days": max(0, (today - last_day).days),
+        "longest_streak_days": _longest_zero_run(per_day),
+        "daily": [
+            {"date": (today - timedelta(days=len(window) - 1 - i)).isoformat(), "count": n, "average": round(avg, 2)}
+            for i, (n, avg) in enumerate(zip(window, moving))
+        ],
+        "trend_per_week": round(_slope(moving) * 7, 2),
+        "baseline_per_day": round(baseline, 2),
+        "money_saved": round(max(0.0, avoided) * price, 2),
+    })
+    return result
+
+
+def user_analytics(user, now=None, days=30):
+    """Indicateurs de l’utilisateur (timeline en cache, complétée au besoin)."""
+    return summarize(load_timeline(user), now=now, days=days)
@@ -0,0 +1,250 @@
+# tracker/api.py
+"""
+API JSON du journal (clients mobiles).
+
+- GET  /api/events/ : événements de l’utilisateur, du plus récent au plus ancien
+  (journal actif seulement : l’historique archivé passe par l’export ou /api/analytics/)
+  * pagination par curseur (keyset) sur (timestamp, id) : pas d’OFFSET,
+    coût constant quelle que soit la profondeur de la page
+  * ETag faible dérivé de la version du journal (tracker.counters : change à chaque
+    insertion, même antidatée, et à chaque suppression / compactage) ; Last-Modified
+    = dernière cigarette. Un client qui repoll sans changement reçoit un 304, sans
+    que rien ne soit sérialisé ; une seule requête, uniquement des lectures d’index
+  * ETag et page lus sur la même base (réplica éventuel) : un réplica en retard sert une
+    page ancienne sous un ETag ancien, jamais sous l’ETag de l’état à venir
+- POST /api/events/ : enregistre une cigarette ({"timestamp": "…"} optionnel)
+  * timestamp refusé (400) au-delà de MAX_CLOCK_SKEW dans le futur, comme dans /api/sync/ :
+    il fausserait statistiques, agrégats et classements
+- POST /api/sync/   : lot hors ligne {"events": [{"key": "…", "timestamp": "…"}, …]}
+  * idempotent : la clé générée par le client dédoublonne les renvois
+  * compteur et agrégats mis à jour une fois par lot
+- GET  /api/analytics/ : séries, écarts entre cigarettes, tendance, argent économisé
+  (?days=N jours de détail, 30 par défaut ; voir tracker.analytics)
+Authentification par session (CSRF requis pour POST, en-tête X-CSRFToken).
+Vues async (ORM async) ; le test conditionnel est fait à la main car les fonctions
+de condition() sont appelées en sync, ce qui interdirait l’accès à l’ORM.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.db.models import OuterRef, Q, Subquery
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_http_methods
+
+from .analytics import user_analytics
+from .counters import version_subquery
+from .ingest import amerge_client_events, arecord_event
+from .models import SmokeEvent
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Taille maximale d’un lot de synchronisation (au-delà : le client découpe)
+MAX_SYNC_EVENTS = 500
+CLIENT_KEY_MAX_LENGTH = 64
+
+# Avance tolérée de l’horloge du client sur celle du serveur
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# Détail quotidien de /api/analytics/ (jours)
+DEFAULT_ANALYTICS_DAYS = 30
+MAX_ANALYTICS_DAYS = 366
+
+
+class _BadRequest(Exception):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def api_login_required(view):
+    """Comme login_required, mais répond 401 en JSON au lieu de rediriger vers le formulaire."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = user = await request.auser()
+        if not user.is_authenticated:
+            return _error("Authentification requise.", status=401)
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+# --- Curseur ---
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, pk = raw.split("|")
+        return datetime.fromisoformat(ts), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise _BadRequest("Curseur invalide.") from exc
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_LIMIT))
+    except ValueError as exc:
+        raise _BadRequest("limit doit être un entier.") from exc
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# --- Requêtes conditionnelles ---
+
+async def _latest(user, using):
+    """
+    Version du journal et dernier timestamp de l’utilisateur (une requête sur `using`) :
+    somme de quelques shards + une ligne lue en tête de l’index (user, timestamp).
+    """
+    last_ts = SmokeEvent.objects.filter(user_id=OuterRef("pk")).order_by("-timestamp").values("timestamp")[:1]
+    return await (
+        get_user_model().objects.using(using).filter(pk=user.pk)
+        .annotate(version=Subquery(version_subquery()), last_ts=Subquery(last_ts))
+        .values("version", "last_ts")
+        .afirst()
+    )
+
+
+def _events_etag(request, latest):
+    page = hashlib.sha256(request.GET.urlencode().encode()).hexdigest()[:12]
+    return f'W/"{request.user.pk}-{latest["version"] or 0}-{page}"'
+
+
+def _serialize(event):
+    return {"id": event.pk, "timestamp": event.timestamp.isoformat()}
+
+
+async def _list_events(request):
+    # Base choisie une fois : les tables accounts iraient sinon toujours sur "default"
+    using = router.db_for_read(SmokeEvent)
+    latest = await _latest(request.user, using)
+    etag = _events_etag(request, latest)
+    last_modified = int(latest["last_ts"].timestamp()) if latest["last_ts"] else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await _events_page(request, using)
+    if response.status_code in (200, 304):
+        response.headers.setdefault("ETag", etag)
+        if last_modified:
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+    return response
+
+
+async def _events_page(request, using):
+    try:
+        limit = _limit(request)
+        cursor = request.GET.get("cursor")
+        events = SmokeEvent.objects.using(using).filter(user_id=request.user.pk)
+        if cursor:
+            ts, pk = decode_cursor(cursor)
+            events = events.filter(Q(timestamp__lt=ts) | Q(timestamp=ts, pk__lt=pk))
+    except _BadRequest as exc:
+        return _error(str(exc))
+
+    # limit + 1 : savoir s’il reste une page sans COUNT
+    page = [e async for e in events.order_by("-timestamp", "-pk").only("pk", "timestamp")[:limit + 1]]
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_url = None
+    if has_more:
+        last = page[-1]
+        next_url = f"{reverse('api_events')}?limit={limit}&cursor={encode_cursor(last.timestamp, last.pk)}"
+    return JsonResponse({"results": [_serialize(e) for e in page], "next": next_url})
+
+
+def _parse_timestamp(value):
+    timestamp = datetime.fromisoformat(value)
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, timezone.get_default_timezone())
+    if timestamp > timezone.now() + MAX_CLOCK_SKEW:
+        raise _BadRequest(f"timestamp dans le futur ({timestamp.isoformat()}).")
+    return timestamp
+
+
+async def _create_event(request):
+    try:
+        payload = json.loads(request.body or b"{}")
+        timestamp = payload.get("timestamp") if isinstance(payload, dict) else None
+        if timestamp is not None:
+            timestamp = _parse_timestamp(timestamp)
+    except (TypeError, ValueError):
+        return _error("Corps JSON invalide (timestamp ISO 8601 attendu).")
+    except _BadRequest as exc:
+        return _error(str(exc))
+
+    event = await arecord_event(request.user, timestamp=timestamp)
+    return JsonResponse(_serialize(event), status=201)
+
+
+@api_login_required
+@require_http_methods(["GET", "HEAD", "POST"])
+async def events(request):
+    if request.method == "POST":
+        return await _create_event(request)
+    return await _list_events(request)
+
+
+def _parse_sync_item(item):
+    key = item["key"]
+    if not isinstance(key, str) or not 0 < len(key) <= CLIENT_KEY_MAX_LENGTH:
+        raise ValueError(key)
+    return key, _parse_timestamp(item["timestamp"])
+
+
+@api_login_required
+@require_http_methods(["POST"])
+async def sync_events(request):
+    try:
+        items = json.loads(request.body)["events"]
+        if not isinstance(items, list):
+            raise TypeError(items)
+    except (KeyError, TypeError, ValueError):
+        return _error('Corps JSON invalide : {"events": [{"key": …, "timestamp": …}, …]} attendu.')
+    if len(items) > MAX_SYNC_EVENTS:
+        return _error(f"Au plus {MAX_SYNC_EVENTS} événements par lot.", status=413)
+
+    parsed = []
+    for i, item in enumerate(items):
+        try:
+            parsed.append(_parse_sync_item(item))
+        except (KeyError, TypeError, ValueError):
+            return _error(
+                f"Événement {i} invalide (key de 1 à {CLIENT_KEY_MAX_LENGTH} caractères "
+                "et timestamp ISO 8601 attendus)."
+            )
+        except _BadRequest as exc:
+            return _error(f"Événement {i} invalide : {exc}")
+
+    created, duplicates = await amerge_client_events(request.user, parsed)
+    return JsonResponse({"created": created, "duplicates": duplicates})
+
+
+@api_login_required
+@require_http_methods(["GET", "HEAD"])
+async def analytics(request):
+    try:
+        days = int(request.GET.get("days", DEFAULT_ANALYTICS_DAYS))
+    except ValueError:
+        return _error("Paramètre days invalide.")
+    if not 0 < days <= MAX_ANALYTICS_DAYS:
+        return _error(f"days doit être compris entre 1 et {MAX_ANALYTICS_DAYS}.")
+    # Timeline en cache + passes en mémoire : un seul aller-retour vers le thread sync
+    return JsonResponse(await sync_to_async(user_analytics)(request.user, days=days))
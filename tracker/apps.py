@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class TrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tracker'
+
+    def ready(self):
+        # Import des signaux au démarrage de l’app
+        from . import signals  # noqa
+
+        # PRAGMAs SQLite (mode production, voir SQLITE_TUNING) et mesure des requêtes SQL
+        from django.db.backends.signals import connection_created
+
+        from clopetracker.db import apply_sqlite_pragmas
+        from clopetracker.perf import install_query_recorder
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid="clopetracker.sqlite_pragmas")
+        connection_created.connect(install_query_recorder, dispatch_uid="clopetracker.query_recorder")
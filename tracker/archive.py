@@ -0,0 +1,314 @@
+# tracker/archive.py
+"""
+Compactage de l’historique : les cigarettes plus anciennes que ARCHIVE_HORIZON_DAYS
+quittent le journal SmokeEvent pour une archive par utilisateur.
+
+- Format à largeur fixe (little-endian) : en-tête HEADER puis un uint32 par cigarette,
+  secondes écoulées depuis la première (base) → 4 octets par cigarette, contre une ligne
+  + une entrée d’index dans la base ; triées, donc lisibles par dichotomie
+- Lecture par mmap (ArchiveReader) : seules les pages touchées sont lues, rien n’est
+  décodé avant d’être demandé (graphiques historiques, export, statistiques avancées)
+- Pas de compression générale (zlib…) : elle casserait l’accès direct par position ;
+  la compacité vient de l’encodage (delta sur 4 octets, seconde près)
+- Agrégats : les tranches jour / semaine restent (déjà à jour), les tranches heure
+  de la période archivée sont supprimées
+- Une transaction par utilisateur : événements supprimés, hors agrégats "heure" périmés,
+  ligne EventArchive pointée sur le nouveau fichier ; l’ancien fichier est supprimé après commit
+- Fichiers sous ARCHIVE_ROOT, hors MEDIA_ROOT : jamais servis par serve_media ni par
+  une règle nginx sur /media/ (historique privé, chemins devinables)
+- Journal modifié pendant le compactage d’un utilisateur (ArchiveError) : rien n’est
+  écrit pour lui, l’erreur est journalisée et les suivants sont traités
+- Une seule instance de compact_history à la fois (cron) ; stockage local requis (mmap)
+- EventArchive toujours lu sur le primaire (clopetracker.db.TrackerReadRouter) : après
+  un compactage, un réplica en retard désignerait l’ancien fichier, déjà supprimé
+Les clés client (client_key) ne sont pas archivées : un renvoi hors ligne vieux de plus
+de ARCHIVE_HORIZON_DAYS ne serait plus dédoublonné.
+"""
+import heapq
+import logging
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+
+from clopetracker.db import using_primary
+
+from . import counters, rollups
+from .models import EventArchive, EventRollup, SmokeEvent
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "events"
+
+# magic, version, base (epoch UTC, secondes), nombre de cigarettes ; 24 octets
+HEADER = struct.Struct("<4sHxxqIxxxx")
+MAGIC = b"CLPA"
+VERSION = 1
+
+# Écart maximal à la base représentable sur 4 octets (~136 ans)
+MAX_OFFSET = 2**32 - 1
+
+
+class ArchiveError(Exception):
+    """Fichier d’archive illisible, ou journal modifié pendant le compactage."""
+
+
+def archive_name(user_id, generation):
+    return f"{ARCHIVE_DIR}/{user_id}/{generation:06d}.clpa"
+
+
+def archive_storage():
+    """Stockage des archives (ARCHIVE_ROOT, hors MEDIA_ROOT)."""
+    return FileSystemStorage(location=settings.ARCHIVE_ROOT)
+
+
+def _path(name):
+    return archive_storage().path(name)
+
+
+# --- Format ---
+
+def write_archive(name, epochs):
+    """Écrit des epochs (secondes, triées) dans le fichier `name` du stockage par défaut."""
+    base = epochs[0] if epochs else 0
+    if epochs and epochs[-1] - base > MAX_OFFSET:
+        raise ArchiveError(f"{name} : historique trop étendu pour un écart sur 4 octets")
+    offsets = array("I", (e - base for e in epochs))
+    path = _path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, base, len(offsets)))
+        f.write(offsets.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class ArchiveReader:
+    """
+    Archive ouverte par mmap (à utiliser comme context manager).
+    offsets : memoryview d’uint32 sur le fichier, sans copie.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._file = open(_path(name), "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # fichier vide
+            self._file.close()
+            raise ArchiveError(f"{name} : fichier vide")
+        self._view = memoryview(self._mmap)
+        magic, version, self.base, count = HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION or len(self._view) != HEADER.size + 4 * count:
+            self.close()
+            raise ArchiveError(f"{name} : en-tête invalide")
+        self.offsets = self._view[HEADER.size:].cast("I")
+
+    def close(self):
+        if hasattr(self, "offsets"):
+            self.offsets.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _position(self, ts):
+        if ts is None:
+            return None
+        epoch = ts.timestamp() if isinstance(ts, datetime) else ts
+        return bisect_left(self.offsets, epoch - self.base)
+
+    def count_between(self, start=None, end=None):
+        """Cigarettes dans [start, end[ (datetimes ou epochs), par dichotomie sur le mmap."""
+        i = self._position(start) or 0
+        j = self._position(end)
+        return (len(self) if j is None else j) - i
+
+    def epochs(self, start=None, end=None):
+        """Epochs (array('d')) dans [start, end[."""
+        base = self.base
+        return array("d", (base + o for o in self.offsets[self._position(start):self._position(end)]))
+
+    def timestamps(self, start=None, end=None):
+        """Datetimes UTC dans [start, end[, décodés au fil de l’eau."""
+        for e in self.epochs(start, end):
+            yield datetime.fromtimestamp(e, dt_timezone.utc)
+
+
+# --- Lectures ---
+
+def read_epochs(user, start=None, end=None):
+    """Epochs archivés de l’utilisateur (array('d') vide sans archive)."""
+    name = EventArchive.objects.filter(user_id=getattr(user, "pk", user)).values_list("file", flat=True).first()
+    if not name:
+        return array("d")
+    with ArchiveReader(name) as reader:
+        return reader.epochs(start, end)
+
+
+def archived_rows(user_ids=None):
+    """
+    (user_id, username, timestamp UTC) des archives, triés par utilisateur puis par date.
+    Un fichier ouvert à la fois ; les lignes sont produites au fil de l’eau.
+    """
+    archives = EventArchive.objects.order_by("user_id")
+    if user_ids is not None:
+        archives = archives.filter(user_id__in=user_ids)
+    for user_id, username, name in archives.values_list("user_id", "user__username", "file").iterator():
+        with ArchiveReader(name) as reader:
+            for ts in reader.timestamps():
+                yield user_id, username, ts
+
+
+def _decode(reader, start, stop):
+    base = reader.base
+    return [datetime.fromtimestamp(base + o, dt_timezone.utc) for o in reader.offsets[start:stop]]
+
+
+async def aarchived_rows(user_ids=None, chunk_size=2000):
+    """
+    archived_rows() en async (export sous ASGI) : fichiers décodés par paquets de
+    `chunk_size` dans le thread DB, jamais en entier.
+    """
+    archives = EventArchive.objects.order_by("user_id")
+    if user_ids is not None:
+        archives = archives.filter(user_id__in=user_ids)
+    rows = archives.values_list("user_id", "user__username", "file", named=True)  # voir history.aexport_rows
+    async for user_id, username, name in rows.aiterator():
+        reader = await sync_to_async(ArchiveReader)(name)
+        try:
+            for start in range(0, len(reader), chunk_size):
+                for ts in await sync_to_async(_decode)(reader, start, start + chunk_size):
+                    yield user_id, username, ts
+        finally:
+            reader.close()
+
+
+def last_archived_at(user):
+    return EventArchive.objects.filter(user_id=getattr(user, "pk", user)).values_list("last_at", flat=True).first()
+
+
+async def alast_archived_at(user):
+    return await EventArchive.objects.filter(user_id=getattr(user, "pk", user)).values_list("last_at", flat=True).afirst()
+
+
+# --- Compactage ---
+
+def _delete_file(name):
+    try:
+        archive_storage().delete(name)
+    except OSError:
+        pass
+
+
+def _compact_user(user_id, cutoff):
+    """Archive les cigarettes de user_id antérieures à cutoff (une transaction)."""
+    # Import local : analytics importe ce module (lecture des archives)
+    from .analytics import forget_timelines
+
+    with transaction.atomic():
+        archive = EventArchive.objects.filter(user_id=user_id).first()
+        fresh = array("q")
+        max_pk = 0
+        rows = (
+            SmokeEvent.objects.filter(user_id=user_id, timestamp__lt=cutoff)
+            .order_by("timestamp")
+            .values_list("pk", "timestamp")
+            .iterator(chunk_size=10_000)
+        )
+        for pk, ts in rows:
+            fresh.append(int(ts.timestamp()))
+            max_pk = max(max_pk, pk)
+        if not fresh:
+            return 0
+
+        old = array("q")
+        if archive:
+            with ArchiveReader(archive.file) as reader:
+                old = array("q", (reader.base + o for o in reader.offsets))
+        epochs = array("q", heapq.merge(old, fresh))
+
+        generation = archive.generation + 1 if archive else 1
+        name = archive_name(user_id, generation)
+        write_archive(name, epochs)
+        try:
+            # Même filtre borné par le plus grand id lu : exactement les lignes archivées
+            deleted, _ = SmokeEvent.objects.filter(
+                user_id=user_id, timestamp__lt=cutoff, pk__lte=max_pk
+            ).delete()
+            if deleted != len(fresh):
+                raise ArchiveError(f"Journal de {user_id} modifié pendant le compactage")
+            EventRollup.objects.filter(
+                user_id=user_id, period=EventRollup.HOUR, bucket_start__lt=cutoff
+            ).delete()
+            counters.mark_changed(user_id)  # événements sortis du journal : nouvelle version
+            EventArchive.objects.update_or_create(user_id=user_id, defaults={
+                "file": name,
+                "generation": generation,
+                "count": len(epochs),
+                "first_at": datetime.fromtimestamp(epochs[0], dt_timezone.utc),
+                "last_at": datetime.fromtimestamp(epochs[-1], dt_timezone.utc),
+            })
+        except BaseException:
+            _delete_file(name)
+            raise
+
+        if archive:
+            transaction.on_commit(lambda: _delete_file(archive.file))
+        transaction.on_commit(lambda: forget_timelines([user_id]))
+    return len(fresh)
+
+
+def compact_history(horizon_days=None, now=None, user_ids=None, chunk_size=100):
+    """
+    Archive les cigarettes antérieures au minuit local d’il y a `horizon_days` jours
+    (ARCHIVE_HORIZON_DAYS par défaut).
+    Les utilisateurs sont parcourus par paquets (keyset) ; une transaction par utilisateur.
+    Retourne (utilisateurs compactés, cigarettes archivées).
+    """
+    horizon_days = horizon_days or settings.ARCHIVE_HORIZON_DAYS
+    cutoff = rollups.window_start(horizon_days, now or timezone.now())
+    users = get_user_model().objects.order_by("pk")
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    compacted = archived = 0
+    last_pk = 0
+    # Repérage sur le primaire : le réplica peut être en retard, voire vide
+    with using_primary():
+        while True:
+            chunk = list(users.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size])
+            if not chunk:
+                return compacted, archived
+            # Index (user, timestamp) : une requête bornée pour trouver qui a de l’ancien
+            stale = (
+                SmokeEvent.objects.filter(user_id__in=chunk, timestamp__lt=cutoff)
+                .order_by("user_id").values_list("user_id", flat=True).distinct()
+            )
+            for user_id in list(stale):
+                try:
+                    n = _compact_user(user_id, cutoff)
+                except ArchiveError as exc:
+                    # Transaction de cet utilisateur annulée ; il sera repris au prochain passage
+                    logger.warning("compact_history : utilisateur %s ignoré (%s)", user_id, exc)
+                    continue
+                compacted += bool(n)
+                archived += n
+            last_pk = chunk[-1]
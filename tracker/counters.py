@@ -0,0 +1,151 @@
+# tracker/counters.py
+"""
+Compteur shardé pour User.cigarettes_smoked.
+
+- increment() : UPDATE atomique (F()) sur un shard tiré au hasard, jamais de save()
+- fold_counters() : replie les deltas dans la ligne User (commande périodique)
+- get_count() : valeur exacte = base + deltas en attente, en une requête
+- version du journal : somme des CounterShard.version, +1 à chaque écriture (dans le même
+  UPDATE que le delta) ou suppression (mark_changed) → ETag de l’API, sans requête
+  ni écriture de plus sur le chemin d’ingestion
+"""
+import random
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import CounterShard
+
+# Nombre de shards par utilisateur (quelques appareils → quelques lignes suffisent)
+SHARD_COUNT = getattr(settings, "COUNTER_SHARDS", 8)
+
+# SQLite : "database is locked" → on réessaie avec un petit backoff
+LOCK_RETRIES = 10
+LOCK_BACKOFF = 0.01  # secondes (doublé à chaque tentative)
+
+
+def _user_id(user):
+    return getattr(user, "pk", user)
+
+
+def _is_lock_error(exc):
+    return "locked" in str(exc).lower()
+
+
+def increment(user, amount=1):
+    """
+    Ajoute `amount` au compteur de l’utilisateur sans toucher la ligne User.
+    - UPDATE delta = delta + amount sur un shard aléatoire
+    - Si le shard n’existe pas encore → INSERT (course gérée via la contrainte unique)
+    """
+    user_id = _user_id(user)
+    shard = random.randrange(SHARD_COUNT)
+    delay = LOCK_BACKOFF
+    for attempt in range(LOCK_RETRIES):
+        try:
+            updated = CounterShard.objects.filter(user_id=user_id, shard=shard).update(
+                delta=F("delta") + amount, version=F("version") + 1
+            )
+            if updated:
+                return
+            try:
+                with transaction.atomic():
+                    CounterShard.objects.create(user_id=user_id, shard=shard, delta=amount, version=1)
+                return
+            except IntegrityError:
+                # Un autre écrivain vient de créer ce shard → on refait l’UPDATE
+                continue
+        except OperationalError as exc:
+            # Dans une transaction englobante, impossible de réessayer proprement
+            if connection.in_atomic_block or not _is_lock_error(exc) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(delay)
+            delay *= 2
+    raise OperationalError(f"Impossible d’incrémenter le compteur de l’utilisateur {user_id}")
+
+
+def mark_changed(user):
+    """Journal modifié sans passer par increment() (compactage, suppression, import) : version + 1."""
+    increment(user, 0)
+
+
+def version_subquery():
+    """Sous-requête : version du journal de l’utilisateur OuterRef("pk") (NULL sans shard)."""
+    return (
+        CounterShard.objects.filter(user_id=OuterRef("pk"))
+        .order_by()
+        .values("user_id")
+        .annotate(total=Sum("version"))
+        .values("total")
+    )
+
+
+def _pending_subquery():
+    return (
+        CounterShard.objects.filter(user_id=OuterRef("pk"))
+        .order_by()
+        .values("user_id")
+        .annotate(total=Sum("delta"))
+        .values("total")
+    )
+
+
+def with_exact_count(queryset):
+    """Annote un queryset User avec `exact_cigarettes` (base + deltas en attente)."""
+    return queryset.annotate(
+        exact_cigarettes=F("cigarettes_smoked") + Coalesce(Subquery(_pending_subquery()), Value(0))
+    )
+
+
+def _count_query(user):
+    User = get_user_model()
+    return with_exact_count(User.objects.filter(pk=_user_id(user))).values_list("exact_cigarettes", flat=True)
+
+
+def get_count(user):
+    """Valeur exacte du compteur (une seule requête)."""
+    return _count_query(user).first() or 0
+
+
+async def aget_count(user):
+    """get_count() pour les vues async (ORM async)."""
+    return await _count_query(user).afirst() or 0
+
+
+def fold_counters(chunk_size=500):
+    """
+    Replie les deltas des shards dans User.cigarettes_smoked.
+    - On soustrait exactement la valeur lue (delta = delta - lu), donc les
+      incréments arrivés entre-temps ne sont pas perdus
+    - Une transaction par paquet de shards
+    Retourne le nombre de cigarettes repliées.
+    """
+    User = get_user_model()
+    folded = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                CounterShard.objects.select_for_update()
+                .filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "user_id", "delta")[:chunk_size]
+            )
+            if not rows:
+                return folded
+            per_user = defaultdict(int)
+            for pk, user_id, delta in rows:
+                if delta:
+                    per_user[user_id] += delta
+                    CounterShard.objects.filter(pk=pk).update(delta=F("delta") - delta)
+            for user_id, delta in per_user.items():
+                User.objects.filter(pk=user_id).update(
+                    cigarettes_smoked=F("cigarettes_smoked") + delta
+                )
+                folded += delta
+        last_pk = rows[-1][0]
@@ -0,0 +1,216 @@
+# tracker/history.py
+"""
+Export / import de l’historique (journal SmokeEvent).
+
+- Export en flux : les événements sont lus par paquets (iterator) et sérialisés au fil
+  de l’eau → mémoire constante, même pour des années d’historique
+- L’historique archivé (tracker.archive) est fusionné dans l’ordre (utilisateur, date) ;
+  journal lu sur la même base que les archives (primaire), sinon un réplica en retard
+  sur un compactage donnerait des lignes en double ou manquantes
+- aexport_rows() / aiter_export() : mêmes flux en async pour la vue d’export sous ASGI,
+  où un itérateur sync serait entièrement lu en mémoire par Django avant d’être servi
+  (sous WSGI, c’est le flux async qui le serait : la vue y sert export_rows())
+- Format commun CSV et JSON : (username, timestamp ISO 8601 UTC)
+- JSON : un tableau avec un objet par ligne → relisible ligne à ligne à l’import
+  (JSON Lines accepté aussi)
+- Import par lots bornés (bulk_create, une transaction par lot) ; compteurs et agrégats
+  recalculés une seule fois à la fin, uniquement pour les utilisateurs touchés
+"""
+import csv
+import heapq
+import json
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .archive import aarchived_rows, archived_rows
+from .ingest import journal_changed
+from .models import SmokeEvent
+
+FORMATS = ("csv", "json")
+FIELDS = ("username", "timestamp")
+
+# Taille des paquets lus en base (export) et des lots insérés (import)
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+
+
+class HistoryImportError(ValueError):
+    """Ligne illisible dans un fichier d’import."""
+
+
+# --- Export ---
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : write() renvoie la ligne au lieu de la stocker."""
+
+    def write(self, value):
+        return value
+
+
+def _row_key(row):
+    return row[0], row[2]
+
+
+def _hot_rows(user_ids, named=False):
+    events = SmokeEvent.objects.using(DEFAULT_DB_ALIAS).order_by("user_id", "timestamp")
+    if user_ids is not None:
+        events = events.filter(user_id__in=user_ids)
+    return events.values_list("user_id", "user__username", "timestamp", named=named)
+
+
+def export_rows(user_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """(username, timestamp) lus en flux, dans l’ordre de l’index (user, timestamp)."""
+    hot = _hot_rows(user_ids).iterator(chunk_size=chunk_size)
+    rows = heapq.merge(archived_rows(user_ids), hot, key=_row_key)
+    return ((username, ts) for _, username, ts in rows)
+
+
+async def _amerge(first, second, key):
+    """heapq.merge() de deux flux async triés (à égalité, `first` d’abord)."""
+    a = await anext(first, None)
+    b = await anext(second, None)
+    while a is not None and b is not None:
+        if key(b) < key(a):
+            yield b
+            b = await anext(second, None)
+        else:
+            yield a
+            a = await anext(first, None)
+    while a is not None:
+        yield a
+        a = await anext(first, None)
+    while b is not None:
+        yield b
+        b = await anext(second, None)
+
+
+async def aexport_rows(user_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """export_rows() en async (aiterator) : rien n’est accumulé en mémoire."""
+    # named=True : l’itérable values_list simple exécute la requête dès sa création,
+    # donc dans la boucle (SynchronousOnlyOperation) au lieu du thread d’aiterator()
+    hot = _hot_rows(user_ids, named=True).aiterator(chunk_size=chunk_size)
+    async for _, username, ts in _amerge(aarchived_rows(user_ids, chunk_size), hot, _row_key):
+        yield username, ts
+
+
+def _serializer(fmt):
+    """(en-tête, ligne → texte, préfixe de la 1re ligne, préfixe des suivantes, fin) du format."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        return writer.writerow(FIELDS), lambda username, ts: writer.writerow((username, ts.isoformat())), "", "", ""
+    return (
+        "[",
+        lambda username, ts: json.dumps({"username": username, "timestamp": ts.isoformat()}, ensure_ascii=False),
+        "\n", ",\n", "\n]\n",
+    )
+
+
+def _iter_export(serializer, rows):
+    header, line, first, sep, footer = serializer
+    yield header
+    prefix = first
+    for username, ts in rows:
+        yield prefix + line(username, ts)
+        prefix = sep
+    yield footer
+
+
+async def _aiter_export(serializer, rows):
+    header, line, first, sep, footer = serializer
+    yield header
+    prefix = first
+    async for username, ts in rows:
+        yield prefix + line(username, ts)
+        prefix = sep
+    yield footer
+
+
+def iter_export(fmt, rows):
+    """Morceaux de texte de l’export au format `fmt` (csv ou json)."""
+    return _iter_export(_serializer(fmt), rows)
+
+
+def aiter_export(fmt, rows):
+    """iter_export() pour un flux async de lignes (StreamingHttpResponse sous ASGI)."""
+    return _aiter_export(_serializer(fmt), rows)
+
+
+# --- Import ---
+
+def _parse_timestamp(value):
+    ts = datetime.fromisoformat(value.strip())
+    if timezone.is_naive(ts):
+        ts = timezone.make_aware(ts, timezone.get_default_timezone())
+    return ts
+
+
+def read_csv(lines):
+    """(username, timestamp) depuis un CSV (itérable de lignes, lu en flux)."""
+    for n, row in enumerate(csv.DictReader(lines), start=2):
+        try:
+            yield row["username"], _parse_timestamp(row["timestamp"])
+        except (KeyError, TypeError, ValueError) as exc:
+            raise HistoryImportError(f"Ligne {n} illisible : {exc}") from exc
+
+
+def read_json(lines):
+    """
+    (username, timestamp) depuis un export JSON (un objet par ligne) ou du JSON Lines.
+    Seule la ligne courante est en mémoire.
+    """
+    for n, line in enumerate(lines, start=1):
+        line = line.strip().rstrip(",")
+        if line in ("", "[", "]"):
+            continue
+        try:
+            obj = json.loads(line)
+            yield obj["username"], _parse_timestamp(obj["timestamp"])
+        except (KeyError, TypeError, ValueError) as exc:
+            raise HistoryImportError(f"Ligne {n} illisible : {exc}") from exc
+
+
+def _flush(batch, batch_size):
+    with transaction.atomic():
+        SmokeEvent.objects.bulk_create(batch, batch_size=batch_size)
+    return len(batch)
+
+
+def import_events(rows, batch_size=IMPORT_BATCH_SIZE, username=None):
+    """
+    Insère les événements (username, timestamp) par lots de `batch_size`.
+    - username : force le compte cible (import de l’historique d’un seul utilisateur)
+    - Utilisateurs inconnus ignorés (comptés dans skipped)
+    - À la fin : cigarettes_smoked et agrégats recalculés pour les comptes touchés
+    Retourne (importés, ignorés, ids des utilisateurs touchés).
+    """
+    User = get_user_model()
+    user_ids = {}  # username → pk (None si inconnu), une requête par nom distinct
+    touched = set()
+    imported = skipped = 0
+    batch = []
+    try:
+        for name, ts in rows:
+            name = username or name
+            if name not in user_ids:
+                user_ids[name] = User.objects.filter(username=name).values_list("pk", flat=True).first()
+            user_id = user_ids[name]
+            if user_id is None:
+                skipped += 1
+                continue
+            batch.append(SmokeEvent(user_id=user_id, timestamp=ts))
+            touched.add(user_id)
+            if len(batch) >= batch_size:
+                imported += _flush(batch, batch_size)
+                batch = []
+        if batch:
+            imported += _flush(batch, batch_size)
+    finally:
+        # Même interrompu (ligne illisible), les lots déjà insérés restent cohérents
+        if touched:
+            journal_changed(touched)
+    return imported, skipped, touched
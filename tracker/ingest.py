@@ -0,0 +1,229 @@
+# tracker/ingest.py
+"""
+Ingestion des cigarettes dans le journal SmokeEvent.
+
+- Les événements sont bufferisés puis insérés par lots (bulk_create)
+- Le chemin d’écriture ne touche JAMAIS la ligne User (pas de read-modify-write) :
+  le compteur reçoit un delta par utilisateur et par lot (tracker.counters)
+- Les agrégats heure / jour / semaine sont mis à jour dans la même transaction
+  (statistiques et classements de groupe en cache invalidés après commit)
+- User.cigarettes_smoked peut être recalculé depuis le journal et les archives
+  (reconcile_counters, voir tracker.archive)
+"""
+import threading
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import analytics, counters, leaderboard, rollups, stats_cache
+from .models import CounterShard, EventArchive, SmokeEvent
+
+# Taille des lots d’insertion (compromis mémoire / nombre de requêtes)
+DEFAULT_BATCH_SIZE = 500
+
+
+def _user_id(user):
+    """Accepte une instance User ou directement un identifiant."""
+    return getattr(user, "pk", user)
+
+
+class EventBuffer:
+    """
+    Buffer d’événements avec insertion par lots.
+    Usage :
+        with EventBuffer() as buffer:
+            buffer.add(user)
+            buffer.add(user, timestamp=...)
+    Le buffer est vidé automatiquement quand il atteint batch_size,
+    et à la sortie du bloc `with` (sauf en cas d’exception).
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.written = 0  # nombre total d’événements insérés
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            # En cas d’erreur on jette le lot en cours plutôt que d’écrire à moitié
+            self._pending = []
+        return False
+
+    def add(self, user, timestamp=None):
+        """Ajoute une cigarette au buffer (flush automatique si plein)."""
+        event = SmokeEvent(user_id=_user_id(user), timestamp=timestamp or timezone.now())
+        with self._lock:
+            self._pending.append(event)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+        return event
+
+    def flush(self):
+        """Insère les événements en attente. Retourne la liste insérée."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return []
+        with transaction.atomic():
+            created = SmokeEvent.objects.bulk_create(batch, batch_size=self.batch_size)
+            _apply_batch(created)
+        self.written += len(created)
+        return created
+
+
+def _apply_batch(events):
+    """Répercute un lot inséré : compteurs, agrégats et caches (à appeler dans la transaction)."""
+    # Un seul delta par utilisateur pour tout le lot
+    for user_id, n in Counter(e.user_id for e in events).items():
+        counters.increment(user_id, n)
+    rollups.apply_events(events)
+    user_ids = {e.user_id for e in events}
+    stats_cache.invalidate_users(user_ids)
+    leaderboard.invalidate_users(user_ids)
+    # Après le changement de version des statistiques (ordre des on_commit) : voir analytics.load_timeline
+    first_pks = {}
+    for e in events:
+        pk = e.pk or 0  # id inconnu (pas de RETURNING) → toute timeline en cache est oubliée
+        first_pks[e.user_id] = min(first_pks.get(e.user_id, pk), pk)
+    transaction.on_commit(lambda: analytics.batch_committed(first_pks))
+
+
+def log_event(user, timestamp=None):
+    """Enregistre immédiatement une seule cigarette (cas d’une requête web)."""
+    buffer = EventBuffer(batch_size=1)
+    buffer.add(user, timestamp=timestamp)
+    return buffer.written
+
+
+def record_event(user, timestamp=None):
+    """Comme log_event(), mais retourne le SmokeEvent créé (avec son id)."""
+    return EventBuffer(batch_size=1).add(user, timestamp=timestamp)
+
+
+def merge_client_events(user, items, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Synchronisation idempotente d’un lot hors ligne : items = [(client_key, timestamp), …]
+    - La ligne User est verrouillée (select_for_update) : deux envois simultanés
+      du même lot pour un utilisateur sont sérialisés
+    - Clés déjà connues (ou répétées dans le lot) → ignorées ; l’index unique
+      (user, client_key) reste le filet de sécurité : une clé insérée entre-temps par
+      un autre écrivain fait échouer l’INSERT (savepoint), les clés connues sont relues
+      et le lot réessayé → compteur et agrégats ne comptent que les lignes vraiment insérées
+    - Compteur et agrégats mis à jour une fois pour tout le lot
+    Retourne (clés créées, clés déjà connues).
+    """
+    user_id = _user_id(user)
+    unique = {}
+    for key, ts in items:
+        unique.setdefault(key, ts)
+    with transaction.atomic():
+        get_user_model().objects.select_for_update().filter(pk=user_id).values_list("pk").first()
+        for attempt in range(2):
+            known = set(
+                SmokeEvent.objects.filter(user_id=user_id, client_key__in=list(unique))
+                .values_list("client_key", flat=True)
+            )
+            fresh = [
+                SmokeEvent(user_id=user_id, timestamp=ts, client_key=key)
+                for key, ts in unique.items() if key not in known
+            ]
+            if not fresh:
+                break
+            try:
+                with transaction.atomic():
+                    SmokeEvent.objects.bulk_create(fresh, batch_size=batch_size)
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+        if fresh:
+            _apply_batch(fresh)
+    return [e.client_key for e in fresh], [key for key in unique if key in known]
+
+
+# Versions pour les vues async : l’écriture (transaction, compteurs, agrégats, on_commit)
+# ne peut pas passer par l’ORM async → elle tient en UN passage par le thread DB
+# au lieu d’un aller-retour par requête SQL.
+alog_event = sync_to_async(log_event)
+arecord_event = sync_to_async(record_event)
+amerge_client_events = sync_to_async(merge_client_events)
+
+
+def count_events(user):
+    """Nombre exact de cigarettes (journal + archive) pour un utilisateur."""
+    user_id = _user_id(user)
+    archived = EventArchive.objects.filter(user_id=user_id).values_list("count", flat=True).first() or 0
+    return SmokeEvent.objects.filter(user_id=user_id).count() + archived
+
+
+def reconcile_counters(user_ids=None, chunk_size=1000):
+    """
+    Recalcule User.cigarettes_smoked depuis le journal (+ cigarettes archivées).
+    - Les deltas en attente des utilisateurs traités sont remis à zéro
+    - Un UPDATE ... SET = (SELECT COUNT) par paquet d’utilisateurs
+    - Les paquets limitent la durée des verrous d’écriture (SQLite)
+    Retourne le nombre d’utilisateurs mis à jour.
+    """
+    User = get_user_model()
+    total = (
+        SmokeEvent.objects.filter(user_id=OuterRef("pk"))
+        .order_by()
+        .values("user_id")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    archived = EventArchive.objects.filter(user_id=OuterRef("pk")).values("count")
+
+    users = User.objects.order_by("pk")
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    # Parcours par clé (pk > dernier pk vu) plutôt que par OFFSET
+    updated = 0
+    last_pk = 0
+    while True:
+        chunk = list(users.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size])
+        if not chunk:
+            return updated
+        updated += _reconcile_chunk(User, chunk, total, archived)
+        last_pk = chunk[-1]
+
+
+def journal_changed(user_ids):
+    """
+    Journal modifié hors ingestion (import, suppression depuis l’admin) : compteurs
+    et agrégats recalculés, version du journal changée, pour ces utilisateurs.
+    Les timelines d’analytics en cache sont oubliées après commit : leur complément
+    incrémental (id > dernier lu) ne voit ni suppression ni date modifiée.
+    """
+    user_ids = list(user_ids)
+    reconcile_counters(user_ids=user_ids)
+    rollups.rebuild_rollups(user_ids=user_ids)
+    for user_id in user_ids:
+        counters.mark_changed(user_id)
+    transaction.on_commit(lambda: analytics.forget_timelines(user_ids))
+
+
+def _reconcile_chunk(User, pks, total, archived):
+    with transaction.atomic():
+        # Shards gardés (update, pas delete) : leur version ne doit jamais revenir en arrière
+        CounterShard.objects.filter(user_id__in=pks).update(delta=0)
+        stats_cache.invalidate_users(pks)
+        return User.objects.filter(pk__in=pks).update(
+            cigarettes_smoked=Coalesce(Subquery(total), Value(0)) + Coalesce(Subquery(archived), Value(0))
+        )
@@ -0,0 +1,111 @@
+# tracker/leaderboard.py
+"""
+Classement des membres d’un groupe (moins de cigarettes = meilleur rang).
+
+- Une seule requête : somme des agrégats "day" (sous-requête) + RANK() OVER (fenêtre SQL)
+- Résultat mis en cache, sous une clé versionnée par groupe ; le jour local en fait partie :
+  la fenêtre glisse à minuit même si personne dans le groupe ne fume
+- Invalidation par événement : un lot ingéré ou un changement de groupe incrémente
+  la version du groupe (les anciennes entrées expirent d’elles-mêmes)
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Rank
+from django.db.models.expressions import Window
+
+from clopetracker.db import using_primary
+
+from . import rollups, stats_cache
+from .models import EventRollup
+
+# Fenêtre par défaut du classement (jours locaux, aujourd’hui inclus)
+DEFAULT_DAYS = 7
+
+
+def _version_key(group_id):
+    return f"leaderboard:{group_id}:version"
+
+
+def invalidate_group(group_id):
+    """Invalide tous les classements en cache d’un groupe."""
+    if group_id is not None:
+        stats_cache.bump_version(_version_key(group_id))
+
+
+def invalidate_users(user_ids):
+    """Invalide les classements des groupes de ces utilisateurs (après commit)."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    group_ids = set(
+        get_user_model().objects.filter(pk__in=user_ids, group__isnull=False)
+        .values_list("group_id", flat=True)
+    )
+
+    def _invalidate():
+        for group_id in group_ids:
+            invalidate_group(group_id)
+
+    if group_ids:
+        transaction.on_commit(_invalidate)
+
+
+def _ranking(group_id, days, now):
+    totals = (
+        EventRollup.objects.filter(
+            user_id=OuterRef("pk"),
+            period=EventRollup.DAY,
+            bucket_start__gte=rollups.window_start(days, now),
+        )
+        .order_by()
+        .values("user_id")
+        .annotate(total=Sum("count"))
+        .values("total")
+    )
+    return (
+        get_user_model().objects.filter(group_id=group_id, is_active=True)
+        .annotate(total=Coalesce(Subquery(totals), 0))
+        .annotate(rank=Window(Rank(), order_by=F("total").asc()))
+        .order_by("rank", "username")
+        .values("pk", "username", "total", "rank")
+    )
+
+
+def compute_leaderboard(group_id, days=DEFAULT_DAYS, now=None):
+    """
+    Classement calculé en base : [{"pk", "username", "total", "rank"}, …]
+    Les ex æquo partagent le même rang (RANK()).
+    """
+    # Primaire : le résultat est mis en cache, un réplica en retard le figerait périmé
+    with using_primary():
+        return list(_ranking(group_id, days, now))
+
+
+def _board_key(group_id, version, days):
+    # Jour local du fuseau par défaut, comme les fenêtres (rollups.window_start)
+    today = stats_cache._local_today(None)
+    return f"leaderboard:{group_id}:{version}:{days}:{today.isoformat()}"
+
+
+def get_leaderboard(group_id, days=DEFAULT_DAYS):
+    """Classement du groupe depuis le cache (calculé puis mis en cache si absent)."""
+    key = _board_key(group_id, stats_cache.current_version(_version_key(group_id)), days)
+    board = cache.get(key)
+    if board is None:
+        board = compute_leaderboard(group_id, days)
+        cache.set(key, board, settings.LEADERBOARD_CACHE_TIMEOUT)
+    return board
+
+
+async def aget_leaderboard(group_id, days=DEFAULT_DAYS):
+    """get_leaderboard() pour les vues async (API de cache et ORM async)."""
+    key = _board_key(group_id, await stats_cache.acurrent_version(_version_key(group_id)), days)
+    board = await cache.aget(key)
+    if board is None:
+        with using_primary():
+            board = [member async for member in _ranking(group_id, days, None)]
+        await cache.aset(key, board, settings.LEADERBOARD_CACHE_TIMEOUT)
+    return board
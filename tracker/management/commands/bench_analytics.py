@@ -0,0 +1,91 @@
+# tracker/management/commands/bench_analytics.py
+import json
+import random
+import time
+from array import array
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from clopetracker.bench import format_table, peak_rss_kib
+from tracker import analytics
+from tracker.analytics import Timeline, summarize
+
+DEFAULT_SIZES = "10000,100000,1000000"
+
+# Cigarettes ajoutées une à une (mise à jour incrémentale)
+INCREMENTAL_EVENTS = 1000
+
+
+def synthetic_timeline(size, per_day=12, seed=0):
+    """Timeline triée de `size` cigarettes (~per_day par jour) se terminant maintenant."""
+    rng = random.Random(seed)
+    mean_gap = 86400 / per_day
+    now = timezone.now().timestamp()
+    ts = array("d")
+    t = now - size * mean_gap
+    for _ in range(size):
+        t += rng.expovariate(1 / mean_gap)
+        ts.append(t)
+    return Timeline(ts, last_pk=size)
+
+
+def _timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de tracker.analytics sur des historiques synthétiques (10k / 100k / 1M cigarettes) : "
+        "calcul complet, ajout incrémental, (dé)sérialisation pour le cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Tailles d’historique, séparées par des virgules.")
+        parser.add_argument("--repeat", type=int, default=3, help="Répétitions (meilleur temps retenu).")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour comparer deux runs).")
+
+    def handle(self, *args, sizes, repeat, **options):
+        try:
+            sizes = [int(s) for s in sizes.split(",") if s.strip()]
+        except ValueError:
+            raise CommandError("--sizes : entiers séparés par des virgules attendus.")
+
+        results = []
+        for size in sizes:
+            timeline = synthetic_timeline(size)
+            now = timezone.now()
+            full = _timed(lambda: summarize(timeline, now=now), repeat)
+            state = _timed(lambda: Timeline.from_state(timeline.state()), repeat)
+
+            start = time.perf_counter()
+            last = timeline.timestamps[-1]
+            for i in range(INCREMENTAL_EVENTS):
+                timeline.add(last + i + 1, pk=size + i + 1)
+            add = (time.perf_counter() - start) / INCREMENTAL_EVENTS
+
+            results.append({
+                "events": size,
+                "backend": "numpy" if analytics.np is not None else "array",
+                "summarize_ms": full * 1000,
+                "cache_roundtrip_ms": state * 1000,
+                "add_us": add * 1e6,
+                "bytes": len(timeline.state()[0]),
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"results": results, "peak_rss_kib": peak_rss_kib()}, indent=2))
+            return
+        self.stdout.write(format_table(
+            ["cigarettes", "moteur", "calcul ms", "cache ms", "ajout µs", "Kio"],
+            [
+                [r["events"], r["backend"], r["summarize_ms"], r["cache_roundtrip_ms"], r["add_us"], r["bytes"] // 1024]
+                for r in results
+            ],
+        ))
+        self.stdout.write(f"Pic RSS : {peak_rss_kib() / 1024:.0f} Mio")
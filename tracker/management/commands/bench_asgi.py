@@ -0,0 +1,134 @@
+# tracker/management/commands/bench_asgi.py
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.utils import timezone
+
+from clopetracker.bench import format_table, summarize
+from tracker.ingest import EventBuffer
+
+# Endpoints chauds : (méthode, chemin)
+ENDPOINTS = {
+    "home": ("get", "/"),
+    "api": ("get", "/api/events/?limit=50"),
+    "log": ("post", "/log/"),
+}
+
+
+def _split(total, workers):
+    """Répartit `total` requêtes entre `workers` (les premiers en font une de plus)."""
+    return [total // workers + (1 if i < total % workers else 0) for i in range(workers)]
+
+
+def run_wsgi(user, method, path, requests, concurrency):
+    """Handler sync (chemin WSGI), un thread et une connexion DB par client concurrent."""
+
+    def worker(n):
+        client = Client()
+        client.force_login(user)
+        durations = []
+        try:
+            for _ in range(n):
+                start = time.perf_counter()
+                getattr(client, method)(path)
+                durations.append(time.perf_counter() - start)
+        finally:
+            client.logout()
+            connection.close()
+        return durations
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        durations = [d for chunk in pool.map(worker, _split(requests, concurrency)) for d in chunk]
+    return durations, time.perf_counter() - start
+
+
+def run_asgi(user, method, path, requests, concurrency):
+    """Handler ASGI, `concurrency` clients concurrents dans une seule boucle d’événements."""
+
+    async def worker(n):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        durations = []
+        try:
+            for _ in range(n):
+                start = time.perf_counter()
+                await getattr(client, method)(path)
+                durations.append(time.perf_counter() - start)
+        finally:
+            await client.alogout()
+        return durations
+
+    async def main():
+        chunks = await asyncio.gather(*(worker(n) for n in _split(requests, concurrency)))
+        return [d for chunk in chunks for d in chunk]
+
+    start = time.perf_counter()
+    durations = asyncio.run(main())
+    return durations, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark WSGI vs ASGI des endpoints chauds (débit, p50/p95/p99). "
+        "Requêtes envoyées en process via les handlers Django (pas de serveur ni de réseau) : "
+        "mesure le coût du chemin sync / async lui-même. Crée un utilisateur temporaire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--endpoints", default=",".join(ENDPOINTS),
+            help=f"Endpoints parmi : {', '.join(ENDPOINTS)}.",
+        )
+        parser.add_argument("--requests", type=int, default=400, help="Requêtes par endpoint et par mode.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Clients concurrents.")
+        parser.add_argument(
+            "--history", type=int, default=2000,
+            help="Cigarettes déjà enregistrées pour l’utilisateur de test.",
+        )
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour comparer deux runs).")
+
+    def handle(self, *args, endpoints, requests, concurrency, history, **options):
+        names = [e.strip() for e in endpoints.split(",") if e.strip()]
+        unknown = set(names) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Endpoint(s) inconnu(s) : {', '.join(sorted(unknown))}")
+
+        User = get_user_model()
+        user = User.objects.create_user(f"bench-{uuid.uuid4().hex[:8]}")
+        try:
+            now = timezone.now()
+            with EventBuffer() as buffer:
+                for i in range(history):
+                    buffer.add(user, timestamp=now - timedelta(minutes=17 * i))
+
+            results = []
+            for name in names:
+                method, path = ENDPOINTS[name]
+                for mode, runner in (("wsgi", run_wsgi), ("asgi", run_asgi)):
+                    durations, elapsed = runner(user, method, path, requests, concurrency)
+                    stats = summarize(durations)
+                    results.append({
+                        "endpoint": name,
+                        "mode": mode,
+                        "req_per_s": len(durations) / elapsed if elapsed else 0.0,
+                        **{k: stats[k] for k in ("p50_ms", "p95_ms", "p99_ms")},
+                    })
+        finally:
+            user.delete()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(format_table(
+            ["endpoint", "mode", "req/s", "p50 ms", "p95 ms", "p99 ms"],
+            [[r["endpoint"], r["mode"], r["req_per_s"], r["p50_ms"], r["p95_ms"], r["p99_ms"]] for r in results],
+        ))
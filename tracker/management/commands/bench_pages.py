@@ -0,0 +1,89 @@
+# tracker/management/commands/bench_pages.py
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from clopetracker.bench import format_table, summarize
+
+# Pages anonymes servies depuis le cache de pages
+PAGES = {
+    "home": "/",
+    "login": "/accounts/login/?next=/",
+}
+
+# Sans cache : DummyCache (ni pages ni fragments) ; avec : le cache configuré
+MODES = {
+    "sans cache": {"CACHES": {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}},
+    "cache": {},
+}
+
+
+def run_page(path, requests, concurrency):
+    """Visiteurs anonymes concurrents (un thread et un client par visiteur, cookies vidés à chaque requête)."""
+
+    def worker(n):
+        client = Client()
+        durations = []
+        try:
+            for _ in range(n):
+                client.cookies.clear()  # nouveau visiteur : aucun cookie
+                start = time.perf_counter()
+                response = client.get(path)
+                durations.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(f"{path} : statut {response.status_code}")
+        finally:
+            connection.close()
+        return durations
+
+    split = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        durations = [d for chunk in pool.map(worker, split) for d in chunk]
+    return durations, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark des pages anonymes (accueil, login) avec et sans cache de pages / fragments : "
+        "req/s et p50/p95/p99 sous charge concurrente, via les handlers Django en process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", default=",".join(PAGES), help=f"Pages parmi : {', '.join(PAGES)}.")
+        parser.add_argument("--requests", type=int, default=1000, help="Requêtes par page et par mode.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Visiteurs concurrents.")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour comparer deux runs).")
+
+    def handle(self, *args, pages, requests, concurrency, **options):
+        names = [p.strip() for p in pages.split(",") if p.strip()]
+        unknown = set(names) - set(PAGES)
+        if unknown:
+            raise CommandError(f"Page(s) inconnue(s) : {', '.join(sorted(unknown))}")
+
+        results = []
+        for name in names:
+            for mode, overrides in MODES.items():
+                with override_settings(**overrides):
+                    run_page(PAGES[name], concurrency, concurrency)  # chauffe (cache rempli)
+                    durations, elapsed = run_page(PAGES[name], requests, concurrency)
+                stats = summarize(durations)
+                results.append({
+                    "page": name,
+                    "mode": mode,
+                    "req_per_s": len(durations) / elapsed if elapsed else 0.0,
+                    **{k: stats[k] for k in ("p50_ms", "p95_ms", "p99_ms")},
+                })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(format_table(
+            ["page", "mode", "req/s", "p50 ms", "p95 ms", "p99 ms"],
+            [[r["page"], r["mode"], r["req_per_s"], r["p50_ms"], r["p95_ms"], r["p99_ms"]] for r in results],
+        ))
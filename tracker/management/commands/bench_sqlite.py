@@ -0,0 +1,159 @@
+# tracker/management/commands/bench_sqlite.py
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from clopetracker.bench import format_table, summarize
+from clopetracker.db import copy_sqlite_database
+from tracker.ingest import EventBuffer, log_event
+from tracker.models import SmokeEvent
+
+# Modes comparés : (SQLITE_TUNING, réplica de lecture)
+MODES = {
+    "default": (False, False),
+    "tuned": (True, False),
+    "tuned+replica": (True, True),
+}
+
+
+def _writer(user_ids, writes, results):
+    """Processus écrivain : `writes` cigarettes enregistrées par le chemin web (log_event)."""
+    durations, errors = [], 0
+    for _ in range(writes):
+        start = time.perf_counter()
+        try:
+            log_event(random.choice(user_ids))
+        except OperationalError:  # "database is locked"
+            errors += 1
+            continue
+        durations.append(time.perf_counter() - start)
+    results.put(("write", durations, errors))
+
+
+def _reader(user_ids, stop, results):
+    """Processus lecteur : pages d’historique (routées vers le réplica s’il existe) jusqu’à `stop`."""
+    durations, errors = [], 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            list(SmokeEvent.objects.filter(user_id=random.choice(user_ids)).order_by("-timestamp")[:50])
+        except OperationalError:
+            errors += 1
+            continue
+        durations.append(time.perf_counter() - start)
+    results.put(("read", durations, errors))
+
+
+def run_worker(users, history, writers, writes, readers):
+    """
+    Exécuté dans un sous-processus pointant sur une base SQLite jetable.
+    Écrivains et lecteurs sont des processus (comme des workers gunicorn / uvicorn),
+    pas des threads : pas de GIL partagé qui fausserait la durée des verrous.
+    """
+    call_command("migrate", verbosity=0)
+    User = get_user_model()
+    user_ids = [User.objects.create_user(f"bench-{i}").pk for i in range(users)]
+    with EventBuffer() as buffer:
+        for i in range(history):
+            buffer.add(user_ids[i % users])
+    if settings.TRACKER_READ_DATABASE:
+        copy_sqlite_database(
+            str(settings.DATABASES["default"]["NAME"]),
+            str(settings.DATABASES[settings.TRACKER_READ_DATABASE]["NAME"]),
+        )
+    # Chaque processus enfant ouvre ses propres connexions
+    connections.close_all()
+
+    context = multiprocessing.get_context("fork")
+    stop, results = context.Event(), context.Queue()
+    reader_procs = [context.Process(target=_reader, args=(user_ids, stop, results)) for _ in range(readers)]
+    writer_procs = [context.Process(target=_writer, args=(user_ids, writes, results)) for _ in range(writers)]
+    for proc in reader_procs + writer_procs:
+        proc.start()
+    start = time.perf_counter()
+    collected = [results.get() for _ in writer_procs]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    collected += [results.get() for _ in reader_procs]
+    for proc in reader_procs + writer_procs:
+        proc.join()
+
+    write_durations = [d for kind, durations, _ in collected if kind == "write" for d in durations]
+    read_durations = [d for kind, durations, _ in collected if kind == "read" for d in durations]
+    stats_w, stats_r = summarize(write_durations), summarize(read_durations)
+    return {
+        "writes_per_s": len(write_durations) / elapsed if elapsed else 0.0,
+        "write_errors": sum(errors for kind, _, errors in collected if kind == "write"),
+        "write_p99_ms": stats_w["p99_ms"],
+        "reads_per_s": len(read_durations) / elapsed if elapsed else 0.0,
+        "read_errors": sum(errors for kind, _, errors in collected if kind == "read"),
+        "read_p99_ms": stats_r["p99_ms"],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge SQLite : écrivains et lecteurs concurrents, réglages par défaut "
+        "vs mode production (SQLITE_TUNING) vs mode production + réplica de lecture. "
+        "Chaque mode tourne dans un sous-processus sur une base jetable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default=",".join(MODES), help=f"Modes parmi : {', '.join(MODES)}.")
+        parser.add_argument("--users", type=int, default=50, help="Utilisateurs de test.")
+        parser.add_argument("--history", type=int, default=20000, help="Cigarettes déjà en base.")
+        parser.add_argument("--writers", type=int, default=8, help="Processus écrivains.")
+        parser.add_argument("--writes", type=int, default=100, help="Écritures par processus écrivain.")
+        parser.add_argument("--readers", type=int, default=4, help="Processus lecteurs (pendant les écritures).")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour comparer deux runs).")
+        parser.add_argument("--worker", action="store_true", help="(interne) exécute un seul mode.")
+
+    def handle(self, *args, modes, users, history, writers, writes, readers, **options):
+        load = {"users": users, "history": history, "writers": writers, "writes": writes, "readers": readers}
+        if options["worker"]:
+            self.stdout.write(json.dumps(run_worker(**load)))
+            return
+
+        names = [m.strip() for m in modes.split(",") if m.strip()]
+        unknown = set(names) - set(MODES)
+        if unknown:
+            raise CommandError(f"Mode(s) inconnu(s) : {', '.join(sorted(unknown))}")
+
+        results = []
+        for name in names:
+            tuning, replica = MODES[name]
+            with tempfile.TemporaryDirectory(prefix="bench-sqlite-") as tmp:
+                env = dict(
+                    os.environ,
+                    DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'primary.sqlite3')}",
+                    DATABASE_REPLICA_URL=f"sqlite:///{os.path.join(tmp, 'replica.sqlite3')}" if replica else "",
+                    SQLITE_TUNING="True" if tuning else "False",
+                )
+                argv = [sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_sqlite", "--worker"]
+                argv += [f"--{k}={v}" for k, v in load.items()]
+                proc = subprocess.run(argv, env=env, capture_output=True, text=True)
+            if proc.returncode:
+                raise CommandError(f"Mode {name} en échec :\n{proc.stderr}")
+            results.append({"mode": name, **json.loads(proc.stdout.strip().splitlines()[-1])})
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(format_table(
+            ["mode", "écritures/s", "erreurs", "p99 écriture ms", "lectures/s", "p99 lecture ms"],
+            [
+                [r["mode"], r["writes_per_s"], r["write_errors"], r["write_p99_ms"], r["reads_per_s"], r["read_p99_ms"]]
+                for r in results
+            ],
+        ))
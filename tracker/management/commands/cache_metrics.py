@@ -0,0 +1,25 @@
+# tracker/management/commands/cache_metrics.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tracker.stats_cache import metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = "Affiche les hits / misses du cache de statistiques (tableau de bord)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true",
+            help="Remet les compteurs à zéro après affichage.",
+        )
+
+    def handle(self, *args, reset=False, **options):
+        m = metrics()
+        self.stdout.write(
+            f"Backend : {settings.CACHE_BACKEND}\n"
+            f"Hits : {m['hits']}  Misses : {m['misses']}  Taux de hit : {m['hit_ratio']:.1%}"
+        )
+        if reset:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS("Compteurs remis à zéro."))
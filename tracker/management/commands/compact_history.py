@@ -0,0 +1,33 @@
+# tracker/management/commands/compact_history.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tracker.archive import compact_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive les cigarettes plus anciennes que l’horizon (ARCHIVE_HORIZON_DAYS) : "
+        "sorties du journal SmokeEvent vers un fichier par utilisateur sous ARCHIVE_ROOT. "
+        "À lancer périodiquement (cron, timer systemd…), une seule instance à la fois."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None,
+            help=f"Horizon en jours locaux (défaut : ARCHIVE_HORIZON_DAYS = {settings.ARCHIVE_HORIZON_DAYS}).",
+        )
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Identifiant d’utilisateur à traiter (répétable). Par défaut : tous.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=100,
+            help="Nombre d’utilisateurs examinés par requête.",
+        )
+
+    def handle(self, *args, days=None, user_ids=None, chunk_size=100, **options):
+        users, events = compact_history(horizon_days=days, user_ids=user_ids, chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"{events} cigarette(s) archivée(s) pour {users} utilisateur(s)."
+        ))
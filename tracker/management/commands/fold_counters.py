@@ -0,0 +1,21 @@
+# tracker/management/commands/fold_counters.py
+from django.core.management.base import BaseCommand
+
+from tracker.counters import fold_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Replie les deltas des shards de compteur dans User.cigarettes_smoked. "
+        "À lancer périodiquement (cron, timer systemd…)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=500,
+            help="Nombre de shards traités par transaction.",
+        )
+
+    def handle(self, *args, chunk_size=500, **options):
+        folded = fold_counters(chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"{folded} cigarette(s) repliée(s)."))
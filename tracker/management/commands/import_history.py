@@ -0,0 +1,44 @@
+# tracker/management/commands/import_history.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.history import FORMATS, HistoryImportError, IMPORT_BATCH_SIZE, import_events, read_csv, read_json
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe un historique (CSV ou JSON exporté par /export/…, ou JSON Lines) en flux, "
+        "par lots, puis recalcule compteurs et agrégats des utilisateurs concernés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier à importer.")
+        parser.add_argument(
+            "--format", choices=FORMATS,
+            help="Format du fichier (déduit de l’extension si absent : .csv, .json, .jsonl).",
+        )
+        parser.add_argument(
+            "--user",
+            help="Importe toutes les lignes sur ce compte (ignore la colonne username).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=IMPORT_BATCH_SIZE,
+            help="Nombre d’événements insérés par transaction.",
+        )
+
+    def handle(self, *args, path, format=None, user=None, batch_size=IMPORT_BATCH_SIZE, **options):
+        fmt = format or {".csv": "csv", ".json": "json", ".jsonl": "json"}.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError("Format indéterminé : précise --format csv|json.")
+        reader = read_csv if fmt == "csv" else read_json
+        try:
+            with open(path, newline="", encoding="utf-8") as fh:
+                imported, skipped, touched = import_events(reader(fh), batch_size=batch_size, username=user)
+        except OSError as exc:
+            raise CommandError(f"Lecture impossible : {exc}") from exc
+        except HistoryImportError as exc:
+            raise CommandError(f"{exc} (les lots précédents restent importés)") from exc
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} cigarette(s) importée(s) pour {len(touched)} utilisateur(s), {skipped} ignorée(s)."
+        ))
@@ -0,0 +1,89 @@
+# tracker/management/commands/perf_report.py
+import json
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from clopetracker.bench import format_table, summarize
+
+SORT_KEYS = ("p99", "p95", "p50", "n", "queries")
+
+
+class Command(BaseCommand):
+    help = (
+        "Résume le journal de PerformanceMiddleware (PERF_LOG_FILE, une ligne JSON par requête) "
+        "en percentiles p50 / p95 / p99 par vue, avec nombre de requêtes SQL, requêtes lentes et N+1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="Journal à lire (défaut : PERF_LOG_FILE).")
+        parser.add_argument(
+            "--since", type=float, default=None,
+            help="Ne garder que les requêtes des N dernières heures.",
+        )
+        parser.add_argument("--sort", choices=SORT_KEYS, default="p99", help="Colonne de tri (décroissant).")
+        parser.add_argument("--limit", type=int, default=30, help="Nombre maximum de vues affichées.")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON.")
+
+    def handle(self, *args, path=None, since=None, sort="p99", limit=30, **options):
+        path = path or settings.PERF_LOG_FILE
+        if not path:
+            raise CommandError("Aucun journal : passe un chemin ou définis PERF_LOG_FILE.")
+        cutoff = time.time() - since * 3600 if since else None
+
+        # Par vue : durées totales + cumuls (le fichier est lu en flux)
+        durations = defaultdict(list)
+        totals = defaultdict(lambda: {"queries": 0, "max_queries": 0, "slow": 0, "n_plus_one": 0})
+        skipped = 0
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                        view = record["view"] or record["path"]
+                        if cutoff and record["ts"] < cutoff:
+                            continue
+                        durations[view].append(record["total_ms"] / 1000)
+                    except (ValueError, KeyError, TypeError):
+                        skipped += 1
+                        continue
+                    agg = totals[view]
+                    agg["queries"] += record.get("queries", 0)
+                    agg["max_queries"] = max(agg["max_queries"], record.get("queries", 0))
+                    agg["slow"] += bool(record.get("slow"))
+                    agg["n_plus_one"] += bool(record.get("n_plus_one"))
+        except OSError as exc:
+            raise CommandError(f"Lecture impossible : {exc}") from exc
+
+        rows = []
+        for view, values in durations.items():
+            stats = summarize(values)
+            agg = totals[view]
+            rows.append({
+                "view": view,
+                "n": stats["n"],
+                "p50": stats["p50_ms"],
+                "p95": stats["p95_ms"],
+                "p99": stats["p99_ms"],
+                "queries": agg["queries"] / stats["n"],
+                "max_queries": agg["max_queries"],
+                "slow": agg["slow"],
+                "n_plus_one": agg["n_plus_one"],
+            })
+        rows.sort(key=lambda r: r[sort], reverse=True)
+        rows = rows[:limit]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self.stdout.write(format_table(
+            ["vue", "n", "p50 ms", "p95 ms", "p99 ms", "SQL moy.", "SQL max", "lentes", "N+1"],
+            [
+                [r["view"], r["n"], r["p50"], r["p95"], r["p99"], r["queries"], r["max_queries"], r["slow"], r["n_plus_one"]]
+                for r in rows
+            ],
+        ))
+        if skipped:
+            self.stderr.write(f"{skipped} ligne(s) illisible(s) ignorée(s).")
@@ -0,0 +1,22 @@
+# tracker/management/commands/rebuild_rollups.py
+from django.core.management.base import BaseCommand
+
+from tracker.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats heure / jour / semaine depuis le journal SmokeEvent et les archives."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Identifiant d’utilisateur à traiter (répétable). Par défaut : tous.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=100,
+            help="Nombre d’utilisateurs recalculés par transaction.",
+        )
+
+    def handle(self, *args, user_ids=None, chunk_size=100, **options):
+        done = rebuild_rollups(user_ids=user_ids, chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"Agrégats recalculés pour {done} utilisateur(s)."))
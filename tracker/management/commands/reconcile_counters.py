@@ -0,0 +1,22 @@
+# tracker/management/commands/reconcile_counters.py
+from django.core.management.base import BaseCommand
+
+from tracker.ingest import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule User.cigarettes_smoked depuis le journal SmokeEvent et les archives."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Identifiant d’utilisateur à traiter (répétable). Par défaut : tous.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="Nombre d’utilisateurs mis à jour par transaction.",
+        )
+
+    def handle(self, *args, user_ids=None, chunk_size=1000, **options):
+        updated = reconcile_counters(user_ids=user_ids, chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"{updated} compteur(s) réconcilié(s)."))
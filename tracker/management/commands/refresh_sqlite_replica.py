@@ -0,0 +1,24 @@
+# tracker/management/commands/refresh_sqlite_replica.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from clopetracker.db import copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Recopie la base SQLite principale dans le réplica de lecture (DATABASE_REPLICA_URL), "
+        "via l’API backup de SQLite (instantané cohérent, écritures non bloquées). "
+        "À lancer périodiquement (cron, timer systemd…)."
+    )
+
+    def handle(self, *args, **options):
+        alias = settings.TRACKER_READ_DATABASE
+        if not alias:
+            raise CommandError("Aucun réplica configuré (DATABASE_REPLICA_URL).")
+        source, target = settings.DATABASES["default"], settings.DATABASES[alias]
+        sqlite = "django.db.backends.sqlite3"
+        if source["ENGINE"] != sqlite or target["ENGINE"] != sqlite:
+            raise CommandError("Réservé au couple SQLite → SQLite (un réplica Postgres se réplique tout seul).")
+        copy_sqlite_database(str(source["NAME"]), str(target["NAME"]))
+        self.stdout.write(self.style.SUCCESS(f"Réplica {target['NAME']} rafraîchi."))
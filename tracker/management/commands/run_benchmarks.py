@@ -0,0 +1,219 @@
+# tracker/management/commands/run_benchmarks.py
+import json
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from clopetracker.bench import format_table, summarize
+from tracker.seeding import DEFAULT_PREFIX, PASSWORD, delete_load_data
+
+# Seuils de référence versionnés (manage.py run_benchmarks --write-baseline pour les régénérer).
+# Seul le nombre de requêtes SQL y figure : latence et débit dépendent de la machine.
+BASELINE_PATH = Path(settings.BASE_DIR) / "clopetracker" / "bench_baseline.json"
+
+# Préfixe des comptes jetables (scénario signup et scénarios d’écriture), supprimés en fin de run
+THROWAWAY_PREFIX = "bench-tmp-"
+
+# Taille d’un lot de synchronisation hors ligne
+SYNC_BATCH = 20
+
+
+def _signup(client, user, i):
+    username = f"{THROWAWAY_PREFIX}{uuid.uuid4().hex[:12]}"
+    return client.post("/accounts/signup/", {
+        "username": username,
+        "email": f"{username}@example.com",
+        "password1": PASSWORD,
+        "password2": PASSWORD,
+    })
+
+
+def _login(client, user, i):
+    return client.post("/accounts/login/", {"username": user.username, "password": PASSWORD})
+
+
+def _home(client, user, i):
+    return client.get("/")
+
+
+def _api_list(client, user, i):
+    return client.get("/api/events/?limit=50")
+
+
+def _log(client, user, i):
+    return client.post("/log/")
+
+
+def _api_post(client, user, i):
+    return client.post("/api/events/", "{}", content_type="application/json")
+
+
+def _sync(client, user, i):
+    now = timezone.now()
+    events = [
+        {"key": uuid.uuid4().hex, "timestamp": (now - timedelta(minutes=n)).isoformat()}
+        for n in range(SYNC_BATCH)
+    ]
+    return client.post("/api/sync/", json.dumps({"events": events}), content_type="application/json")
+
+
+# Scénarios : nom → (fonction, statut attendu, connecté, ajoute des cigarettes)
+SCENARIOS = {
+    "signup": (_signup, 302, False, False),
+    "login": (_login, 302, False, False),
+    "home": (_home, 200, True, False),
+    "api_list": (_api_list, 200, True, False),
+    "log": (_log, 302, True, True),
+    "api_post": (_api_post, 201, True, True),
+    "sync": (_sync, 200, True, True),
+}
+
+
+def _throwaway_users(n):
+    """Comptes vierges (sans mot de passe utilisable) pour les scénarios d’écriture."""
+    User = get_user_model()
+    return User.objects.bulk_create([
+        User(username=f"{THROWAWAY_PREFIX}{uuid.uuid4().hex[:12]}", password=make_password(None))
+        for _ in range(n)
+    ])
+
+
+def run_scenario(name, users, requests):
+    """
+    Rejoue `requests` requêtes du scénario en tournant sur `users`.
+    Les scénarios d’écriture tournent sur autant de comptes jetables : les comptes
+    générés par seed_load_data gardent leur historique d’un run à l’autre.
+    Retourne les mesures : débit, percentiles de latence, requêtes SQL (moyenne et max).
+    """
+    func, expected, logged_in, writes = SCENARIOS[name]
+    if writes:
+        users = _throwaway_users(len(users))
+    clients = []
+    for user in users:
+        client = Client()
+        if logged_in:
+            client.force_login(user)
+        clients.append(client)
+
+    durations, queries = [], []
+    start = time.perf_counter()
+    for i in range(requests):
+        n = i % len(users)
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            response = func(clients[n], users[n], i)
+            durations.append(time.perf_counter() - t0)
+        if response.status_code != expected:
+            raise CommandError(
+                f"{name} : statut {response.status_code} au lieu de {expected} (requête {i})."
+            )
+        queries.append(len(ctx.captured_queries))
+    elapsed = time.perf_counter() - start
+
+    stats = summarize(durations)
+    return {
+        "scenario": name,
+        "n": stats["n"],
+        "req_per_s": len(durations) / elapsed if elapsed else 0.0,
+        **{k: stats[k] for k in ("p50_ms", "p95_ms", "p99_ms")},
+        "queries_avg": sum(queries) / len(queries) if queries else 0.0,
+        "queries_max": max(queries, default=0),
+    }
+
+
+def check(result, limits):
+    """Liste des seuils dépassés pour un scénario (vide → OK)."""
+    failures = []
+    if "max_queries" in limits and result["queries_max"] > limits["max_queries"]:
+        failures.append(f"{result['queries_max']} requêtes SQL > {limits['max_queries']}")
+    return failures
+
+
+def baseline_from(results):
+    """Seuils tirés d’un run : nombre de requêtes SQL exact (identique d’une machine à l’autre)."""
+    return {r["scenario"]: {"max_queries": r["queries_max"]} for r in results}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de bout en bout (signup, login, tableau de bord, API, ingestion) via le client "
+        "de test Django sur la base configurée : débit, p50/p95/p99 et requêtes SQL. Le nombre de "
+        "requêtes SQL est comparé aux seuils de référence versionnés ; code de sortie non nul en "
+        "cas de régression. "
+        "Nécessite des comptes générés par seed_load_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios", default=",".join(SCENARIOS),
+            help=f"Scénarios parmi : {', '.join(SCENARIOS)}.",
+        )
+        parser.add_argument("--requests", type=int, default=50, help="Requêtes par scénario.")
+        parser.add_argument("--users", type=int, default=20, help="Comptes générés utilisés en rotation.")
+        parser.add_argument("--prefix", default=DEFAULT_PREFIX, help="Préfixe des comptes générés.")
+        parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Fichier de seuils JSON.")
+        parser.add_argument(
+            "--write-baseline", action="store_true",
+            help="Réécrit le fichier de seuils à partir de ce run au lieu de le vérifier.",
+        )
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour comparer deux runs).")
+
+    def handle(self, *args, scenarios, requests, prefix, baseline, **options):
+        names = [s.strip() for s in scenarios.split(",") if s.strip()]
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Scénario(s) inconnu(s) : {', '.join(sorted(unknown))}")
+        if requests < 1:
+            raise CommandError("--requests doit être ≥ 1.")
+
+        User = get_user_model()
+        users = list(User.objects.filter(username__startswith=prefix).order_by("pk")[:options["users"]])
+        if not users:
+            raise CommandError(
+                f"Aucun compte « {prefix}* » : lancer d’abord `manage.py seed_load_data`."
+            )
+
+        results = []
+        try:
+            for name in names:
+                results.append(run_scenario(name, users, requests))
+        finally:
+            delete_load_data(prefix=THROWAWAY_PREFIX)
+
+        path = Path(baseline)
+        if options["write_baseline"]:
+            path.write_text(json.dumps(baseline_from(results), indent=2) + "\n")
+            limits = {}
+        else:
+            limits = json.loads(path.read_text()) if path.exists() else {}
+        for r in results:
+            r["failures"] = check(r, limits.get(r["scenario"], {}))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(format_table(
+                ["scenario", "req/s", "p50 ms", "p95 ms", "p99 ms", "SQL moy", "SQL max", "seuils"],
+                [
+                    [r["scenario"], r["req_per_s"], r["p50_ms"], r["p95_ms"], r["p99_ms"],
+                     r["queries_avg"], r["queries_max"], "; ".join(r["failures"]) or "ok"]
+                    for r in results
+                ],
+            ))
+
+        if options["write_baseline"]:
+            self.stdout.write(self.style.SUCCESS(f"Seuils écrits dans {path}."))
+            return
+        regressions = [r["scenario"] for r in results if r["failures"]]
+        if regressions:
+            raise CommandError(f"Régression : {', '.join(regressions)}")
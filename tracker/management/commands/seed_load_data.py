@@ -0,0 +1,61 @@
+# tracker/management/commands/seed_load_data.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.seeding import DEFAULT_PREFIX, PASSWORD, delete_load_data, seed_load_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données de charge : utilisateurs (groupes, avatars partagés) "
+        "et historiques de cigarettes réalistes, agrégats et compteurs inclus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="Nombre d’utilisateurs à créer.")
+        parser.add_argument("--days", type=int, default=60, help="Profondeur d’historique (jours).")
+        parser.add_argument("--per-day", type=float, default=10, help="Cigarettes par jour (moyenne).")
+        parser.add_argument("--group-size", type=int, default=25, help="Membres par groupe (en moyenne).")
+        parser.add_argument(
+            "--avatars", type=float, default=0.3, dest="avatar_ratio",
+            help="Part des utilisateurs avec un avatar (0 → aucun avatar généré).",
+        )
+        parser.add_argument("--prefix", default=DEFAULT_PREFIX, help="Préfixe des noms d’utilisateur générés.")
+        parser.add_argument(
+            "--chunk-size", type=int, default=200,
+            help="Nombre d’utilisateurs insérés par transaction.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Lignes par INSERT groupé.")
+        parser.add_argument("--seed", type=int, default=None, help="Graine aléatoire (jeu reproductible).")
+        parser.add_argument(
+            "--clear", action="store_true",
+            help="Supprime d’abord les comptes et groupes déjà générés avec ce préfixe.",
+        )
+
+    def handle(self, *args, users, days, per_day, prefix, clear, **options):
+        if users < 0 or days < 1 or per_day < 0:
+            raise CommandError("--users ≥ 0, --days ≥ 1 et --per-day ≥ 0 attendus.")
+        if not prefix:
+            raise CommandError("--prefix ne peut pas être vide.")
+
+        if clear:
+            deleted = delete_load_data(prefix)
+            self.stdout.write(f"{deleted} utilisateur(s) « {prefix}* » supprimé(s).")
+
+        def progress(done, events):
+            self.stdout.write(f"  {done}/{users} utilisateurs, {events} cigarettes")
+
+        start = time.perf_counter()
+        created, groups, events = seed_load_data(
+            users=users, days=days, per_day=per_day, prefix=prefix,
+            group_size=options["group_size"], avatar_ratio=options["avatar_ratio"],
+            chunk_size=options["chunk_size"], batch_size=options["batch_size"],
+            seed=options["seed"], progress=progress if options["verbosity"] > 1 else None,
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} utilisateur(s), {groups} groupe(s), {events} cigarette(s) "
+            f"créés en {elapsed:.1f} s ({events / elapsed if elapsed else 0:.0f} cigarettes/s). "
+            f"Mot de passe commun : {PASSWORD}"
+        ))
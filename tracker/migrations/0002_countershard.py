@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Shard')),
+                ('delta', models.IntegerField(default=0, verbose_name='Delta en attente')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'shard de compteur',
+                'verbose_name_plural': 'shards de compteur',
+                'constraints': [models.UniqueConstraint(fields=('user', 'shard'), name='tracker_shard_user_shard_uniq')],
+            },
+        ),
+    ]
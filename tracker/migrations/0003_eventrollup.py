@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0002_countershard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Heure'), ('day', 'Jour'), ('week', 'Semaine')], max_length=4, verbose_name='Période')),
+                ('bucket_start', models.DateTimeField(verbose_name='Début de la tranche')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Cigarettes')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='event_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'agrégat',
+                'verbose_name_plural': 'agrégats',
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'bucket_start'), name='tracker_rollup_bucket_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_eventrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smokeevent',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Clé client'),
+        ),
+        migrations.AddConstraint(
+            model_name='smokeevent',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_key__isnull', False)), fields=('user', 'client_key'), name='tracker_event_client_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_smokeevent_client_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.CharField(max_length=255, verbose_name='Fichier')),
+                ('generation', models.PositiveIntegerField(default=0, verbose_name='Génération')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Cigarettes archivées')),
+                ('first_at', models.DateTimeField(null=True, verbose_name='Première cigarette')),
+                ('last_at', models.DateTimeField(null=True, verbose_name='Dernière cigarette')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Compacté le')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='event_archive', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'archive d’historique',
+                'verbose_name_plural': 'archives d’historique',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_eventarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='countershard',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Écritures'),
+        ),
+    ]
@@ -1,3 +1,149 @@
+# tracker/models.py
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class SmokeEvent(models.Model):
+    """
+    Journal append-only des cigarettes fumées.
+    - Une ligne = une cigarette (jamais modifiée, seulement insérée)
+    - Index composite (user, timestamp) → historique et fenêtres de temps rapides
+    Le compteur User.cigarettes_smoked est dérivé de ce journal (voir tracker.ingest).
+    """
+
+    # Pas d’index FK séparé : l’index composite (user, timestamp) le couvre déjà
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="smoke_events",
+        db_index=False,
+        verbose_name="Utilisateur",
+    )
+
+    # Moment où la cigarette a été fumée (UTC en base, USE_TZ=True)
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Horodatage")
+
+    # Clé d’idempotence générée par le client (sync hors ligne) ; vide pour le web
+    client_key = models.CharField(
+        max_length=64, null=True, blank=True, verbose_name="Clé client"
+    )
+
+    class Meta:
+        verbose_name = "cigarette"
+        verbose_name_plural = "cigarettes"
+        indexes = [
+            models.Index(fields=["user", "timestamp"], name="tracker_event_user_ts"),
+        ]
+        constraints = [
+            # Un renvoi du même lot par le client ne crée pas de doublon
+            models.UniqueConstraint(
+                fields=["user", "client_key"],
+                condition=models.Q(client_key__isnull=False),
+                name="tracker_event_client_key_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.timestamp:%Y-%m-%d %H:%M}"
+
+
+class CounterShard(models.Model):
+    """
+    Deltas en attente pour User.cigarettes_smoked, répartis sur quelques shards.
+    - Chaque écriture fait un UPDATE delta = delta + n sur un shard au hasard
+      → plusieurs appareils ne se battent plus pour la même ligne
+    - Les deltas sont repliés dans la ligne User par `manage.py fold_counters`
+    - version : +1 à chaque écriture (même UPDATE) et à chaque suppression dans le journal ;
+      jamais remise à zéro → somme par utilisateur = version du journal (ETag de l’API)
+    Valeur exacte = User.cigarettes_smoked + somme des deltas (voir tracker.counters).
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="counter_shards",
+        db_index=False,  # couvert par la contrainte unique (user, shard)
+        verbose_name="Utilisateur",
+    )
+    shard = models.PositiveSmallIntegerField(verbose_name="Shard")
+    delta = models.IntegerField(default=0, verbose_name="Delta en attente")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Écritures")
+
+    class Meta:
+        verbose_name = "shard de compteur"
+        verbose_name_plural = "shards de compteur"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "shard"], name="tracker_shard_user_shard_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}#{self.shard}: {self.delta:+d}"
+
+
+class EventRollup(models.Model):
+    """
+    Agrégat du journal par utilisateur et par tranche de temps.
+    - Tranches heure / jour / semaine ISO découpées dans settings.TIME_ZONE
+    - bucket_start stocké en UTC (USE_TZ=True)
+    - Mis à jour incrémentalement à l’ingestion (voir tracker.rollups)
+    Le tableau de bord ne lit que cette table → coût constant quel que soit l’historique.
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+    PERIOD_CHOICES = [(HOUR, "Heure"), (DAY, "Jour"), (WEEK, "Semaine")]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="event_rollups",
+        db_index=False,  # couvert par la contrainte unique (user, period, bucket_start)
+        verbose_name="Utilisateur",
+    )
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES, verbose_name="Période")
+    bucket_start = models.DateTimeField(verbose_name="Début de la tranche")
+    count = models.PositiveIntegerField(default=0, verbose_name="Cigarettes")
+
+    class Meta:
+        verbose_name = "agrégat"
+        verbose_name_plural = "agrégats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "period", "bucket_start"], name="tracker_rollup_bucket_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.period} {self.bucket_start:%Y-%m-%d %H:%M}: {self.count}"
+
+
+class EventArchive(models.Model):
+    """
+    Historique ancien d’un utilisateur, sorti du journal SmokeEvent (voir tracker.archive).
+    - Un fichier binaire à largeur fixe par utilisateur sous ARCHIVE_ROOT, lu par mmap
+    - Réécrit sous un nouveau nom à chaque compactage (generation) : la ligne pointe
+      toujours vers un fichier complet, l’ancien est supprimé après commit
+    - count / first_at / last_at : lisibles sans ouvrir le fichier
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="event_archive",
+        verbose_name="Utilisateur",
+    )
+    file = models.CharField(max_length=255, verbose_name="Fichier")
+    generation = models.PositiveIntegerField(default=0, verbose_name="Génération")
+    count = models.PositiveIntegerField(default=0, verbose_name="Cigarettes archivées")
+    first_at = models.DateTimeField(null=True, verbose_name="Première cigarette")
+    last_at = models.DateTimeField(null=True, verbose_name="Dernière cigarette")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Compacté le")
+
+    class Meta:
+        verbose_name = "archive d’historique"
+        verbose_name_plural = "archives d’historique"
+
+    def __str__(self):
+        return f"{self.user_id} : {self.count} cigarette(s) archivée(s)"
@@ -0,0 +1,196 @@
+# tracker/rollups.py
+"""
+Agrégats heure / jour / semaine du journal SmokeEvent.
+
+- Découpage dans settings.TIME_ZONE (Europe/Brussels), stockage en UTC
+- apply_events() : mise à jour incrémentale, appelée à chaque lot ingéré ; nombre de
+  requêtes constant quel que soit le lot (un SELECT, un bulk_update, un bulk_create)
+- rebuild_rollups() : recalcul complet par paquets d’utilisateurs (journal + archives ;
+  les cigarettes archivées n’ont plus que des tranches jour / semaine, voir tracker.archive)
+- Lectures bornées (quelques lignes) pour le tableau de bord
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import archive, leaderboard, stats_cache
+from .models import EventRollup, SmokeEvent
+
+PERIODS = (EventRollup.HOUR, EventRollup.DAY, EventRollup.WEEK)
+
+# Tranches conservées pour l’historique archivé
+ARCHIVED_PERIODS = (EventRollup.DAY, EventRollup.WEEK)
+
+
+def _user_id(user):
+    return getattr(user, "pk", user)
+
+
+def _local_midnight(day, tz):
+    return timezone.make_aware(datetime.combine(day, time.min), tz)
+
+
+def bucket_start(ts, period, tz=None):
+    """
+    Début (UTC) de la tranche contenant `ts`.
+    - hour : heure locale pleine (les heures doublées au passage à l’heure d’hiver restent distinctes)
+    - day  : minuit local
+    - week : lundi minuit local (semaine ISO)
+    """
+    tz = tz or timezone.get_default_timezone()
+    local = timezone.localtime(ts, tz)
+    if period == EventRollup.HOUR:
+        start = local.replace(minute=0, second=0, microsecond=0)
+    elif period == EventRollup.DAY:
+        start = _local_midnight(local.date(), tz)
+    elif period == EventRollup.WEEK:
+        start = _local_midnight(local.date() - timedelta(days=local.weekday()), tz)
+    else:
+        raise ValueError(f"Période inconnue : {period}")
+    return start.astimezone(dt_timezone.utc)
+
+
+def bucket_counts(rows, tz=None, periods=PERIODS):
+    """Compte les événements par (user_id, période, début de tranche). rows = [(user_id, ts), …]"""
+    tz = tz or timezone.get_default_timezone()
+    counts = Counter()
+    for user_id, ts in rows:
+        for period in periods:
+            counts[(user_id, period, bucket_start(ts, period, tz))] += 1
+    return counts
+
+
+def _add(user_id, period, start, n):
+    """count = count + n sur une tranche ; crée la ligne si besoin (course gérée)."""
+    lookup = {"user_id": user_id, "period": period, "bucket_start": start}
+    for _ in range(2):
+        if EventRollup.objects.filter(**lookup).update(count=F("count") + n):
+            return
+        try:
+            with transaction.atomic():
+                EventRollup.objects.create(count=n, **lookup)
+            return
+        except IntegrityError:
+            # Créée entre-temps par un autre écrivain → on refait l’UPDATE
+            continue
+    raise IntegrityError(f"Impossible de mettre à jour l’agrégat {lookup}")
+
+
+def apply_events(events):
+    """
+    Répercute une liste de SmokeEvent fraîchement insérés dans les agrégats (dans la transaction).
+    - Tranches existantes lues en un SELECT ... FOR UPDATE (un écrivain concurrent attend
+      au lieu de perdre son incrément), puis un seul bulk_update
+    - Tranches nouvelles en un bulk_create ; créées entre-temps par un autre écrivain
+      (IntegrityError) → repli tranche par tranche (_add)
+    """
+    counts = bucket_counts((e.user_id, e.timestamp) for e in events)
+    if not counts:
+        return
+    existing = {
+        (row.user_id, row.period, row.bucket_start): row
+        for row in EventRollup.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _, _ in counts},
+            period__in={period for _, period, _ in counts},
+            bucket_start__in={start for _, _, start in counts},
+        )
+    }
+    updated, created = [], []
+    for (user_id, period, start), n in counts.items():
+        row = existing.get((user_id, period, start))
+        if row is None:
+            created.append(EventRollup(user_id=user_id, period=period, bucket_start=start, count=n))
+        else:
+            row.count += n
+            updated.append(row)
+    if updated:
+        EventRollup.objects.bulk_update(updated, ["count"])
+    if not created:
+        return
+    try:
+        with transaction.atomic():
+            EventRollup.objects.bulk_create(created)
+    except IntegrityError:
+        for row in created:
+            _add(row.user_id, row.period, row.bucket_start, row.count)
+
+
+def rebuild_rollups(user_ids=None, chunk_size=100, batch_size=1000):
+    """
+    Recalcule entièrement les agrégats depuis le journal.
+    - Une transaction par paquet d’utilisateurs (verrous courts)
+    - Les événements sont lus en flux (iterator), seuls les compteurs restent en mémoire
+    Retourne le nombre d’utilisateurs traités.
+    """
+    User = get_user_model()
+    users = User.objects.order_by("pk")
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    done = 0
+    last_pk = 0
+    while True:
+        chunk = list(users.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size])
+        if not chunk:
+            return done
+        with transaction.atomic():
+            EventRollup.objects.filter(user_id__in=chunk).delete()
+            rows = (
+                SmokeEvent.objects.filter(user_id__in=chunk)
+                .order_by()
+                .values_list("user_id", "timestamp")
+                .iterator(chunk_size=batch_size)
+            )
+            counts = bucket_counts(rows)
+            counts.update(bucket_counts(
+                ((user_id, ts) for user_id, _, ts in archive.archived_rows(chunk)), periods=ARCHIVED_PERIODS,
+            ))
+            EventRollup.objects.bulk_create(
+                (
+                    EventRollup(user_id=user_id, period=period, bucket_start=start, count=n)
+                    for (user_id, period, start), n in counts.items()
+                ),
+                batch_size=batch_size,
+            )
+            stats_cache.invalidate_users(chunk)
+            leaderboard.invalidate_users(chunk)
+        done += len(chunk)
+        last_pk = chunk[-1]
+
+
+# --- Lectures pour le tableau de bord ---
+
+def period_count(user, period, now=None):
+    """Nombre de cigarettes dans la tranche courante (heure, jour ou semaine)."""
+    start = bucket_start(now or timezone.now(), period)
+    return (
+        EventRollup.objects.filter(user_id=_user_id(user), period=period, bucket_start=start)
+        .values_list("count", flat=True)
+        .first()
+    ) or 0
+
+
+def window_start(days, now=None):
+    """Début (UTC) des `days` derniers jours locaux, aujourd’hui inclus."""
+    tz = timezone.get_default_timezone()
+    today = timezone.localtime(now or timezone.now(), tz).date()
+    return _local_midnight(today - timedelta(days=days - 1), tz).astimezone(dt_timezone.utc)
+
+
+def daily_counts(user, days=7, now=None):
+    """Liste [(date locale, nombre)] des `days` derniers jours, aujourd’hui inclus."""
+    tz = timezone.get_default_timezone()
+    today = timezone.localtime(now or timezone.now(), tz).date()
+    dates = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    starts = [_local_midnight(d, tz).astimezone(dt_timezone.utc) for d in dates]
+    found = dict(
+        EventRollup.objects.filter(
+            user_id=_user_id(user), period=EventRollup.DAY, bucket_start__in=starts
+        ).values_list("bucket_start", "count")
+    )
+    return [(d, found.get(s, 0)) for d, s in zip(dates, starts)]
+
@@ -0,0 +1,223 @@
+# tracker/seeding.py
+"""
+Jeu de données synthétique pour les tests de charge (manage.py seed_load_data).
+
+- Utilisateurs insérés par bulk_create avec UN hash de mot de passe calculé une fois
+  (le hachage PBKDF2 par utilisateur coûterait ~0,5 s chacun)
+- Quelques avatars générés et traités une seule fois, partagés entre comptes
+  (noms adressés par contenu, comme en production)
+- Historiques réalistes : rythme propre à chaque fumeur, pics horaires (réveil, pauses, soirée)
+- Compteur, agrégats heure / jour / semaine calculés pendant la génération
+  → pas de reconcile_counters / rebuild_rollups à relancer derrière
+- Journal et agrégats insérés par executemany brut : la compilation SQL de bulk_create
+  (une requête préparée champ par champ) coûtait ~75 % du temps
+"""
+import math
+import random
+from collections import Counter
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import Group
+from accounts.utils.images import process_avatar_variants, store_avatar_variants
+
+from . import leaderboard, stats_cache
+from .models import EventRollup, SmokeEvent
+from .rollups import _local_midnight, bucket_start
+
+# Préfixe des comptes générés (permet de les retrouver et de les supprimer)
+DEFAULT_PREFIX = "load-"
+
+# Mot de passe commun à tous les comptes générés (utilisé par run_benchmarks pour le login)
+PASSWORD = "clope-load-test"
+
+# Nombre d’avatars distincts générés puis partagés
+AVATAR_COUNT = 12
+
+# Poids relatifs des heures locales (6 h → 23 h)
+HOUR_WEIGHTS = {
+    6: 2, 7: 6, 8: 8, 9: 5, 10: 6, 11: 4, 12: 7, 13: 8, 14: 5,
+    15: 5, 16: 6, 17: 7, 18: 8, 19: 6, 20: 6, 21: 7, 22: 5, 23: 3,
+}
+
+
+def _make_avatar(n):
+    """Image source synthétique n°`n` (dégradé teinté), encodée en PNG."""
+    size = 640
+    gradient = Image.linear_gradient("L").resize((size, size))
+    tint = Image.new("L", (size, size), (n * 53) % 256)
+    img = Image.merge("RGB", (gradient, tint, gradient.rotate(90 * (n % 4))))
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    buffer.seek(0)
+    buffer.name = f"seed-{n}.png"
+    return buffer
+
+
+def seed_avatars(count=AVATAR_COUNT):
+    """Génère et stocke `count` avatars traités ; retourne leurs noms (réutilisés s’ils existent)."""
+    User = get_user_model()
+    field = User._meta.get_field("profile_image")
+    return [store_avatar_variants(field, process_avatar_variants(_make_avatar(n))) for n in range(count)]
+
+
+class _Buckets:
+    """Mémo (jour local, heure) → débuts UTC des tranches heure / jour / semaine."""
+
+    def __init__(self):
+        self.tz = timezone.get_default_timezone()
+        self._cache = {}
+
+    def get(self, day, hour):
+        key = (day, hour)
+        if key not in self._cache:
+            # Heures 6 h → 23 h : jamais dans le trou ni le doublon du changement d’heure
+            start = bucket_start(_local_midnight(day, self.tz) + timedelta(hours=hour), EventRollup.HOUR)
+            self._cache[key] = (
+                start,
+                bucket_start(start, EventRollup.DAY, self.tz),
+                bucket_start(start, EventRollup.WEEK, self.tz),
+            )
+        return self._cache[key]
+
+
+def plan_history(rng, days, per_day, today):
+    """
+    Historique d’un fumeur : Counter {(jour local, heure): nombre}.
+    - rythme propre autour de `per_day` (log-normal), bruit quotidien
+    - date d’inscription tirée dans la fenêtre (certains comptes sont récents)
+    """
+    rate = per_day * rng.lognormvariate(0, 0.5)
+    first = rng.randrange(days) if rng.random() < 0.3 else days - 1
+    hours, weights = list(HOUR_WEIGHTS), list(HOUR_WEIGHTS.values())
+    plan = Counter()
+    for offset in range(first, -1, -1):
+        day = today - timedelta(days=offset)
+        n = max(0, round(rng.gauss(rate, math.sqrt(rate))))
+        plan.update((day, hour) for hour in rng.choices(hours, weights, k=n))
+    return plan, today - timedelta(days=first)
+
+
+def _materialize(plan, buckets, rng, now):
+    """Horodatages et agrégats {(période, début): nombre} d’un plan (rien dans le futur)."""
+    timestamps = []
+    rollups = Counter()
+    for (day, hour), n in plan.items():
+        hour_start, day_start, week_start = buckets.get(day, hour)
+        for _ in range(n):
+            ts = hour_start + timedelta(seconds=rng.randrange(3600))
+            if ts > now:
+                continue
+            timestamps.append(ts)
+            rollups[(EventRollup.HOUR, hour_start)] += 1
+            rollups[(EventRollup.DAY, day_start)] += 1
+            rollups[(EventRollup.WEEK, week_start)] += 1
+    return timestamps, rollups
+
+
+def _insert(model, fields, rows, batch_size):
+    """INSERT groupé sans passer par les instances du modèle (valeurs déjà adaptées au backend)."""
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(model._meta.get_field(f).column) for f in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = f"INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({placeholders})"
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[i:i + batch_size])
+    return len(rows)
+
+
+def seed_load_data(
+    users=1000, days=60, per_day=10, group_size=25, avatar_ratio=0.3,
+    prefix=DEFAULT_PREFIX, chunk_size=200, batch_size=5000, seed=None, progress=None,
+):
+    """
+    Crée `users` comptes avec leurs groupes, avatars et historiques.
+    - Une transaction par paquet de `chunk_size` utilisateurs
+    - La numérotation reprend après les comptes `prefix` déjà présents (relançable)
+    Retourne (utilisateurs, groupes, événements) créés.
+    """
+    User = get_user_model()
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = timezone.localtime(now).date()
+    buckets = _Buckets()
+
+    password = make_password(PASSWORD)
+    avatars = seed_avatars() if avatar_ratio > 0 else []
+    start = User.objects.filter(username__startswith=prefix).count()
+    groups = Group.objects.bulk_create(
+        Group(name=f"{prefix}groupe-{start + n:06d}") for n in range(math.ceil(users / max(group_size, 1)))
+    )
+
+    created_events = 0
+    for offset in range(0, users, chunk_size):
+        members = []
+        histories = []
+        for i in range(start + offset, start + min(offset + chunk_size, users)):
+            plan, joined = plan_history(rng, days, per_day, today)
+            timestamps, rollups = _materialize(plan, buckets, rng, now)
+            username = f"{prefix}{i:06d}"
+            avatar = rng.choice(avatars) if avatars and rng.random() < avatar_ratio else None
+            members.append(User(
+                username=username,
+                email=f"{username}@example.com",
+                password=password,
+                date_joined=_local_midnight(joined, buckets.tz),
+                group=rng.choice(groups) if groups and rng.random() < 0.8 else None,
+                profile_image=avatar,
+                avatar_ready=avatar is not None,
+                cigarettes_smoked=len(timestamps),
+            ))
+            histories.append((timestamps, rollups))
+
+        with transaction.atomic():
+            members = User.objects.bulk_create(members, batch_size=batch_size)
+            adapt = connection.ops.adapt_datetimefield_value
+            events = _insert(
+                SmokeEvent, ("user", "timestamp"),
+                [
+                    (user.pk, adapt(ts))
+                    for user, (timestamps, _) in zip(members, histories)
+                    for ts in timestamps
+                ],
+                batch_size,
+            )
+            _insert(
+                EventRollup, ("user", "period", "bucket_start", "count"),
+                [
+                    (user.pk, period, adapt(bucket), n)
+                    for user, (_, rollups) in zip(members, histories)
+                    for (period, bucket), n in rollups.items()
+                ],
+                batch_size,
+            )
+            user_ids = [u.pk for u in members]
+            stats_cache.invalidate_users(user_ids)
+            leaderboard.invalidate_users(user_ids)
+
+        created_events += events
+        if progress:
+            progress(offset + len(members), created_events)
+    return users, len(groups), created_events
+
+
+def delete_load_data(prefix=DEFAULT_PREFIX, chunk_size=200):
+    """Supprime les comptes et groupes générés (les événements suivent en cascade)."""
+    User = get_user_model()
+    deleted = 0
+    while True:
+        chunk = list(User.objects.filter(username__startswith=prefix).values_list("pk", flat=True)[:chunk_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            User.objects.filter(pk__in=chunk).delete()
+        deleted += len(chunk)
+    Group.objects.filter(name__startswith=f"{prefix}groupe-").delete()
+    return deleted
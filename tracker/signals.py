@@ -0,0 +1,34 @@
+# tracker/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .archive import archive_storage
+from .leaderboard import invalidate_group
+from .models import EventArchive
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_group_post_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Changement de groupe → ancien et nouveau classements invalidés.
+    (l’origine vient du DirtyFieldsMixin : aucune requête ici)
+    """
+    if update_fields is not None and "group" not in update_fields:
+        return
+    if not created and not instance.has_changed("group"):
+        return
+    invalidate_group(instance.get_original("group"))
+    invalidate_group(instance.group_id)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_group_post_delete(sender, instance, **kwargs):
+    invalidate_group(instance.group_id)
+
+
+@receiver(post_delete, sender=EventArchive)
+def event_archive_post_delete(sender, instance, **kwargs):
+    """Archive supprimée (compte supprimé) → fichier supprimé après commit."""
+    transaction.on_commit(lambda: archive_storage().delete(instance.file))
@@ -0,0 +1,216 @@
+# tracker/stats_cache.py
+"""
+Cache des statistiques par utilisateur (tableau de bord).
+
+- Clés versionnées : stats:<user>:<version>:<jour local>
+  → écrire un événement incrémente la version (bump) au lieu de supprimer des clés ;
+    les anciennes entrées ne sont plus jamais lues et expirent d’elles-mêmes
+- Le jour local fait partie de la clé : les fenêtres glissent à minuit sans invalidation
+- Backend choisi dans les settings (CACHE_BACKEND : locmem, file ou redis)
+- Calcul toujours sur la base primaire (using_primary) : un réplica en retard
+  figerait sinon un résultat périmé sous la nouvelle version
+- Compteurs de hits / misses stockés dans le cache lui-même (partagés entre process
+  avec les backends file et redis) → `python manage.py cache_metrics` ;
+  approximatifs avec file (incr non atomique), exacts avec redis
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from clopetracker.db import using_primary
+
+from . import archive, counters, rollups
+from .models import EventRollup, SmokeEvent
+
+METRIC_KEYS = {"hits": "stats:metrics:hits", "misses": "stats:metrics:misses"}
+
+
+def _user_id(user):
+    return getattr(user, "pk", user)
+
+
+# --- Versions ---
+
+def current_version(key):
+    """Version stockée sous `key` (créée si absente / évincée du cache)."""
+    version = cache.get(key)
+    if version is None:
+        # Horodatage plutôt que 1 : ne ressuscite jamais d’anciennes entrées
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def acurrent_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    """
+    Change la version stockée sous `key` : toutes les entrées qui en dépendent deviennent obsolètes.
+    Nouvel horodatage plutôt que incr() : FileBasedCache.incr() est un get + set non atomique,
+    deux bumps concurrents écriraient la même version et l’un des deux serait perdu.
+    Une valeur neuve à chaque bump ne dépend pas de l’atomicité du backend.
+    """
+    cache.set(key, time.time_ns(), None)
+
+
+def _version_key(user_id):
+    return f"stats:{user_id}:version"
+
+
+def user_version(user):
+    """Version courante des données de l’utilisateur (changée après chaque lot commité)."""
+    return current_version(_version_key(_user_id(user)))
+
+
+def invalidate_users(user_ids):
+    """Rend obsolètes les statistiques en cache de ces utilisateurs (après commit)."""
+    user_ids = set(user_ids)
+
+    def _bump():
+        for user_id in user_ids:
+            bump_version(_version_key(user_id))
+
+    if user_ids:
+        transaction.on_commit(_bump)
+
+
+# --- Métriques ---
+
+def _count(metric):
+    key = METRIC_KEYS[metric]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+async def _acount(metric):
+    key = METRIC_KEYS[metric]
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, None):
+            await cache.aincr(key)
+
+
+def metrics():
+    """{"hits", "misses", "hit_ratio"} depuis la dernière remise à zéro."""
+    values = cache.get_many(METRIC_KEYS.values())
+    hits = values.get(METRIC_KEYS["hits"], 0)
+    misses = values.get(METRIC_KEYS["misses"], 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+
+
+def reset_metrics():
+    cache.delete_many(METRIC_KEYS.values())
+
+
+# --- Statistiques ---
+
+def _rollup_rows(user_id, now):
+    # Agrégats "day" des 30 derniers jours : une seule lecture pour toutes les fenêtres
+    return EventRollup.objects.filter(
+        user_id=user_id, period=EventRollup.DAY,
+        bucket_start__gte=rollups.window_start(30, now),
+    ).values_list("bucket_start", "count")
+
+
+def _last_smoked(user_id):
+    return SmokeEvent.objects.filter(user_id=user_id).order_by("-timestamp").values_list("timestamp", flat=True)
+
+
+def _local_today(now):
+    return timezone.localtime(now or timezone.now(), timezone.get_default_timezone()).date()
+
+
+def _build_stats(rows, last_smoked_at, total, today):
+    tz = timezone.get_default_timezone()
+    by_date = {timezone.localtime(start, tz).date(): n for start, n in rows}
+    by_date = {d: n for d, n in by_date.items() if d <= today}
+
+    week_start = today - timedelta(days=today.weekday())
+    seven_days_ago = today - timedelta(days=7)
+    return {
+        "today": by_date.get(today, 0),
+        "week": sum(n for d, n in by_date.items() if d >= week_start),
+        "last_7_days": sum(n for d, n in by_date.items() if d > seven_days_ago),
+        "last_30_days": sum(by_date.values()),
+        "daily": [(d, by_date.get(d, 0)) for d in (today - timedelta(days=i) for i in range(6, -1, -1))],
+        "last_smoked_at": last_smoked_at,
+        "total": total,
+    }
+
+
+def _stats_key(user_id, version, today):
+    return f"stats:{user_id}:{version}:{today.isoformat()}"
+
+
+def compute_stats(user, now=None):
+    """
+    Statistiques calculées en base (3 requêtes bornées, quel que soit l’historique ;
+    une de plus pour last_smoked_at si tout l’historique est archivé) :
+    today, week, last_7_days, last_30_days, daily (7 derniers jours),
+    last_smoked_at, total.
+    """
+    user_id = _user_id(user)
+    now = now or timezone.now()
+    with using_primary():
+        return _build_stats(
+            list(_rollup_rows(user_id, now)),
+            _last_smoked(user_id).first() or archive.last_archived_at(user_id),
+            counters.get_count(user_id),
+            _local_today(now),
+        )
+
+
+async def acompute_stats(user, now=None):
+    """compute_stats() avec l’ORM async."""
+    user_id = _user_id(user)
+    now = now or timezone.now()
+    with using_primary():
+        return _build_stats(
+            [row async for row in _rollup_rows(user_id, now)],
+            await _last_smoked(user_id).afirst() or await archive.alast_archived_at(user_id),
+            await counters.aget_count(user_id),
+            _local_today(now),
+        )
+
+
+def get_stats(user, now=None):
+    """Statistiques depuis le cache ; calculées puis mises en cache si absentes."""
+    user_id = _user_id(user)
+    key = _stats_key(user_id, current_version(_version_key(user_id)), _local_today(now))
+    stats = cache.get(key)
+    if stats is None:
+        _count("misses")
+        stats = compute_stats(user_id, now)
+        cache.set(key, stats, settings.STATS_CACHE_TIMEOUT)
+    else:
+        _count("hits")
+    return stats
+
+
+async def aget_stats(user, now=None):
+    """get_stats() pour les vues async (API de cache et ORM async)."""
+    user_id = _user_id(user)
+    key = _stats_key(user_id, await acurrent_version(_version_key(user_id)), _local_today(now))
+    stats = await cache.aget(key)
+    if stats is None:
+        await _acount("misses")
+        stats = await acompute_stats(user_id, now)
+        await cache.aset(key, stats, settings.STATS_CACHE_TIMEOUT)
+    else:
+        await _acount("hits")
+    return stats
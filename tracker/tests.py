@@ -1,3 +1,1175 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from importlib.util import find_spec
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import Group
+from clopetracker import perf
+from clopetracker.db import TrackerReadRouter, using_primary
+from clopetracker.middleware import WhiteNoiseAsyncMiddleware
+from clopetracker.pagecache import CSRF_PLACEHOLDER
+
+from . import analytics
+from . import history
+from . import archive
+from . import counters
+from . import leaderboard
+from . import stats_cache
+from . import rollups
+from .history import aexport_rows, export_rows
+from .ingest import EventBuffer, _apply_batch, count_events, log_event, reconcile_counters, record_event
+from .management.commands.run_benchmarks import baseline_from, check
+from .models import EventArchive, EventRollup, SmokeEvent
+from .seeding import PASSWORD, delete_load_data, seed_load_data
+
+User = get_user_model()
+
+# Pas de manifest collectstatic en test → stockage statique simple
+TEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class EventIngestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="pw-alice-123")
+
+    def test_buffer_flushes_in_batches(self):
+        with self.assertNumQueries(0):
+            buffer = EventBuffer(batch_size=10)
+            for _ in range(9):
+                buffer.add(self.user)
+        # Le 10e événement déclenche un seul INSERT (plus savepoint)
+        buffer.add(self.user)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(count_events(self.user), 10)
+
+    def test_context_manager_flushes_remaining_events(self):
+        start = timezone.now() - timedelta(days=1)
+        with EventBuffer(batch_size=100) as buffer:
+            for i in range(5):
+                buffer.add(self.user, timestamp=start + timedelta(minutes=i))
+        self.assertEqual(buffer.written, 5)
+        self.assertEqual(count_events(self.user), 5)
+
+    def test_write_path_does_not_touch_user_row(self):
+        log_event(self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.cigarettes_smoked, 0)
+        self.assertEqual(SmokeEvent.objects.filter(user=self.user).count(), 1)
+
+    def test_reconcile_counters_from_log(self):
+        other = User.objects.create_user("bob", password="pw-bob-123")
+        with EventBuffer() as buffer:
+            for _ in range(3):
+                buffer.add(self.user)
+            buffer.add(other)
+        self.assertEqual(reconcile_counters(chunk_size=1), 2)
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.user.cigarettes_smoked, 3)
+        self.assertEqual(other.cigarettes_smoked, 1)
+        self.assertEqual(counters.get_count(self.user), 3)
+
+
+class ShardedCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("carol", password="pw-carol-123")
+
+    def test_exact_count_includes_pending_deltas(self):
+        for _ in range(5):
+            counters.increment(self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.cigarettes_smoked, 0)
+        self.assertEqual(counters.get_count(self.user), 5)
+
+    def test_fold_moves_deltas_into_user_row(self):
+        counters.increment(self.user, 4)
+        self.assertEqual(counters.fold_counters(chunk_size=1), 4)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.cigarettes_smoked, 4)
+        self.assertEqual(counters.get_count(self.user), 4)
+        # Un second repli n’ajoute rien
+        self.assertEqual(counters.fold_counters(), 0)
+
+    def test_ingestion_feeds_counter_once_per_batch(self):
+        with EventBuffer() as buffer:
+            for _ in range(3):
+                buffer.add(self.user)
+        self.assertEqual(self.user.counter_shards.count(), 1)
+        self.assertEqual(counters.get_count(self.user), 3)
+
+
+class ShardedCounterConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    INCREMENTS = 25
+
+    def test_concurrent_increments_are_not_lost(self):
+        user = User.objects.create_user("dave", password="pw-dave-123")
+
+        def hammer(_):
+            try:
+                for _ in range(self.INCREMENTS):
+                    counters.increment(user.pk)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            list(pool.map(hammer, range(self.THREADS)))
+
+        expected = self.THREADS * self.INCREMENTS
+        self.assertEqual(counters.get_count(user), expected)
+        counters.fold_counters()
+        user.refresh_from_db()
+        self.assertEqual(user.cigarettes_smoked, expected)
+
+
+
+@override_settings(TIME_ZONE="Europe/Brussels", STORAGES=TEST_STORAGES)
+class RollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("erin", password="pw-erin-123")
+
+    def _at(self, *args):
+        return timezone.make_aware(timezone.datetime(*args), timezone.get_default_timezone())
+
+    def test_buckets_follow_local_time(self):
+        # 23h30 à Bruxelles (été, UTC+2) → encore le lundi 2 juin en local
+        ts = self._at(2025, 6, 2, 23, 30)
+        day = rollups.bucket_start(ts, EventRollup.DAY)
+        self.assertEqual(day, self._at(2025, 6, 2))
+        self.assertEqual(day.utcoffset().total_seconds(), 0)  # stocké en UTC
+        self.assertEqual(rollups.bucket_start(ts, EventRollup.WEEK), self._at(2025, 6, 2))
+        self.assertEqual(rollups.bucket_start(ts, EventRollup.HOUR), self._at(2025, 6, 2, 23))
+
+    def test_incremental_rollups_match_rebuild(self):
+        start = self._at(2025, 3, 29, 22)  # traverse le passage à l’heure d’été
+        with EventBuffer(batch_size=7) as buffer:
+            for i in range(40):
+                buffer.add(self.user, timestamp=start + timedelta(minutes=45 * i))
+        incremental = set(EventRollup.objects.values_list("period", "bucket_start", "count"))
+        self.assertEqual(rollups.rebuild_rollups(chunk_size=1), 1)
+        rebuilt = set(EventRollup.objects.values_list("period", "bucket_start", "count"))
+        self.assertEqual(incremental, rebuilt)
+        days = EventRollup.objects.filter(period=EventRollup.DAY)
+        self.assertEqual(sum(days.values_list("count", flat=True)), 40)
+
+    def test_home_dashboard_cost_does_not_grow_with_history(self):
+        self.client.force_login(self.user)
+        log_event(self.user)
+        with self.assertNumQueries(5) as first:
+            self.client.get("/")
+        # Les écritures changent la version du cache : la 2e requête recalcule aussi
+        with self.captureOnCommitCallbacks(execute=True):
+            with EventBuffer() as buffer:
+                for i in range(200):
+                    buffer.add(self.user, timestamp=timezone.now() - timedelta(hours=i))
+        with self.assertNumQueries(len(first.captured_queries)):
+            response = self.client.get("/")
+        self.assertEqual(response.context["last_days"][-1][1], response.context["today_count"])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name="Bureau")
+        self.users = [
+            User.objects.create_user(name, password=f"pw-{name}-123", group=self.group)
+            for name in ("ana", "ben", "cy")
+        ]
+        User.objects.create_user("solo", password="pw-solo-123")
+
+    def _log(self, user, n):
+        with self.captureOnCommitCallbacks(execute=True):
+            with EventBuffer() as buffer:
+                for _ in range(n):
+                    buffer.add(user)
+
+    def test_ranking_in_one_query(self):
+        ana, ben, cy = self.users
+        self._log(ana, 3)
+        self._log(ben, 1)
+        self._log(cy, 1)
+        with self.assertNumQueries(1):
+            board = leaderboard.compute_leaderboard(self.group.pk)
+        self.assertEqual(
+            [(m["username"], m["total"], m["rank"]) for m in board],
+            [("ben", 1, 1), ("cy", 1, 1), ("ana", 3, 3)],
+        )
+
+    def test_cache_invalidated_on_ingest_and_group_change(self):
+        ana, ben, cy = self.users
+        board = leaderboard.get_leaderboard(self.group.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(leaderboard.get_leaderboard(self.group.pk), board)
+
+        self._log(ana, 2)
+        board = leaderboard.get_leaderboard(self.group.pk)
+        self.assertEqual(board[-1]["username"], "ana")
+        self.assertEqual(board[-1]["total"], 2)
+
+        cy.group = None
+        cy.save()
+        names = [m["username"] for m in leaderboard.get_leaderboard(self.group.pk)]
+        self.assertNotIn("cy", names)
+
+    def test_cached_board_slides_at_local_midnight(self):
+        ana = self.users[0]
+        self._log(ana, 2)
+        self.assertEqual(leaderboard.get_leaderboard(self.group.pk)[-1]["total"], 2)
+        # Une semaine plus tard, sans nouvel événement : le classement en cache ne sert plus
+        later = timezone.now() + timedelta(days=leaderboard.DEFAULT_DAYS)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            board = leaderboard.get_leaderboard(self.group.pk)
+        self.assertEqual([m["total"] for m in board], [0, 0, 0])
+
+    def test_home_shows_group_leaderboard(self):
+        self.client.force_login(self.users[0])
+        response = self.client.get("/")
+        self.assertEqual(len(response.context["group_leaderboard"]), 3)
+        self.assertContains(response, "Classement du groupe")
+
+
+class _StandInRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Serveur Redis minimal (RESP2 / RESP3, sans persistance) : les commandes qu’emploient
+    RedisCache de Django et redis-py, données gardées par le serveur (toutes bases confondues).
+    """
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _encode(self, value):
+        if value is None:
+            return b"_\r\n" if self.protocol == 3 else b"$-1\r\n"
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        if isinstance(value, Exception):
+            return f"-ERR {value}\r\n".encode()
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(self._encode(v) for v in value)
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _live(self, key):
+        value, expires = self.server.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.server.data[key]
+            return None
+        return value
+
+    def _run(self, name, args):
+        data = self.server.data
+        if name == "GET":
+            return self._live(args[0])
+        if name == "MGET":
+            return [self._live(key) for key in args]
+        if name == "SET":
+            options = [a.upper() for a in args[2:]]
+            if b"NX" in options and self._live(args[0]) is not None:
+                return None
+            ttl = int(args[3 + options.index(b"EX")]) if b"EX" in options else None
+            data[args[0]] = (args[1], time.monotonic() + ttl if ttl is not None else None)
+            return "OK"
+        if name == "DEL":
+            return sum(data.pop(key, None) is not None for key in args)
+        if name == "EXISTS":
+            return sum(self._live(key) is not None for key in args)
+        if name in ("INCR", "INCRBY"):
+            value = int(self._live(args[0]) or 0) + (int(args[1]) if len(args) > 1 else 1)
+            data[args[0]] = (b"%d" % value, data.get(args[0], (None, None))[1])
+            return value
+        if name in ("EXPIRE", "PERSIST"):
+            if self._live(args[0]) is None:
+                return 0
+            data[args[0]] = (data[args[0]][0], time.monotonic() + int(args[1]) if name == "EXPIRE" else None)
+            return 1
+        if name == "FLUSHDB":
+            data.clear()
+            return "OK"
+        if name == "PING":
+            return "PONG"
+        if name in ("SELECT", "CLIENT"):
+            return "OK"
+        return ValueError(f"unknown command '{name}'")
+
+    def handle(self):
+        self.protocol, queued = 2, None
+        while (command := self._read_command()) is not None:
+            name, args = command[0].decode().upper(), command[1:]
+            if name == "HELLO":
+                # Passage en RESP3 (null = "_") ; réponse : une map réduite au protocole
+                self.protocol = int(args[0])
+                reply = b"%%1\r\n+proto\r\n:%d\r\n" % self.protocol
+            elif name == "MULTI":
+                queued, reply = [], self._encode("OK")
+            elif name == "EXEC":
+                with self.server.lock:
+                    reply = self._encode([self._run(n, a) for n, a in queued])
+                queued = None
+            elif queued is not None:
+                queued.append((name, args))
+                reply = self._encode("QUEUED")
+            else:
+                with self.server.lock:
+                    reply = self._encode(self._run(name, args))
+            self.wfile.write(reply)
+
+
+class StandInRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StandInRedisHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/1"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class StatsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("gus", password="pw-gus-123")
+
+    def _log(self, n=1, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            with EventBuffer() as buffer:
+                for _ in range(n):
+                    buffer.add(self.user, **kwargs)
+
+    def test_event_bumps_version_instead_of_deleting(self):
+        self._log(2)
+        self.assertEqual(stats_cache.get_stats(self.user)["today"], 2)
+        with self.assertNumQueries(0):
+            stats = stats_cache.get_stats(self.user)
+        self.assertEqual((stats["today"], stats["last_30_days"], stats["total"]), (2, 2, 2))
+
+        self._log(timestamp=timezone.now() - timedelta(days=10))
+        stats = stats_cache.get_stats(self.user)
+        self.assertEqual((stats["today"], stats["last_7_days"], stats["last_30_days"]), (2, 2, 3))
+        self.assertEqual(stats_cache.metrics()["hits"], 1)
+        self.assertEqual(stats_cache.metrics()["misses"], 2)
+
+    def test_cached_dashboard_only_hits_session_and_user(self):
+        self.client.force_login(self.user)
+        self._log()
+        self.client.get("/")
+        with self.assertNumQueries(2):
+            response = self.client.get("/")
+        self.assertEqual(response.context["today_count"], 1)
+
+    def test_file_backend(self):
+        location = tempfile.mkdtemp(prefix="clopetracker-cache-")
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+        with self.settings(CACHES={"default": backend}):
+            self._log(3)
+            self.assertEqual(stats_cache.get_stats(self.user)["today"], 3)
+            with self.assertNumQueries(0):
+                self.assertEqual(stats_cache.get_stats(self.user)["total"], 3)
+            self._log()
+            self.assertEqual(stats_cache.get_stats(self.user)["today"], 4)
+
+    def test_file_backend_bump_does_not_rely_on_incr(self):
+        location = tempfile.mkdtemp(prefix="clopetracker-cache-")
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+        with self.settings(CACHES={"default": backend}):
+            key = "stats:test:version"
+            seen = {stats_cache.current_version(key)}
+            # incr() de FileBasedCache (get + set) pourrait perdre un bump concurrent : il n’est pas appelé
+            with mock.patch.object(FileBasedCache, "incr", side_effect=AssertionError):
+                for _ in range(3):
+                    stats_cache.bump_version(key)
+                    seen.add(stats_cache.current_version(key))
+            self.assertEqual(len(seen), 4)
+
+    @skipUnless(find_spec("redis"), "paquet optionnel redis absent (requirements-redis.txt)")
+    def test_redis_backend(self):
+        with StandInRedisServer() as server:
+            backend = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": server.url}
+            with self.settings(CACHES={"default": backend}):
+                self._log(3)
+                self.assertEqual(stats_cache.get_stats(self.user)["today"], 3)
+                with self.assertNumQueries(0):
+                    self.assertEqual(stats_cache.get_stats(self.user)["total"], 3)
+                self._log()
+                self.assertEqual(stats_cache.get_stats(self.user)["today"], 4)
+                self.assertEqual(stats_cache.metrics(), {"hits": 1, "misses": 2, "hit_ratio": 1 / 3})
+                cache.close()
+        self.assertTrue(server.data)  # tout est passé par le serveur
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class HistoryExportImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("hana", password="pw-hana-123")
+        self.other = User.objects.create_user("ivo", password="pw-ivo-123")
+        start = timezone.now() - timedelta(days=3)
+        with EventBuffer() as buffer:
+            for i in range(7):
+                buffer.add(self.user, timestamp=start + timedelta(hours=5 * i))
+        log_event(self.other)
+
+    def _export(self, fmt, **params):
+        return async_to_sync(self._aexport)(fmt, **params)
+
+    async def _aexport(self, fmt, **params):
+        # AsyncClient : flux async servi tel quel (pas lu d’abord en entier comme sous WSGI)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f"/export/{fmt}/", params)
+        self.assertTrue(response.is_async)
+        return b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+    def _import(self, content, suffix, *args):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(content)
+        call_command("import_history", path, *args, stdout=io.StringIO())
+
+    def test_export_only_own_history(self):
+        lines = self._export("csv").splitlines()
+        self.assertEqual(lines[0], "username,timestamp")
+        self.assertEqual(len(lines), 8)
+        self.assertTrue(all(line.startswith("hana,") for line in lines[1:]))
+        # ?all=1 réservé au staff
+        self.assertEqual(len(json.loads(self._export("json", all="1"))), 7)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(len(json.loads(self._export("json", all="1"))), 8)
+
+    def test_wsgi_export_streams_rows_as_they_are_read(self):
+        pulled = []
+        now = timezone.now()
+
+        def rows(user_ids=None):
+            for i in range(10_000):
+                pulled.append(i)
+                yield "hana", now
+
+        self.client.force_login(self.user)
+        with mock.patch.object(history, "export_rows", rows):
+            response = self.client.get("/export/csv/")
+        # Flux sync sous WSGI : le serveur l’itère tel quel, sans tout lire d’abord
+        self.assertFalse(response.is_async)
+        content = iter(response)
+        self.assertEqual(next(content), b"username,timestamp\r\n")
+        self.assertTrue(next(content).startswith(b"hana,"))
+        self.assertEqual(len(pulled), 1)
+        response.close()
+
+    def test_round_trip_updates_counters_and_rollups_once(self):
+        for fmt, suffix in (("csv", ".csv"), ("json", ".json")):
+            with self.subTest(fmt=fmt):
+                self._import(self._export(fmt), suffix, "--user", "ivo", "--batch-size", "3")
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.cigarettes_smoked, 15)
+        self.assertEqual(count_events(self.other), 15)
+        days = EventRollup.objects.filter(user=self.other, period=EventRollup.DAY)
+        self.assertEqual(sum(days.values_list("count", flat=True)), 15)
+
+    def test_unknown_users_are_skipped(self):
+        self._import('{"username": "nobody", "timestamp": "2025-01-01T10:00:00"}\n', ".jsonl")
+        self.assertEqual(SmokeEvent.objects.count(), 8)
+
+
+class EventApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("jade", password="pw-jade-123")
+        self.client.force_login(self.user)
+        start = timezone.now() - timedelta(hours=10)
+        with EventBuffer() as buffer:
+            # Deux événements au même instant : départagés par l’id
+            for i in (0, 1, 1, 2, 3, 4, 5):
+                buffer.add(self.user, timestamp=start + timedelta(hours=i))
+
+    def test_cursor_pagination_walks_every_event_once(self):
+        seen = []
+        url = "/api/events/?limit=3"
+        while url:
+            data = self.client.get(url).json()
+            seen += [e["id"] for e in data["results"]]
+            url = data["next"]
+        expected = list(
+            SmokeEvent.objects.filter(user=self.user).order_by("-timestamp", "-pk").values_list("pk", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_future_timestamp_is_rejected(self):
+        for delta, status in ((timedelta(days=1), 400), (timedelta(minutes=1), 201)):
+            with self.subTest(delta=delta):
+                body = json.dumps({"timestamp": (timezone.now() + delta).isoformat()})
+                response = self.client.post("/api/events/", data=body, content_type="application/json")
+                self.assertEqual(response.status_code, status)
+        self.assertEqual(self.user.smoke_events.count(), 8)
+
+    def test_unchanged_poll_returns_304(self):
+        response = self.client.get("/api/events/")
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn("Last-Modified", response)
+        # 304 : session + utilisateur + dernier événement, aucune page lue
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/events/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        created = self.client.post(
+            "/api/events/", data='{"timestamp": "2020-01-01T12:00:00"}', content_type="application/json"
+        )
+        self.assertEqual(created.status_code, 201)
+        response = self.client.get("/api/events/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user.smoke_events.count(), 8)
+
+    def test_compaction_changes_etag_of_deep_pages(self):
+        log_event(self.user, timestamp=timezone.now() - timedelta(days=400))
+        log_event(self.user)
+        url, last_page = "/api/events/?limit=3", None
+        while url:
+            last_page, url = url, self.client.get(url).json()["next"]
+        etag = self.client.get(last_page)["ETag"]
+        self.assertEqual(self.client.get(last_page, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        location = tempfile.mkdtemp(prefix="clopetracker-archive-")
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        with override_settings(ARCHIVE_ROOT=location):
+            # Plus vieil événement sorti du journal : ni dernier id ni dernière date ne changent
+            self.assertEqual(archive.compact_history(horizon_days=365), (1, 1))
+        response = self.client.get(last_page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_errors_are_json(self):
+        self.assertEqual(self.client.get("/api/events/?cursor=%%%").status_code, 400)
+        self.client.logout()
+        response = self.client.get("/api/events/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("error", response.json())
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("kim", password="pw-kim-123")
+
+    async def test_dashboard_and_logging_through_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = await self.async_client.post("/log/")
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get("/")
+        self.assertEqual(response.context["today_count"], 1)
+        self.assertContains(response, "kim")
+
+        response = await self.async_client.post(
+            "/api/events/", data={"timestamp": "2024-05-01T08:00:00"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.get("/api/events/")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_static_middleware_stays_async(self):
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(WhiteNoiseAsyncMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(WhiteNoiseAsyncMiddleware(lambda request: None)))
+
+
+class OfflineSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("lou", password="pw-lou-123")
+        self.client.force_login(self.user)
+
+    def _sync(self, events):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/sync/", data={"events": events}, content_type="application/json")
+
+    def _batch(self, keys):
+        start = timezone.now() - timedelta(days=2)
+        return [{"key": k, "timestamp": (start + timedelta(hours=i)).isoformat()} for i, k in enumerate(keys)]
+
+    def test_future_timestamp_rejects_the_batch(self):
+        batch = self._batch(["a"]) + [{"key": "b", "timestamp": (timezone.now() + timedelta(days=1)).isoformat()}]
+        response = self._sync(batch)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Événement 1", response.json()["error"])
+        self.assertEqual(count_events(self.user), 0)
+        # Quelques minutes d’avance : décalage d’horloge toléré
+        soon = [{"key": "c", "timestamp": (timezone.now() + timedelta(minutes=1)).isoformat()}]
+        self.assertEqual(self._sync(soon).status_code, 200)
+
+    def test_resent_batch_is_deduplicated(self):
+        batch = self._batch(["a", "b", "c", "b"])
+        data = self._sync(batch).json()
+        self.assertEqual((sorted(data["created"]), data["duplicates"]), (["a", "b", "c"], []))
+
+        data = self._sync(batch + self._batch(["d"])).json()
+        self.assertEqual((data["created"], sorted(data["duplicates"])), (["d"], ["a", "b", "c"]))
+        self.assertEqual(count_events(self.user), 4)
+        self.assertEqual(counters.get_count(self.user), 4)
+        days = EventRollup.objects.filter(user=self.user, period=EventRollup.DAY)
+        self.assertEqual(sum(days.values_list("count", flat=True)), 4)
+
+    @mock.patch.object(counters, "SHARD_COUNT", 1)
+    def test_counter_and_rollups_updated_once_per_batch(self):
+        # Même nombre de requêtes pour 5 ou 50 événements répartis sur autant d’heures
+        # (tranches existantes et nouvelles, sur plusieurs jours)
+        start = timezone.now() - timedelta(days=10)
+        self._sync([{"key": "warmup", "timestamp": start.isoformat()}])
+        sizes = []
+        for n in (5, 50):
+            events = [{"key": f"{n}-{i}", "timestamp": (start + timedelta(hours=i)).isoformat()} for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                self._sync(events)
+            sizes.append(len(ctx.captured_queries))
+            rollup_queries = [q for q in ctx.captured_queries if "tracker_eventrollup" in q["sql"]]
+            self.assertLessEqual(len(rollup_queries), 3)
+        self.assertEqual(sizes[0], sizes[1])
+        self.assertEqual(counters.get_count(self.user), 56)
+
+        incremental = set(EventRollup.objects.values_list("period", "bucket_start", "count"))
+        rollups.rebuild_rollups(user_ids=[self.user.pk])
+        self.assertEqual(set(EventRollup.objects.values_list("period", "bucket_start", "count")), incremental)
+
+    def test_unique_index_backs_up_deduplication(self):
+        SmokeEvent.objects.create(user=self.user, client_key="x")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SmokeEvent.objects.create(user=self.user, client_key="x")
+        SmokeEvent.objects.bulk_create([SmokeEvent(user=self.user, client_key="x")], ignore_conflicts=True)
+        # Les événements web (sans clé) ne sont pas concernés
+        SmokeEvent.objects.create(user=self.user)
+        SmokeEvent.objects.create(user=self.user)
+        self.assertEqual(count_events(self.user), 3)
+
+    def test_invalid_batches_are_rejected(self):
+        self.assertEqual(self._sync([{"key": "", "timestamp": "2024-01-01T00:00:00"}]).status_code, 400)
+        self.assertEqual(self._sync([{"key": "k", "timestamp": "hier"}]).status_code, 400)
+        self.assertEqual(self._sync(self._batch([str(i) for i in range(501)])).status_code, 413)
+        self.assertEqual(count_events(self.user), 0)
+
+
+class SqliteTuningTests(SimpleTestCase):
+    def _pragmas(self, tuning):
+        path = os.path.join(tempfile.mkdtemp(prefix="clopetracker-db-"), "tuning.sqlite3")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        wrapper = DatabaseWrapper({**connection.settings_dict, "NAME": path}, alias="tuning")
+        with self.settings(SQLITE_TUNING=tuning):
+            wrapper.ensure_connection()
+        try:
+            with wrapper.cursor() as cursor:
+                return {
+                    name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                    for name in ("journal_mode", "synchronous", "busy_timeout")
+                }
+        finally:
+            wrapper.close()
+
+    def test_production_mode_applies_pragmas(self):
+        self.assertEqual(self._pragmas(True), {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000})
+        self.assertEqual(self._pragmas(False)["journal_mode"], "delete")
+
+
+class TrackerReadRouterTests(TransactionTestCase):
+    def setUp(self):
+        self.router = TrackerReadRouter()
+        patcher = mock.patch.object(TrackerReadRouter, "_replica", return_value="replica")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tracker_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(SmokeEvent), "replica")
+        self.assertEqual(self.router.db_for_read(EventArchive), "default")
+        self.assertEqual(self.router.db_for_write(SmokeEvent), "default")
+        self.assertIsNone(self.router.db_for_read(User))
+        self.assertIs(self.router.allow_migrate("replica", "tracker"), False)
+
+    def test_transactions_and_pinning_stay_on_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(SmokeEvent), "default")
+        with using_primary():
+            self.assertIsNone(self.router.db_for_read(SmokeEvent))
+        self.assertEqual(self.router.db_for_read(SmokeEvent), "replica")
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class LaggingReplicaTests(TransactionTestCase):
+    """Réplica SQLite dans un fichier, copié depuis "default" seulement par sync_replica()."""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp(prefix="clopetracker-replica-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.settings["replica"] = {
+            **connections.settings["default"], "NAME": os.path.join(directory, "replica.sqlite3"),
+        }
+        self.addCleanup(self._drop_replica)
+        # Connexion ouverte ici : la garde des tests n’autorise que les alias déjà connectés
+        connections["replica"].connect()
+        patcher = mock.patch.object(TrackerReadRouter, "_replica", return_value="replica")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("ugo", password="pw-ugo-123")
+        self.client.force_login(self.user)
+
+    def _archive_root(self):
+        location = tempfile.mkdtemp(prefix="clopetracker-archive-")
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        roots = override_settings(ARCHIVE_ROOT=location)
+        roots.enable()
+        self.addCleanup(roots.disable)
+
+    def _drop_replica(self):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+
+    def sync_replica(self):
+        connections["default"].ensure_connection()
+        target = sqlite3.connect(connections.settings["replica"]["NAME"])
+        try:
+            connections["default"].connection.backup(target)
+        finally:
+            target.close()
+
+    def _post(self):
+        response = self.client.post("/api/events/", "{}", content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_etag_and_page_come_from_the_same_database(self):
+        self._post()
+        self.sync_replica()
+        self._post()  # pas encore sur le réplica
+        response = self.client.get("/api/events/")
+        self.assertEqual(len(response.json()["results"]), 1)
+        etag = response["ETag"]
+
+        self.sync_replica()
+        # L’ETag reçu décrivait la page ancienne : le client reçoit enfin la cigarette
+        response = self.client.get("/api/events/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_archives_are_read_on_the_primary(self):
+        self._archive_root()
+        now = timezone.now()
+        for days in (400, 390, 2):
+            record_event(self.user, timestamp=now - timedelta(days=days))
+        # Réplica vide (jamais copié) : le repérage des historiques à archiver n’y va pas
+        self.assertEqual(archive.compact_history(horizon_days=365, now=now), (1, 2))
+        self.sync_replica()
+
+        record_event(self.user, timestamp=now - timedelta(days=380))
+        self.assertEqual(archive.compact_history(horizon_days=365, now=now), (1, 1))
+        # Réplica en retard : il désigne encore la génération 1, supprimée après commit
+        self.assertFalse(archive.archive_storage().exists(archive.archive_name(self.user.pk, 1)))
+
+        self.assertEqual(analytics.user_analytics(self.user)["count"], 4)
+        self.assertEqual(len(list(export_rows([self.user.pk]))), 4)
+        self.assertEqual(len(async_to_sync(self._aexport)()), 4)
+
+    async def _aexport(self):
+        return [row async for row in aexport_rows([self.user.pk])]
+
+
+@override_settings(STORAGES=TEST_STORAGES, PERF_SERVER_TIMING=True)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("max", password="pw-max-123")
+
+    def _records(self, logs):
+        return [json.loads(line.split(":", 2)[2]) for line in logs.output]
+
+    def test_server_timing_and_structured_log(self):
+        self.client.force_login(self.user)
+        with self.assertLogs("clopetracker.perf", "INFO") as logs:
+            response = self.client.get("/")
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ requête\(s\) SQL", tpl;dur=[\d.]+, total;dur=')
+        (record,) = self._records(logs)
+        self.assertEqual((record["view"], record["status"]), ("home", 200))
+        self.assertGreater(record["queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+
+    async def test_async_views_count_queries_too(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/api/events/")
+        self.assertNotIn('desc="0 requête', response["Server-Timing"])
+
+    @override_settings(PERF_N_PLUS_ONE_THRESHOLD=3)
+    def test_repeated_statements_are_flagged(self):
+        metrics, token = perf.start_request()
+        try:
+            for pk in range(4):  # N+1 : une requête par id
+                list(User.objects.filter(pk=pk))
+            # Listes IN de tailles différentes : même requête normalisée, sous le seuil
+            list(User.objects.filter(pk__in=[1, 2]))
+            list(User.objects.filter(pk__in=[1, 2, 3]))
+        finally:
+            perf.stop_request(token)
+        with self.assertLogs("clopetracker.perf", "WARNING") as logs:
+            perf.finish_request(RequestFactory().get("/"), HttpResponse(), metrics)
+        (record,) = self._records(logs)
+        self.assertEqual([item["count"] for item in record["n_plus_one"]], [4])
+        self.assertIn("accounts_user", record["n_plus_one"][0]["sql"])
+
+    def test_perf_report_summarises_per_view(self):
+        fd, path = tempfile.mkstemp(suffix=".log")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w") as fh:
+            for i in range(1, 101):
+                fh.write(json.dumps({"ts": 0, "view": "home", "path": "/", "total_ms": i, "queries": 4}) + "\n")
+            fh.write(json.dumps({"ts": 0, "view": "api_events", "path": "/api/events/", "total_ms": 900,
+                                 "queries": 2, "slow": True}) + "\n")
+            fh.write("pas du json\n")
+        out = io.StringIO()
+        call_command("perf_report", path, "--json", stdout=out, stderr=io.StringIO())
+        rows = {r["view"]: r for r in json.loads(out.getvalue())}
+        self.assertEqual((rows["home"]["n"], rows["home"]["p50"], rows["home"]["p99"]), (100, 50, 99))
+        self.assertEqual(rows["api_events"]["slow"], 1)
+        self.assertEqual(list(rows), ["api_events", "home"])  # trié par p99 décroissant
+
+
+class SeedLoadDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seeded_counters_and_rollups_match_the_log(self):
+        created, groups, events = seed_load_data(users=5, days=10, per_day=6, group_size=2, avatar_ratio=0, seed=3)
+        self.assertEqual((created, groups), (5, 3))
+        users = User.objects.filter(username__startswith="load-")
+        self.assertEqual(users.count(), 5)
+        self.assertEqual(events, SmokeEvent.objects.filter(user__in=users).count())
+        for user in users:
+            self.assertEqual(user.cigarettes_smoked, user.smoke_events.count())
+        self.assertTrue(users.first().check_password(PASSWORD))
+
+        seeded = set(EventRollup.objects.values_list("user_id", "period", "bucket_start", "count"))
+        rollups.rebuild_rollups()
+        self.assertEqual(seeded, set(EventRollup.objects.values_list("user_id", "period", "bucket_start", "count")))
+
+        # Relançable : la numérotation reprend après les comptes existants
+        seed_load_data(users=2, days=2, avatar_ratio=0, seed=4)
+        self.assertTrue(User.objects.filter(username="load-000006").exists())
+        self.assertEqual(delete_load_data(), 7)
+        self.assertFalse(SmokeEvent.objects.exists())
+
+    def test_benchmark_thresholds(self):
+        result = {"scenario": "home", "p95_ms": 40.0, "queries_max": 5, "req_per_s": 50.0}
+        limits = baseline_from([result])["home"]
+        self.assertEqual(limits, {"max_queries": 5})
+        self.assertEqual(check(result, limits), [])
+        # Latence propre à la machine : affichée, jamais bloquante
+        self.assertEqual(check({**result, "p95_ms": 900.0, "req_per_s": 1.0}, limits), [])
+        self.assertEqual(len(check({**result, "queries_max": 6}, limits)), 1)
+
+    def test_benchmark_writes_leave_seeded_users_untouched(self):
+        seed_load_data(users=2, days=2, per_day=3, group_size=2, avatar_ratio=0, seed=5)
+        before = SmokeEvent.objects.count()
+        users = User.objects.filter(username__startswith="load-").count()
+        directory = tempfile.mkdtemp(prefix="clopetracker-bench-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        call_command("run_benchmarks", scenarios="log,api_post,sync", requests=4, users=2,
+                     baseline=os.path.join(directory, "absent.json"), stdout=io.StringIO())
+        self.assertEqual(SmokeEvent.objects.count(), before)
+        self.assertEqual(User.objects.count(), users)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PAGE_CACHE_TIMEOUT=60)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("lou", password="pw-lou-123")
+
+    def _token(self, response):
+        return response.content.decode().split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+
+    def test_anonymous_home_is_served_from_cache(self):
+        first = self.client.get("/")
+        with mock.patch("tracker.views.render") as render:
+            second = self.client.get("/")
+        render.assert_not_called()
+        self.assertEqual(first.content, second.content)
+        self.assertIn("Cookie", second["Vary"])
+        self.assertIn("private", second["Cache-Control"])
+
+        # Avec une session : jamais la page en cache
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get("/"), "Bonjour, lou")
+
+    def test_cached_login_form_carries_each_visitors_csrf_token(self):
+        tokens = []
+        for _ in range(2):
+            client = Client(enforce_csrf_checks=True)
+            response = client.get("/accounts/login/")
+            self.assertNotContains(response, CSRF_PLACEHOLDER)
+            tokens.append(self._token(response))
+            response = client.post("/accounts/login/", {
+                "username": "lou", "password": "pw-lou-123", "csrfmiddlewaretoken": tokens[-1],
+            })
+            self.assertEqual(response.status_code, 302)
+        self.assertNotEqual(*tokens)
+
+    def test_navbar_fragment_follows_the_user(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get("/"), "Bonjour, lou")
+        self.user.username = "louise"
+        self.user.save()
+        response = self.client.get("/")
+        self.assertContains(response, "Bonjour, louise")
+        # Le formulaire de déconnexion (hors fragment) garde un vrai jeton
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("noa", password="pw-noa-123")
+        self.tz = timezone.get_default_timezone()
+
+    def _at(self, *args):
+        return datetime(*args, tzinfo=self.tz)
+
+    def _timeline(self, *stamps):
+        timeline = analytics.Timeline()
+        for ts in stamps:
+            timeline.add(ts)
+        return timeline
+
+    def test_gaps_streaks_and_days_across_dst(self):
+        # 29 mars 2026 : passage à l’heure d’été à Bruxelles (journée de 23 h)
+        timeline = self._timeline(
+            self._at(2026, 3, 29, 23, 30), self._at(2026, 3, 25, 8), self._at(2026, 3, 25, 10),
+            self._at(2026, 3, 29, 0, 30),
+        )
+        result = analytics.summarize(timeline, now=self._at(2026, 3, 31, 12), days=7)
+        self.assertEqual(result["count"], 4)
+        self.assertEqual([d["count"] for d in result["daily"]], [2, 0, 0, 0, 2, 0, 0])
+        self.assertEqual(result["daily"][4]["date"], "2026-03-29")
+        self.assertEqual(result["median_gap_minutes"], 22 * 60)
+        self.assertEqual(result["longest_streak_days"], 3)
+        self.assertEqual(result["current_streak_days"], 2)
+
+    def test_future_events_do_not_break_the_summary(self):
+        now = self._at(2026, 3, 31, 12)
+        for stamps in ((self._at(2026, 4, 1, 9),), (self._at(2026, 3, 30, 9), self._at(2026, 4, 5, 9))):
+            with self.subTest(stamps=stamps):
+                result = analytics.summarize(self._timeline(*stamps), now=now, days=7)
+                self.assertEqual(result["count"], len(stamps))
+                self.assertEqual(sum(d["count"] for d in result["daily"]), len(stamps))
+                self.assertEqual(result["daily"][-1]["date"], stamps[-1].date().isoformat())
+                self.assertGreater(result["baseline_per_day"], 0)
+                self.assertGreaterEqual(result["money_saved"], 0)
+                self.assertEqual(result["current_streak_days"], 0)
+
+    @override_settings(CIGARETTE_PACK_PRICE=10.0, CIGARETTE_PACK_SIZE=20)
+    def test_money_saved_against_first_week(self):
+        start = self._at(2026, 5, 4, 9)
+        timeline = self._timeline(*(start + timedelta(days=d, hours=h) for d in range(7) for h in range(4)))
+        result = analytics.summarize(timeline, now=start + timedelta(days=13))
+        self.assertEqual(result["baseline_per_day"], 4.0)
+        # 14 jours au rythme de la 1re semaine = 56 cigarettes, 28 fumées → 28 × 0,50 €
+        self.assertEqual(result["money_saved"], 14.0)
+        self.assertLess(result["trend_per_week"], 0)
+
+    def test_timeline_is_loaded_incrementally(self):
+        now = timezone.now()
+        log_event(self.user, timestamp=now - timedelta(hours=2))
+        self.assertEqual(analytics.user_analytics(self.user)["count"], 1)
+
+        # Événement synchronisé après coup mais daté plus tôt : inséré à sa place
+        log_event(self.user, timestamp=now - timedelta(hours=5))
+        with CaptureQueriesContext(connection) as ctx:
+            timeline = analytics.load_timeline(self.user)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('"id" >', ctx.captured_queries[0]["sql"])
+        self.assertEqual(len(timeline), 2)
+        self.assertEqual(list(timeline.timestamps), sorted(timeline.timestamps))
+
+        analytics.forget_timelines([self.user.pk])
+        self.assertEqual(len(analytics.load_timeline(self.user)), 2)
+
+    def test_lower_id_committed_late_is_not_lost(self):
+        # Postgres : l’id `late` est attribué avant celui de `seen`, mais commité après
+        # qu’une lecture a déjà avancé au-delà
+        now = timezone.now()
+        late = record_event(self.user, timestamp=now - timedelta(hours=3))
+        record_event(self.user, timestamp=now - timedelta(hours=1))
+        SmokeEvent.objects.filter(pk=late.pk).delete()
+        self.assertEqual(len(analytics.load_timeline(self.user)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            _apply_batch(SmokeEvent.objects.bulk_create([
+                SmokeEvent(pk=late.pk, user=self.user, timestamp=late.timestamp),
+            ]))
+        self.assertEqual(len(analytics.load_timeline(self.user)), 2)
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_admin_deletion_drops_the_cached_timeline(self):
+        admin_user = User.objects.create_superuser("root", password="pw-root-123")
+        first = record_event(self.user, timestamp=timezone.now() - timedelta(hours=2))
+        record_event(self.user, timestamp=timezone.now() - timedelta(hours=1))
+        self.assertEqual(analytics.user_analytics(self.user)["count"], 2)
+
+        self.client.force_login(admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/admin/tracker/smokeevent/{first.pk}/delete/", {"post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(analytics.user_analytics(self.user)["count"], 1)
+
+    def test_api(self):
+        self.assertEqual(self.client.get("/api/analytics/").status_code, 401)
+        self.client.force_login(self.user)
+        log_event(self.user)
+        data = self.client.get("/api/analytics/?days=7").json()
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(len(data["daily"]), 1)
+        self.assertEqual(self.client.get("/api/analytics/?days=0").status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        location = tempfile.mkdtemp(prefix="clopetracker-archive-")
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        roots = override_settings(
+            MEDIA_ROOT=os.path.join(location, "media"), ARCHIVE_ROOT=os.path.join(location, "archives"),
+        )
+        roots.enable()
+        self.addCleanup(roots.disable)
+
+        self.user = User.objects.create_user("sam", password="pw-sam-123")
+        self.now = timezone.now()
+        self.old = [self.now - timedelta(days=400, hours=h) for h in (30, 2, 1)]
+        with EventBuffer() as buffer:
+            for ts in self.old + [self.now - timedelta(days=2)]:
+                buffer.add(self.user, timestamp=ts)
+
+    def _rollups(self, *periods):
+        return set(
+            EventRollup.objects.filter(user=self.user, period__in=periods)
+            .values_list("period", "bucket_start", "count")
+        )
+
+    async def _aexport_rows(self):
+        return [ts async for _, ts in aexport_rows([self.user.pk], chunk_size=2)]
+
+    def _compact(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive.compact_history(horizon_days=365, now=self.now)
+
+    def test_compaction_moves_old_events_without_changing_totals(self):
+        days = self._rollups(EventRollup.DAY, EventRollup.WEEK)
+        self.assertEqual(self._compact(), (1, 3))
+
+        self.assertEqual(SmokeEvent.objects.filter(user=self.user).count(), 1)
+        record = EventArchive.objects.get(user=self.user)
+        self.assertEqual(record.count, 3)
+        path = archive.archive_storage().path(record.file)
+        self.assertEqual(os.path.getsize(path), 24 + 3 * 4)
+        # Hors MEDIA_ROOT : jamais servi sous /media/
+        self.assertFalse(path.startswith(settings.MEDIA_ROOT))
+        with archive.ArchiveReader(record.file) as reader:
+            self.assertEqual(reader.count_between(end=self.now - timedelta(days=400, hours=1, seconds=1)), 2)
+
+        # Agrégats jour / semaine intacts, tranches heure archivées supprimées, rebuild identique
+        self.assertEqual(self._rollups(EventRollup.DAY, EventRollup.WEEK), days)
+        self.assertEqual(len(self._rollups(EventRollup.HOUR)), 1)
+        rollups.rebuild_rollups(user_ids=[self.user.pk])
+        self.assertEqual(self._rollups(EventRollup.DAY, EventRollup.WEEK), days)
+
+        self.assertEqual(count_events(self.user), 4)
+        reconcile_counters(user_ids=[self.user.pk])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.cigarettes_smoked, 4)
+
+        exported = [ts for _, ts in export_rows([self.user.pk])]
+        self.assertEqual(len(exported), 4)
+        self.assertEqual(exported, sorted(exported))
+        self.assertEqual(async_to_sync(self._aexport_rows)(), exported)
+        self.assertEqual(exported[0], self.old[0].replace(microsecond=0))
+        self.assertEqual(analytics.user_analytics(self.user, now=self.now)["count"], 4)
+
+    def test_second_run_rewrites_archive_and_removes_previous_file(self):
+        self._compact()
+        first = EventArchive.objects.get(user=self.user).file
+        # Cigarette hors ligne synchronisée après coup, datée dans la période archivée
+        log_event(self.user, timestamp=self.now - timedelta(days=500))
+        self.assertEqual(self._compact(), (1, 1))
+
+        record = EventArchive.objects.get(user=self.user)
+        self.assertEqual((record.generation, record.count), (2, 4))
+        self.assertFalse(archive.archive_storage().exists(first))
+        self.assertEqual(list(archive.read_epochs(self.user)), sorted(archive.read_epochs(self.user)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertFalse(archive.archive_storage().exists(record.file))
+
+    def test_changed_log_skips_only_that_user(self):
+        other = User.objects.create_user("lou", password="pw-lou-123")
+        log_event(other, timestamp=self.now - timedelta(days=400))
+        compact_user = archive._compact_user
+
+        def racing(user_id, cutoff):
+            if user_id == self.user.pk:
+                raise archive.ArchiveError("Journal modifié pendant le compactage")
+            return compact_user(user_id, cutoff)
+
+        with mock.patch.object(archive, "_compact_user", racing), self.assertLogs("tracker.archive", "WARNING"):
+            self.assertEqual(self._compact(), (1, 1))
+        self.assertTrue(EventArchive.objects.filter(user=other).exists())
+        self.assertFalse(EventArchive.objects.filter(user=self.user).exists())
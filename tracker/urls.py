@@ -1,6 +1,11 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('log/', views.log_cigarette, name='log_cigarette'),
+    path('export/<str:fmt>/', views.export_history, name='export_history'),
+    path('api/events/', api.events, name='api_events'),
+    path('api/sync/', api.sync_events, name='api_sync'),
+    path('api/analytics/', api.analytics, name='api_analytics'),
 ]
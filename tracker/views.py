@@ -1,4 +1,84 @@
-from django.shortcuts import render
+# tracker/views.py
+"""
+Vues du tracker.
 
-def home(request):
-    return render(request, "tracker/home.html")
+- home, log_cigarette et export_history sont async : sous ASGI (clopetracker/asgi.py) elles tournent
+  dans la boucle d’événements, sans passer par le pont sync → async de Django
+- Lectures : API async du cache et de l’ORM ; l’utilisateur est chargé par request.auser()
+  puis posé sur request.user pour que les templates ne déclenchent pas de requête sync
+- Écriture : un seul passage par le thread DB pour toute la transaction (alog_event) ;
+  elle ne sauve jamais l’objet User, donc les signaux sync (avatars…) ne sont pas déclenchés
+"""
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from clopetracker.pagecache import cache_anonymous_page
+
+from . import history, leaderboard, stats_cache
+from .ingest import alog_event
+
+@cache_anonymous_page
+async def home(request):
+    """
+    Accueil.
+    Anonyme → page entière en cache (clopetracker.pagecache).
+    Connecté → tableau de bord lu depuis le cache de statistiques
+    (sinon depuis les agrégats : nombre de requêtes constant, quel que soit l’historique).
+    """
+    request.user = user = await request.auser()
+    context = {}
+    if user.is_authenticated:
+        stats = await stats_cache.aget_stats(user)
+        context.update({
+            "today_count": stats["today"],
+            "week_count": stats["week"],
+            "last_days": stats["daily"],
+            "total_count": stats["total"],
+            "stats": stats,
+        })
+        if user.group_id:
+            # Classement du groupe : une requête au plus, depuis le cache sinon
+            context["group_leaderboard"] = await leaderboard.aget_leaderboard(user.group_id)
+    return render(request, "tracker/home.html", context)
+
+@login_required
+@require_POST
+async def log_cigarette(request):
+    """Enregistre une cigarette pour l’utilisateur connecté puis revient à l’accueil."""
+    await alog_event(await request.auser())
+    messages.success(request, "Cigarette enregistrée.")
+    return redirect("home")
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+
+@login_required
+@require_GET
+async def export_history(request, fmt):
+    """
+    Export de l’historique en flux (CSV ou JSON), sans le construire en mémoire.
+    Flux du type que le serveur consomme au fil de l’eau : sync sous WSGI (un flux async
+    y serait d’abord lu en entier par Django), async (aiterator) sous ASGI, où c’est
+    l’inverse.
+    Staff : ?all=1 exporte tous les utilisateurs.
+    """
+    if fmt not in history.FORMATS:
+        raise Http404("Format d’export inconnu.")
+    user = await request.auser()
+    everyone = user.is_staff and request.GET.get("all") == "1"
+    user_ids = None if everyone else [user.pk]
+    if isinstance(request, WSGIRequest):
+        content = history.iter_export(fmt, history.export_rows(user_ids=user_ids))
+    else:
+        content = history.aiter_export(fmt, history.aexport_rows(user_ids=user_ids))
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[fmt])
+    filename = f"clopetracker-{'all' if everyone else user.username}-{timezone.localdate():%Y%m%d}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response